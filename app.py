@@ -1,33 +1,147 @@
 from flask import Flask
 from autoquiz.extensions import db
 from autoquiz.routes import register_routes
+from autoquiz.utils.schema import ensure_schema
+from autoquiz.utils import blobstore, cache, jobs, llm, metrics, question_bank, search, sqlite, uploads
+from autoquiz.cli import autoquiz_cli
 from dotenv import load_dotenv
 import os
 
-def create_app(testing=False):
-    """Application factory pattern"""
+def create_app(config_name=None, testing=False):
+    """
+    Application factory pattern
+    
+    `config_name` selects a profile from config.py (development, testing or
+    production); it defaults to FLASK_ENV, or testing when `testing` is set.
+    """
     # Load environment variables
     load_dotenv()
     
+    # Imported after load_dotenv so the config classes see the .env values
+    from config import config
+    
+    if config_name is None:
+        config_name = 'testing' if testing else os.getenv('FLASK_ENV', 'default')
+    
     # Initialize Flask app
     app = Flask(__name__)
+    app.config.from_object(config.get(config_name, config['default']))
+    
+    # PDF extraction: worker processes (0 = one per CPU) and seconds allowed per page
+    app.config['PDF_EXTRACT_WORKERS'] = int(os.getenv('PDF_EXTRACT_WORKERS', '0'))
+    app.config['PDF_PAGE_TIMEOUT'] = float(os.getenv('PDF_PAGE_TIMEOUT', '30'))
+    
+    # Uploaded files: 'file' keeps them under BLOB_DIR, 'database' in the blobs table
+    app.config['BLOB_STORE'] = os.getenv('BLOB_STORE', 'file')
+    app.config['BLOB_DIR'] = os.getenv('BLOB_DIR', os.path.join(app.root_path, 'data', 'blobs'))
+    
+    # Extracted text is stored compressed: 'zlib', 'lzma' (smaller, slower) or 'none'
+    app.config['CONTENT_CODEC'] = os.getenv('CONTENT_CODEC', 'zlib').lower()
+    
+    # Uploads: largest accepted file, and bytes kept in memory before spooling to disk
+    app.config['UPLOAD_MAX_BYTES'] = int(os.getenv('UPLOAD_MAX_MB', '50')) * 1024 * 1024
+    app.config['UPLOAD_SPOOL_MEMORY'] = int(os.getenv('UPLOAD_SPOOL_MEMORY_MB', '4')) * 1024 * 1024
+    
+    # Quiz cache: in-process LRU entries, database entries and lifetime in seconds
+    app.config['QUIZ_CACHE_ENABLED'] = os.getenv('QUIZ_CACHE_ENABLED', 'true').lower() == 'true'
+    app.config['QUIZ_CACHE_SIZE'] = int(os.getenv('QUIZ_CACHE_SIZE', '256'))
+    app.config['QUIZ_CACHE_DURABLE_SIZE'] = int(os.getenv('QUIZ_CACHE_DURABLE_SIZE', '10000'))
+    app.config['QUIZ_CACHE_TTL'] = int(os.getenv('QUIZ_CACHE_TTL', str(7 * 24 * 3600)))
+    
+    # Long texts are split into chunks of QUIZ_CHUNK_TOKENS tokens and quizzed concurrently
+    app.config['QUIZ_CHUNK_TOKENS'] = int(os.getenv('QUIZ_CHUNK_TOKENS', '2500'))
+    app.config['QUIZ_MAX_CHUNKS'] = int(os.getenv('QUIZ_MAX_CHUNKS', '8'))
+    app.config['QUIZ_CHUNK_CONCURRENCY'] = int(os.getenv('QUIZ_CHUNK_CONCURRENCY', '8'))
+    
+    # Token budget: source tokens sent per quiz in total, and the model's context window
+    app.config['QUIZ_TOKEN_BUDGET'] = int(os.getenv('QUIZ_TOKEN_BUDGET', '20000'))
+    app.config['QUIZ_CONTEXT_TOKENS'] = int(os.getenv('QUIZ_CONTEXT_TOKENS', '16385'))
+    
+    # Completion format: 'text' (numbered quiz text) or 'json' (JSON mode, no text parsing)
+    app.config['QUIZ_RESPONSE_FORMAT'] = os.getenv('QUIZ_RESPONSE_FORMAT', 'text').lower()
+    
+    # Batch generation: maximum items per request and quizzes generated at once
+    app.config['QUIZ_BATCH_MAX_ITEMS'] = int(os.getenv('QUIZ_BATCH_MAX_ITEMS', '100'))
+    app.config['QUIZ_BATCH_CONCURRENCY'] = int(os.getenv('QUIZ_BATCH_CONCURRENCY', '8'))
     
-    # Configure the app to use SQLite
-    app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URI', 'sqlite:///autoquiz.db')
-    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    # OpenAI: one shared client with a keep-alive connection pool, a cap on
+    # concurrent upstream calls and retries with backoff on 429/5xx
+    app.config['OPENAI_API_KEY'] = os.getenv('OPENAI_API_KEY')
+    app.config['OPENAI_BASE_URL'] = os.getenv('OPENAI_BASE_URL')
+    app.config['LLM_TIMEOUT'] = float(os.getenv('LLM_TIMEOUT', '60'))
+    app.config['LLM_MAX_CONNECTIONS'] = int(os.getenv('LLM_MAX_CONNECTIONS', '20'))
+    app.config['LLM_MAX_KEEPALIVE_CONNECTIONS'] = int(os.getenv('LLM_MAX_KEEPALIVE_CONNECTIONS', '10'))
+    app.config['LLM_MAX_CONCURRENCY'] = int(os.getenv('LLM_MAX_CONCURRENCY', '8'))
+    app.config['LLM_MAX_RETRIES'] = int(os.getenv('LLM_MAX_RETRIES', '3'))
+    
+    # Seconds an OpenAI call may take including retries (0 = only LLM_TIMEOUT per attempt)
+    app.config['LLM_DEADLINE'] = float(os.getenv('LLM_DEADLINE', '60'))
+    
+    # Hedging: resend a call that is still unanswered after LLM_HEDGE_AFTER seconds
+    # ('auto' = the LLM_HEDGE_QUANTILE of recent latencies, 'off' = never), for at
+    # most LLM_HEDGE_MAX_RATIO of calls
+    app.config['LLM_HEDGE_AFTER'] = os.getenv('LLM_HEDGE_AFTER', 'auto').lower()
+    app.config['LLM_HEDGE_QUANTILE'] = float(os.getenv('LLM_HEDGE_QUANTILE', '0.9'))
+    app.config['LLM_HEDGE_MAX_RATIO'] = float(os.getenv('LLM_HEDGE_MAX_RATIO', '0.2'))
+    
+    # Circuit breaker: stop calling OpenAI for LLM_BREAKER_RESET seconds after
+    # LLM_BREAKER_FAILURES failed calls in a row (0 = never)
+    app.config['LLM_BREAKER_FAILURES'] = int(os.getenv('LLM_BREAKER_FAILURES', '5'))
+    app.config['LLM_BREAKER_RESET'] = float(os.getenv('LLM_BREAKER_RESET', '30'))
+    
+    # Background jobs: worker threads per process (0 = none, use `flask autoquiz worker`)
+    app.config['JOB_WORKERS'] = int(os.getenv('JOB_WORKERS', '4'))
+    app.config['JOB_POLL_INTERVAL'] = float(os.getenv('JOB_POLL_INTERVAL', '1.0'))
+    # Seconds a running job's lease lasts; its worker renews it, and jobs whose
+    # lease ran out (crashed or hung process) are queued again
+    app.config['JOB_STALE_AFTER'] = float(os.getenv('JOB_STALE_AFTER', '60'))
+    
+    # Extract uploaded PDFs with the background job workers (false = during the upload request)
+    app.config['INGEST_ASYNC'] = os.getenv('INGEST_ASYNC', 'true').lower() == 'true'
+    
+    # Queue quiz generation as soon as a document's text has been extracted
+    app.config['QUIZ_PREGENERATE'] = os.getenv('QUIZ_PREGENERATE', 'false').lower() == 'true'
+    
+    # Serve a sample quiz when generation fails (false = report the error, e.g. for benchmarks)
+    app.config['QUIZ_FALLBACK_ENABLED'] = os.getenv('QUIZ_FALLBACK_ENABLED', 'true').lower() == 'true'
+    
+    # Topic-scoped quizzes use this many of the best matching chunks of a document
+    app.config['QUIZ_TOPIC_CHUNKS'] = int(os.getenv('QUIZ_TOPIC_CHUNKS', '8'))
+    
+    # Question bank: keep every generated question that is not a near duplicate
+    # (cosine similarity of at least QUESTION_BANK_SIMILARITY) of one already kept
+    app.config['QUESTION_BANK_ENABLED'] = os.getenv('QUESTION_BANK_ENABLED', 'true').lower() == 'true'
+    app.config['QUESTION_BANK_SIMILARITY'] = float(os.getenv('QUESTION_BANK_SIMILARITY', '0.75'))
+    app.config['QUESTION_BANK_DIMENSIONS'] = int(os.getenv('QUESTION_BANK_DIMENSIONS', '256'))
+    app.config['QUESTION_BANK_CACHE_DOCUMENTS'] = int(os.getenv('QUESTION_BANK_CACHE_DOCUMENTS', '64'))
+    
+    # Bank quizzes: generations made at most per request when the bank is short of questions
+    app.config['QUESTION_BANK_MAX_GENERATIONS'] = int(os.getenv('QUESTION_BANK_MAX_GENERATIONS', '3'))
     
     # Initialize extensions
     db.init_app(app)
+    sqlite.init_app(app)
+    blobstore.init_app(app)
+    uploads.init_app(app)
+    cache.init_app(app)
+    question_bank.init_app(app)
+    llm.init_app(app)
+    jobs.init_app(app)
+    metrics.init_app(app)
     
     # Register API routes with Swagger
     register_routes(app)
     
-    # Create database tables
+    # Register CLI commands (flask autoquiz ...)
+    app.cli.add_command(autoquiz_cli)
+    
+    # Create database tables (skipped when the schema is already current)
     with app.app_context():
-        db.create_all()
+        ensure_schema(search.create_index)
     
     return app
 
 if __name__ == '__main__':
+    # Development server; use wsgi.py with gunicorn in production
     app = create_app()
-    app.run(debug=True)
\ No newline at end of file
+    app.run(debug=app.config.get('DEBUG', False), threaded=True)
\ No newline at end of file
@@ -0,0 +1,161 @@
+import base64
+import click
+import datetime
+import os
+import time
+from flask import current_app
+from flask.cli import AppGroup
+from sqlalchemy import text
+from autoquiz.extensions import db
+from autoquiz.models import Document
+from autoquiz.utils.blobstore import get_blob_store
+from autoquiz.utils.compression import CODECS, compress_text, decompress_text, stored_codec
+from autoquiz.utils.hashing import sha256_bytes
+from autoquiz.utils.ingest import BULK_BATCH_SIZE, bulk_ingest
+from autoquiz.utils.jobs import get_job_queue
+
+autoquiz_cli = AppGroup('autoquiz', help='AutoQuiz maintenance commands.')
+
+
+@autoquiz_cli.command('migrate-blobs')
+@click.option('--batch-size', default=50, show_default=True, help='Documents committed per transaction.')
+def migrate_blobs(batch_size):
+    """Move base64 file data of existing documents into the blob store."""
+    store = get_blob_store()
+    doc_ids = [row.id for row in db.session.query(Document.id).filter(Document.file_data != '')]
+    click.echo(f'{len(doc_ids)} documents to migrate')
+
+    for done, doc_id in enumerate(doc_ids, start=1):
+        # Load one document at a time so only a single file is in memory
+        document = Document.query.get(doc_id)
+        file_bytes = base64.b64decode(document.file_data)
+        document.content_hash = document.content_hash or sha256_bytes(file_bytes)
+        store.put_bytes(document.content_hash, file_bytes)
+        document.file_data = ''
+        if done % batch_size == 0:
+            db.session.commit()
+            db.session.expunge_all()
+            click.echo(f'{done}/{len(doc_ids)} migrated')
+    db.session.commit()
+    click.echo('Done')
+
+
+@autoquiz_cli.command('compress-content')
+@click.option('--codec', type=click.Choice(sorted(CODECS)), help='Codec to store text with [default: CONTENT_CODEC].')
+@click.option('--batch-size', default=50, show_default=True, help='Documents committed per transaction.')
+@click.option('--vacuum/--no-vacuum', default=True, show_default=True, help='Run VACUUM afterwards to shrink the SQLite file.')
+def compress_content(codec, batch_size, vacuum):
+    """Rewrite extracted text stored as plain text or with another codec."""
+    codec = codec or current_app.config.get('CONTENT_CODEC', 'zlib')
+    doc_ids = [row.id for row in db.session.query(Document.id).order_by(Document.id)]
+    rewritten = 0
+    before = after = 0
+
+    for done, doc_id in enumerate(doc_ids, start=1):
+        # Raw column values: the text is re-encoded without going through the
+        # model, so the content validator does not reset compact_content
+        row = db.session.execute(
+            text('SELECT content, compact_content FROM documents WHERE id = :id'), {'id': doc_id}
+        ).one()
+        values = {}
+        for name, raw in zip(('content', 'compact_content'), row):
+            # Values already written with the codec are not decompressed again
+            if raw is None or stored_codec(raw) == codec:
+                continue
+            stored = raw.encode('utf-8') if isinstance(raw, str) else bytes(raw)
+            encoded = compress_text(decompress_text(raw), codec)
+            if isinstance(raw, str) or encoded != stored:
+                values[name] = encoded
+                before += len(stored)
+                after += len(encoded)
+        if values:
+            assignments = ', '.join(f'{name} = :{name}' for name in values)
+            db.session.execute(text(f'UPDATE documents SET {assignments} WHERE id = :id'), {'id': doc_id, **values})
+            rewritten += 1
+        if done % batch_size == 0:
+            db.session.commit()
+            click.echo(f'{done}/{len(doc_ids)} checked, {rewritten} rewritten')
+    db.session.commit()
+    click.echo(f'Rewrote {rewritten} of {len(doc_ids)} documents with {codec}: {before:,} -> {after:,} bytes')
+
+    if vacuum and db.engine.dialect.name == 'sqlite':
+        with db.engine.connect() as conn:
+            conn.execution_options(isolation_level='AUTOCOMMIT').execute(text('VACUUM'))
+        click.echo('Vacuumed the database')
+
+
+@autoquiz_cli.command('ingest')
+@click.argument('directory', type=click.Path(exists=True, file_okay=False))
+@click.option('--recursive/--no-recursive', default=True, show_default=True, help='Include PDFs in subdirectories.')
+@click.option('--workers', type=int, help='Extraction processes [default: CPU count].')
+@click.option('--batch-size', default=BULK_BATCH_SIZE, show_default=True, help='Documents committed per transaction.')
+@click.option('--manifest', type=click.Path(dir_okay=False),
+              help='File listing the hashes of completed files [default: DIRECTORY/.autoquiz-manifest].')
+def ingest(directory, recursive, workers, batch_size, manifest):
+    """Import every PDF in DIRECTORY as a document.
+
+    Files are extracted in parallel and written in batches. Each committed
+    file is appended to the manifest, so an interrupted import picks up where
+    it stopped when run again; files already stored are skipped as well.
+    """
+    paths = sorted(find_pdfs(directory, recursive))
+    manifest = manifest or os.path.join(directory, '.autoquiz-manifest')
+    completed = set()
+    if os.path.exists(manifest):
+        with open(manifest) as f:
+            completed = {line.split('\t', 1)[0] for line in f if line.strip()}
+    click.echo(f'{len(paths)} PDF files in {directory}, {len(completed)} in the manifest')
+
+    counts = {'ready': 0, 'failed': 0, 'skipped': 0}
+    pages = 0
+    start = time.monotonic()
+    with open(manifest, 'a') as log:
+        for done, result in enumerate(bulk_ingest(paths, workers, batch_size, completed), start=1):
+            counts[result.status] += 1
+            pages += result.pages
+            if result.status != 'skipped':
+                log.write(f'{result.content_hash}\t{result.status}\t{result.path}\n')
+            if result.status == 'failed':
+                click.echo(f'Failed: {result.path}', err=True)
+            if done % batch_size == 0 or done == len(paths):
+                # The manifest only lists committed documents
+                log.flush()
+                imported = counts['ready'] + counts['failed']
+                elapsed = time.monotonic() - start
+                rate = imported / elapsed if elapsed else 0
+                remaining = (len(paths) - done) / rate if rate else 0
+                click.echo(
+                    f'{done}/{len(paths)} files, {imported} imported, {counts["skipped"]} skipped, '
+                    f'{rate * 60:.0f} files/min, {pages / elapsed if elapsed else 0:.1f} pages/s, '
+                    f'ETA {datetime.timedelta(seconds=round(remaining))}'
+                )
+    elapsed = time.monotonic() - start
+    click.echo(
+        f'Imported {counts["ready"]} documents ({counts["failed"]} failed, {counts["skipped"]} skipped, '
+        f'{pages} pages) in {datetime.timedelta(seconds=round(elapsed))}'
+    )
+
+
+def find_pdfs(directory, recursive=True):
+    """Yield the paths of the PDF files in a directory"""
+    for root, dirs, files in os.walk(directory):
+        for name in files:
+            if name.lower().endswith('.pdf'):
+                yield os.path.join(root, name)
+        if not recursive:
+            break
+
+
+@autoquiz_cli.command('worker')
+@click.option('--threads', default=4, show_default=True, help='Worker threads.')
+def worker(threads):
+    """Run background jobs in the foreground until interrupted."""
+    queue = get_job_queue()
+    queue.workers = threads
+    queue.start()
+    click.echo(f'Running {threads} job worker threads, press Ctrl+C to stop')
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        queue.stop()
@@ -1,3 +1,9 @@
+from autoquiz.models.bank import BankQuestion
+from autoquiz.models.blob import Blob
+from autoquiz.models.cache import CachedQuiz
 from autoquiz.models.document import Document
+from autoquiz.models.job import Job
+from autoquiz.models.page import DocumentPage
+from autoquiz.models.quiz import Quiz
 
-__all__ = ['Document']
\ No newline at end of file
+__all__ = ['BankQuestion', 'Blob', 'CachedQuiz', 'Document', 'DocumentPage', 'Job', 'Quiz']
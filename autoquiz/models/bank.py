@@ -0,0 +1,44 @@
+from autoquiz.extensions import db
+import datetime
+import json
+
+class BankQuestion(db.Model):
+    """
+    Model for the question bank: every distinct question generated for a document.
+    - id: Primary key
+    - document_id: Document the question was generated from
+    - question: Question text
+    - options: Answer options, as a JSON list
+    - answer: Correct answer
+    - topic: Normalized topic of the generation, empty for the whole document
+    - source_hash: SHA-256 of the text the question was generated from, to tell
+      which questions a revised document file invalidates
+    - vector: Hashed n-gram embedding of the question and answer, float16
+      (see autoquiz.utils.question_bank)
+    - created_at: When the question was generated
+    
+    A question is only added if no question of the same document is a near
+    duplicate of it, so quizzes can be built from the bank without the LLM.
+    """
+    __tablename__ = 'question_bank'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    document_id = db.Column(db.Integer, db.ForeignKey('documents.id', ondelete='CASCADE'), nullable=False, index=True)
+    question = db.Column(db.Text, nullable=False)
+    options = db.Column(db.Text, nullable=False)
+    answer = db.Column(db.Text, nullable=False)
+    topic = db.Column(db.String(255), nullable=False, default='', server_default='')
+    source_hash = db.Column(db.String(64), nullable=True)
+    vector = db.deferred(db.Column(db.LargeBinary, nullable=False))
+    created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow, nullable=False)
+    
+    def __repr__(self):
+        return f'<BankQuestion {self.id} for document {self.document_id}>'
+    
+    def to_question(self):
+        """Convert the row to a question dictionary, as returned by quiz generation"""
+        return {
+            'question': self.question,
+            'options': json.loads(self.options),
+            'answer': self.answer
+        }
@@ -0,0 +1,17 @@
+from autoquiz.extensions import db
+
+class Blob(db.Model):
+    """
+    Model for file contents kept by the database blob store.
+    - key: SHA-256 of the data
+    - data: Raw bytes
+    - size: Length of data in bytes
+    """
+    __tablename__ = 'blobs'
+    
+    key = db.Column(db.String(64), primary_key=True)
+    data = db.deferred(db.Column(db.LargeBinary, nullable=False))
+    size = db.Column(db.Integer, nullable=False)
+    
+    def __repr__(self):
+        return f'<Blob {self.key}>'
@@ -0,0 +1,20 @@
+from autoquiz.extensions import db
+import datetime
+
+class CachedQuiz(db.Model):
+    """
+    Model for the durable tier of the quiz generation cache.
+    - key: Hash of the normalized input and generation settings
+    - value: Generated quiz as JSON
+    - created_at: When the entry was stored, used for TTL expiry
+    - accessed_at: Last time the entry was read, used for size-based eviction
+    """
+    __tablename__ = 'quiz_cache'
+    
+    key = db.Column(db.String(64), primary_key=True)
+    value = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow, nullable=False)
+    accessed_at = db.Column(db.DateTime, default=datetime.datetime.utcnow, nullable=False, index=True)
+    
+    def __repr__(self):
+        return f'<CachedQuiz {self.key}>'
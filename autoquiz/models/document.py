@@ -1,4 +1,5 @@
 from autoquiz.extensions import db
+from autoquiz.utils.compression import CompressedText
 import datetime
 
 class Document(db.Model):
@@ -7,16 +8,60 @@ class Document(db.Model):
     - id: Primary key
     - filename: Original filename 
     - content: Extracted text content from the PDF
-    - file_data: Base64 encoded PDF file data
-    - upload_date: When the document was uploaded
+    - compact_content: Content without running headers/footers, page numbers and
+      hyphenation, as sent to the model; filled at ingest
+    - content_tokens: Token count of compact_content
+    - file_data: Legacy base64 encoded PDF file data, empty once the file is in the blob store
+    - content_length: Length of the extracted text, kept so listings never load it
+    - content_hash: SHA-256 of the uploaded file, used to detect duplicate uploads
+      and as the key of the file in the blob store
+    - upload_date: When the document was uploaded; listings page through (upload_date, id)
+    - status: Text extraction state: pending, processing, ready or failed
+    - pages_total / pages_done: Extraction progress
+    - error: Why extraction failed
+    - pages: Extracted text and content hash of each page (DocumentPage)
+    - bank_questions: Distinct questions generated from the document (BankQuestion)
+    
+    `content`, `compact_content` and `file_data` can be very large, so they are
+    deferred and only loaded when accessed. `content` and `compact_content` are
+    stored compressed (see CompressedText) and decompressed when loaded.
     """
     __tablename__ = 'documents'
+    __table_args__ = (
+        db.Index('ix_documents_upload_date_id', 'upload_date', 'id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     filename = db.Column(db.String(255), nullable=False)
-    content = db.Column(db.Text, nullable=True)
-    file_data = db.Column(db.Text, nullable=False)  # Base64 encoded file
+    content = db.deferred(db.Column(CompressedText, nullable=True))
+    compact_content = db.deferred(db.Column(CompressedText, nullable=True))
+    content_tokens = db.Column(db.Integer, nullable=True)
+    file_data = db.deferred(db.Column(db.Text, nullable=False, default=''))  # Legacy base64 encoded file
+    content_length = db.Column(db.Integer, nullable=False, server_default='0')
+    content_hash = db.Column(db.String(64), nullable=True, index=True)
     upload_date = db.Column(db.DateTime, default=datetime.datetime.utcnow)
+    status = db.Column(db.String(16), nullable=False, default='pending', server_default='ready')
+    pages_total = db.Column(db.Integer, nullable=True)
+    pages_done = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    error = db.Column(db.Text, nullable=True)
+    
+    quizzes = db.relationship('Quiz', backref='document', lazy='dynamic', cascade='all, delete-orphan')
+    pages = db.relationship('DocumentPage', backref='document', lazy='dynamic', cascade='all, delete-orphan',
+                            order_by='DocumentPage.page_number')
+    bank_questions = db.relationship('BankQuestion', backref='document', lazy='dynamic', cascade='all, delete-orphan')
+    
+    PENDING = 'pending'
+    PROCESSING = 'processing'
+    READY = 'ready'
+    FAILED = 'failed'
+    
+    @db.validates('content')
+    def _update_content_length(self, key, value):
+        """Keep content_length in step with content; the compacted text is redone"""
+        self.content_length = len(value) if value else 0
+        self.compact_content = None
+        self.content_tokens = None
+        return value
     
     def __repr__(self):
         return f'<Document {self.filename}>'
@@ -27,5 +72,9 @@ class Document(db.Model):
             'id': self.id,
             'filename': self.filename,
             'upload_date': self.upload_date.isoformat(),
-            'content_length': len(self.content) if self.content else 0
+            'content_length': self.content_length or 0,
+            'status': self.status,
+            'pages_total': self.pages_total,
+            'pages_done': self.pages_done,
+            'error': self.error
         }
\ No newline at end of file
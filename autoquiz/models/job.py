@@ -0,0 +1,54 @@
+from autoquiz.extensions import db
+import datetime
+import json
+import uuid
+
+class Job(db.Model):
+    """
+    Model for background jobs run by the local worker pool.
+    - id: Random hex identifier handed to clients
+    - kind: Name of the handler that runs the job (e.g. 'quiz')
+    - status: queued, running, succeeded or failed
+    - payload: Job arguments as JSON
+    - result: Handler return value as JSON, once succeeded
+    - error: Error message, once failed
+    - created_at / started_at / finished_at: Lifecycle timestamps
+    - lease_expires_at: While running, when the job is considered abandoned
+      unless its worker renews the lease
+    """
+    __tablename__ = 'jobs'
+    
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    
+    id = db.Column(db.String(32), primary_key=True, default=lambda: uuid.uuid4().hex)
+    kind = db.Column(db.String(32), nullable=False)
+    status = db.Column(db.String(16), nullable=False, default=QUEUED, index=True)
+    payload = db.Column(db.Text, nullable=False, default='{}')
+    result = db.deferred(db.Column(db.Text, nullable=True))
+    error = db.Column(db.Text, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow, nullable=False, index=True)
+    started_at = db.Column(db.DateTime, nullable=True)
+    finished_at = db.Column(db.DateTime, nullable=True)
+    lease_expires_at = db.Column(db.DateTime, nullable=True)
+    
+    def __repr__(self):
+        return f'<Job {self.id} {self.kind} {self.status}>'
+    
+    def to_dict(self):
+        """Convert the model to a dictionary for API responses"""
+        data = {
+            'id': self.id,
+            'kind': self.kind,
+            'status': self.status,
+            'created_at': self.created_at.isoformat(),
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+        if self.status == self.SUCCEEDED:
+            data['result'] = json.loads(self.result) if self.result else None
+        if self.status == self.FAILED:
+            data['error'] = self.error
+        return data
@@ -0,0 +1,29 @@
+from autoquiz.extensions import db
+from autoquiz.utils.compression import CompressedText
+
+class DocumentPage(db.Model):
+    """
+    Model for the extracted text of a single page of a document.
+    - id: Primary key
+    - document_id: Document the page belongs to
+    - page_number: 1-based page number
+    - content_hash: Fingerprint of the page's content streams (see
+      autoquiz.utils.pdf.page_content_hash), empty if the page failed to extract
+    - text: Extracted text of the page, stored compressed
+    
+    When a revised file replaces a document, only pages whose hash is not
+    among the stored pages are extracted again.
+    """
+    __tablename__ = 'document_pages'
+    __table_args__ = (
+        db.UniqueConstraint('document_id', 'page_number', name='uq_document_pages_page'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    document_id = db.Column(db.Integer, db.ForeignKey('documents.id', ondelete='CASCADE'), nullable=False, index=True)
+    page_number = db.Column(db.Integer, nullable=False)
+    content_hash = db.Column(db.String(64), nullable=True)
+    text = db.deferred(db.Column(CompressedText, nullable=False))
+    
+    def __repr__(self):
+        return f'<DocumentPage {self.page_number} of document {self.document_id}>'
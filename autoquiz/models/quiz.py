@@ -0,0 +1,63 @@
+from autoquiz.extensions import db
+import datetime
+import hashlib
+import json
+
+class Quiz(db.Model):
+    """
+    Model for quizzes generated from a document and kept for later reads.
+    - id: Primary key
+    - document_id: Document the quiz was generated from
+    - questions: Questions with their options and answers, as JSON
+    - num_questions: Number of questions that was requested
+    - topic: Normalized topic the quiz was scoped to, empty for the whole document
+    - model: OpenAI model that generated the quiz
+    - prompt_version: Version of the prompt template used
+    - etag: Strong validator of the quiz as returned by to_dict()
+    - source_hash: SHA-256 of the text the quiz was generated from, to tell
+      which quizzes a revised document file invalidates
+    - created_at: When the quiz was generated
+    """
+    __tablename__ = 'quizzes'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    document_id = db.Column(db.Integer, db.ForeignKey('documents.id', ondelete='CASCADE'), nullable=False, index=True)
+    questions = db.Column(db.Text, nullable=False)
+    num_questions = db.Column(db.Integer, nullable=False)
+    topic = db.Column(db.String(255), nullable=False, default='', server_default='')
+    model = db.Column(db.String(64), nullable=False)
+    prompt_version = db.Column(db.Integer, nullable=False)
+    etag = db.Column(db.String(64), nullable=False)
+    source_hash = db.Column(db.String(64), nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.datetime.utcnow, nullable=False)
+    
+    @classmethod
+    def from_questions(cls, questions, **kwargs):
+        """
+        Create a quiz from a list of question dictionaries
+        
+        The ETag covers the quiz's id, so call update_etag() once the quiz is flushed.
+        """
+        serialized = json.dumps(questions, sort_keys=True, separators=(',', ':'))
+        kwargs.setdefault('created_at', datetime.datetime.utcnow())
+        return cls(questions=serialized, etag='', **kwargs)
+    
+    def update_etag(self):
+        """Derive the ETag from the whole representation, so it changes with any field of to_dict()"""
+        serialized = json.dumps(self.to_dict(), sort_keys=True, separators=(',', ':'))
+        self.etag = hashlib.sha256(serialized.encode('utf-8')).hexdigest()
+    
+    def __repr__(self):
+        return f'<Quiz {self.id} for document {self.document_id}>'
+    
+    def to_dict(self):
+        """Convert the model to a dictionary for API responses"""
+        return {
+            'id': self.id,
+            'document_id': self.document_id,
+            'quiz': json.loads(self.questions),
+            'topic': self.topic or None,
+            'model': self.model,
+            'prompt_version': self.prompt_version,
+            'created_at': self.created_at.isoformat()
+        }
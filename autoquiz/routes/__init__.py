@@ -14,9 +14,11 @@ def register_routes(app):
     # Import namespaces
     from autoquiz.routes.documents import ns as documents_ns
     from autoquiz.routes.quiz import ns as quiz_ns
+    from autoquiz.routes.metrics import ns as metrics_ns
     
     # Add namespaces to the API
     api.add_namespace(documents_ns)
     api.add_namespace(quiz_ns)
+    api.add_namespace(metrics_ns)
     
     return api
\ No newline at end of file
@@ -1,11 +1,19 @@
-from flask import request
+from flask import request, Response, stream_with_context
 from flask_restx import Namespace, Resource, fields, reqparse
+from sqlalchemy import tuple_
 from werkzeug.datastructures import FileStorage
+from werkzeug.http import dump_options_header
+from werkzeug.urls import url_quote
 from autoquiz.extensions import db
 from autoquiz.models import Document
-from autoquiz.utils.pdf import extract_pdf_text, encode_file_to_base64
-import os
-import tempfile
+from autoquiz.utils.ingest import schedule_ingestion
+from autoquiz.utils import search
+from autoquiz.utils.blobstore import get_blob_store
+from autoquiz.utils.metrics import stage
+from autoquiz.utils.uploads import upload_digest
+import base64
+import datetime
+import unicodedata
 
 # Create namespace
 ns = Namespace('api/documents', description='Document operations')
@@ -16,6 +24,10 @@ document_response = ns.model('DocumentResponse', {
     'filename': fields.String(description='Original filename'),
     'upload_date': fields.String(description='Upload timestamp'),
     'content_length': fields.Integer(description='Length of extracted text'),
+    'status': fields.String(description='Text extraction state: pending, processing, ready or failed'),
+    'pages_total': fields.Integer(description='Number of pages, once known'),
+    'pages_done': fields.Integer(description='Pages extracted so far'),
+    'error': fields.String(description='Why text extraction failed'),
     'message': fields.String(description='Status message')
 })
 
@@ -23,12 +35,17 @@ document_list_item = ns.model('DocumentListItem', {
     'id': fields.Integer(description='Document ID'),
     'filename': fields.String(description='Original filename'),
     'upload_date': fields.String(description='Upload timestamp'),
-    'content_length': fields.Integer(description='Length of extracted text')
+    'content_length': fields.Integer(description='Length of extracted text'),
+    'status': fields.String(description='Text extraction state: pending, processing, ready or failed'),
+    'pages_total': fields.Integer(description='Number of pages, once known'),
+    'pages_done': fields.Integer(description='Pages extracted so far'),
+    'error': fields.String(description='Why text extraction failed')
 })
 
 document_list = ns.model('DocumentList', {
     'documents': fields.List(fields.Nested(document_list_item)),
-    'count': fields.Integer(description='Total number of documents')
+    'count': fields.Integer(description='Number of documents in this page'),
+    'next_cursor': fields.String(description='Value of cursor for the next page, null on the last page')
 })
 
 error_response = ns.model('ErrorResponse', {
@@ -39,32 +56,90 @@ error_response = ns.model('ErrorResponse', {
 upload_parser = ns.parser()
 upload_parser.add_argument('file', location='files', type=FileStorage, required=True, help='PDF file')
 
+# Listing parser (keyset pagination on (upload_date, id), see ix_documents_upload_date_id)
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+list_parser = ns.parser()
+list_parser.add_argument('cursor', type=str, location='args', help='next_cursor of the previous page')
+list_parser.add_argument('limit', type=int, location='args', default=DEFAULT_PAGE_SIZE,
+                         help=f'Maximum number of documents to return (at most {MAX_PAGE_SIZE})')
+
+def encode_cursor(document):
+    """Opaque listing cursor pointing after a document"""
+    position = f'{document.upload_date.isoformat()}|{document.id}'
+    return base64.urlsafe_b64encode(position.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """
+    Read a cursor made by encode_cursor
+
+    Returns:
+        tuple: (upload_date, id) of the last document of the previous page
+
+    Raises:
+        ValueError: If the cursor is malformed (binascii.Error and UnicodeError included)
+    """
+    upload_date, doc_id = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8').split('|')
+    return datetime.datetime.fromisoformat(upload_date), int(doc_id)
+
+
 @ns.route('')
 class DocumentListResource(Resource):
     @ns.doc('list_documents')
+    @ns.expect(list_parser)
     @ns.response(200, 'Success', document_list)
+    @ns.response(400, 'Invalid cursor', error_response)
     def get(self):
         """
-        Get a list of all uploaded documents
+        Get a page of uploaded documents
         
-        This endpoint returns a list of all documents in the database.
+        This endpoint returns documents in upload order. Pass the returned `next_cursor` as
+        `cursor` to fetch the next page.
         """
-        documents = Document.query.all()
+        args = list_parser.parse_args()
+        limit = max(1, min(args['limit'] or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE))
+        
+        query = Document.query.order_by(Document.upload_date, Document.id)
+        if args['cursor']:
+            try:
+                upload_date, doc_id = decode_cursor(args['cursor'])
+            except ValueError:
+                return {'error': 'Invalid cursor'}, 400
+            query = query.filter(tuple_(Document.upload_date, Document.id) > tuple_(upload_date, doc_id))
+        
+        # Fetch one extra row to know whether another page exists
+        documents = query.limit(limit + 1).all()
+        has_more = len(documents) > limit
+        documents = documents[:limit]
+        
         return {
             'documents': [doc.to_dict() for doc in documents],
-            'count': len(documents)
+            'count': len(documents),
+            'next_cursor': encode_cursor(documents[-1]) if has_more else None
         }
     
     @ns.doc('upload_document')
     @ns.expect(upload_parser)
-    @ns.response(201, 'Document uploaded successfully', document_response)
+    @ns.response(200, 'Document was already uploaded', document_response)
+    @ns.response(201, 'Document uploaded and extracted', document_response)
+    @ns.response(202, 'Document uploaded, text extraction pending', document_response)
     @ns.response(400, 'Validation Error', error_response)
+    @ns.response(413, 'File larger than UPLOAD_MAX_BYTES')
+    @ns.response(422, 'Text extraction failed (with INGEST_ASYNC off)', document_response)
     @ns.response(500, 'Internal Server Error', error_response)
     def post(self):
         """
         Upload a PDF document to the database
         
-        This endpoint accepts a PDF file, extracts its text content, and stores both in the database.
+        This endpoint stores a PDF file and returns right away with the document in the `pending`
+        state; its text is extracted in the background. Poll `GET /api/documents/<doc_id>` until
+        `status` is `ready` (or `failed`). Files are identified by their SHA-256 hash: uploading
+        a file that is already stored returns the existing document instead of storing it again.
+        Files larger than `UPLOAD_MAX_BYTES` are rejected with `413` before they are read. With
+        `INGEST_ASYNC` off the text is extracted during the request, and `422` with the extraction
+        error is returned if that fails.
         """
         args = upload_parser.parse_args()
         uploaded_file = args['file']
@@ -74,33 +149,54 @@ class DocumentListResource(Resource):
             return {'error': 'Only PDF files are supported'}, 400
         
         try:
-            # Create a temporary file to work with pdfplumber
-            with tempfile.NamedTemporaryFile(delete=False) as temp:
-                uploaded_file.save(temp.name)
-                
-                # Extract text from PDF
-                text_content = extract_pdf_text(temp.name)
-                
-                # Encode file as base64
-                file_base64 = encode_file_to_base64(temp.name)
-            
-            # Clean up temporary file
-            os.unlink(temp.name)
-            
-            # Create new document record
+            # The upload was hashed while it was received (see autoquiz/utils/uploads.py)
+            with stage('upload_hash'):
+                content_hash = upload_digest(uploaded_file)
+            
+            # Reuse the stored document if these exact bytes were uploaded before
+            with stage('document_lookup'):
+                existing_doc = Document.query.filter_by(content_hash=content_hash).first()
+            if existing_doc:
+                # Give failed extractions another chance
+                if existing_doc.status == Document.FAILED:
+                    existing_doc.status = Document.PENDING
+                    db.session.commit()
+                    schedule_ingestion(existing_doc)
+                    if existing_doc.status == Document.FAILED:
+                        return extraction_failed(existing_doc)
+                response_data = existing_doc.to_dict()
+                response_data['message'] = 'Document was already uploaded'
+                return response_data, 200
+            
+            # Store the raw bytes in the blob store, keyed by their hash. The
+            # upload buffer is released when the request ends, whatever happens
+            with stage('blob_put'):
+                get_blob_store().put_stream(content_hash, uploaded_file.stream)
+            
+            # Create new document record, text is extracted by the ingestion worker
             new_doc = Document(
                 filename=uploaded_file.filename,
-                content=text_content,
-                file_data=file_base64
+                content_hash=content_hash,
+                status=Document.PENDING
             )
             
             # Save to database
-            db.session.add(new_doc)
-            db.session.commit()
+            with stage('db_commit'):
+                db.session.add(new_doc)
+                db.session.commit()
+            
+            with stage('schedule_ingestion'):
+                schedule_ingestion(new_doc)
+            
+            if new_doc.status == Document.FAILED:
+                return extraction_failed(new_doc)
             
             response_data = new_doc.to_dict()
-            response_data['message'] = 'Document uploaded successfully'
+            if new_doc.status == Document.PENDING:
+                response_data['message'] = 'Document uploaded, text extraction pending'
+                return response_data, 202, {'Location': f'/api/documents/{new_doc.id}'}
             
+            response_data['message'] = 'Document uploaded successfully'
             return response_data, 201
             
         except Exception as e:
@@ -118,7 +214,8 @@ class DocumentResource(Resource):
         
         This endpoint retrieves a document by its ID.
         """
-        document = Document.query.get(doc_id)
+        with stage('document_lookup'):
+            document = Document.query.get(doc_id)
         
         if not document:
             return {'error': f'Document with ID {doc_id} not found'}, 404
@@ -134,12 +231,186 @@ class DocumentResource(Resource):
         
         This endpoint deletes a document from the database.
         """
-        document = Document.query.get(doc_id)
+        with stage('document_lookup'):
+            document = Document.query.get(doc_id)
         
         if not document:
             return {'error': f'Document with ID {doc_id} not found'}, 404
         
+        content_hash = document.content_hash
+        search.delete_document(doc_id)
         db.session.delete(document)
         db.session.commit()
+        release_blob(content_hash)
+        
+        return {'message': f'Document with ID {doc_id} deleted successfully'}
+    
+    @ns.doc('replace_document')
+    @ns.expect(upload_parser)
+    @ns.response(200, 'Document replaced and re-extracted, or the file is unchanged', document_response)
+    @ns.response(202, 'Document replaced, text extraction pending', document_response)
+    @ns.response(400, 'Validation Error', error_response)
+    @ns.response(404, 'Document not found', error_response)
+    @ns.response(409, 'Document text is still being extracted', error_response)
+    @ns.response(413, 'File larger than UPLOAD_MAX_BYTES')
+    @ns.response(422, 'Text extraction failed (with INGEST_ASYNC off)', document_response)
+    @ns.response(500, 'Internal Server Error', error_response)
+    def put(self, doc_id):
+        """
+        Replace the PDF file of a document with a revised version
+        
+        The document keeps its ID. Its pages are hashed and only pages whose content is new are
+        extracted again; the text of the other pages, their indexed chunks and stored quizzes whose
+        source text did not change are kept. Like uploads, the text is extracted in the background:
+        poll `GET /api/documents/<doc_id>` until `status` is `ready`. Uploading the current file
+        again changes nothing. A document whose text is still being extracted can't be replaced.
+        With `INGEST_ASYNC` off a failed extraction is reported with `422`.
+        """
+        args = upload_parser.parse_args()
+        uploaded_file = args['file']
+        
+        # Validate file type
+        if not uploaded_file.filename.lower().endswith('.pdf'):
+            return {'error': 'Only PDF files are supported'}, 400
+        
+        with stage('document_lookup'):
+            document = Document.query.get(doc_id)
+        
+        if not document:
+            return {'error': f'Document with ID {doc_id} not found'}, 404
+        
+        if document.status in (Document.PENDING, Document.PROCESSING):
+            return {
+                'error': f'Document with ID {doc_id} is still being extracted, try again once its status is ready',
+                'status': document.status
+            }, 409
+        
+        try:
+            with stage('upload_hash'):
+                content_hash = upload_digest(uploaded_file)
+            
+            if content_hash == document.content_hash and document.status == Document.READY:
+                response_data = document.to_dict()
+                response_data['message'] = 'Document file is unchanged'
+                return response_data, 200
+            
+            with stage('blob_put'):
+                get_blob_store().put_stream(content_hash, uploaded_file.stream)
+            
+            old_hash = document.content_hash
+            document.content_hash = content_hash
+            document.filename = uploaded_file.filename
+            document.status = Document.PENDING
+            with stage('db_commit'):
+                db.session.commit()
+            if old_hash != content_hash:
+                release_blob(old_hash)
+            
+            with stage('schedule_ingestion'):
+                schedule_ingestion(document)
+            
+            if document.status == Document.FAILED:
+                return extraction_failed(document)
+            
+            response_data = document.to_dict()
+            if document.status == Document.PENDING:
+                response_data['message'] = 'Document replaced, text extraction pending'
+                return response_data, 202, {'Location': f'/api/documents/{document.id}'}
+            
+            response_data['message'] = 'Document replaced successfully'
+            return response_data, 200
+            
+        except Exception as e:
+            return {'error': f'Error processing document: {str(e)}'}, 500
+
+def extraction_failed(document):
+    """Response for a document whose text could not be extracted during the request"""
+    response_data = document.to_dict()
+    response_data['error'] = document.error or 'Error extracting text from PDF'
+    return response_data, 422
+
+def release_blob(content_hash):
+    """Drop a stored file once no document refers to it any more"""
+    if content_hash and not Document.query.filter_by(content_hash=content_hash).first():
+        get_blob_store().delete(content_hash)
+
+def content_disposition(filename):
+    """
+    Build an attachment Content-Disposition header the way werkzeug's send_file does
+    
+    Control characters are dropped, so a stored filename can't break the header.
+    Non-ASCII names get an ASCII approximation in `filename` and the exact name,
+    percent-encoded, in `filename*` (RFC 5987).
+    
+    Args:
+        filename (str): Original filename of the upload
+        
+    Returns:
+        str: Header value
+    """
+    filename = ''.join(char for char in filename or '' if unicodedata.category(char) != 'Cc')
+    try:
+        filename.encode('ascii')
+    except UnicodeEncodeError:
+        simple = unicodedata.normalize('NFKD', filename).encode('ascii', 'ignore').decode('ascii')
+        quoted = url_quote(filename, safe='!#$&+^`|~')
+        return dump_options_header('attachment', {'filename': simple, 'filename*': f"UTF-8''{quoted}"})
+    return dump_options_header('attachment', {'filename': filename})
+
+@ns.route('/<int:doc_id>/file')
+@ns.param('doc_id', 'The document identifier')
+class DocumentFileResource(Resource):
+    @ns.doc('download_document_file')
+    @ns.response(200, 'PDF file')
+    @ns.response(206, 'Requested byte range of the PDF file')
+    @ns.response(404, 'Document not found', error_response)
+    @ns.response(416, 'Requested range not satisfiable', error_response)
+    def get(self, doc_id):
+        """
+        Download the original PDF file of a document
+        
+        The file is streamed in chunks. A `Range: bytes=start-end` header returns only that part of the file.
+        """
+        with stage('document_lookup'):
+            document = Document.query.get(doc_id)
+        
+        if not document:
+            return {'error': f'Document with ID {doc_id} not found'}, 404
+        
+        store = get_blob_store()
+        size = store.size(document.content_hash) if document.content_hash else None
+        
+        if size is None:
+            if not document.file_data:
+                return {'error': f'File for document with ID {doc_id} not found'}, 404
+            # Legacy row that has not been moved to the blob store yet
+            file_bytes = base64.b64decode(document.file_data)
+            size = len(file_bytes)
+            chunks = lambda start, stop: iter([file_bytes[start:stop]])
+        else:
+            chunks = lambda start, stop: store.iter_range(document.content_hash, start, stop)
+        
+        headers = {
+            'Accept-Ranges': 'bytes',
+            'Content-Disposition': content_disposition(document.filename)
+        }
+        status = 200
+        start, stop = 0, size
+        
+        if request.range:
+            byte_range = request.range.range_for_length(size)
+            if byte_range is None:
+                headers['Content-Range'] = f'bytes */{size}'
+                return {'error': 'Requested range not satisfiable'}, 416, headers
+            start, stop = byte_range
+            headers['Content-Range'] = request.range.to_content_range_header(size)
+            status = 206
         
-        return {'message': f'Document with ID {doc_id} deleted successfully'}
\ No newline at end of file
+        headers['Content-Length'] = str(stop - start)
+        return Response(
+            stream_with_context(chunks(start, stop)),
+            status=status,
+            headers=headers,
+            mimetype='application/pdf',
+            direct_passthrough=True
+        )
\ No newline at end of file
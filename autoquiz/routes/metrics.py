@@ -0,0 +1,20 @@
+from flask import Response
+from flask_restx import Namespace, Resource
+from autoquiz.utils.metrics import get_metrics
+
+# Create namespace
+ns = Namespace('metrics', description='Service metrics', path='/metrics')
+
+@ns.route('')
+class MetricsResource(Resource):
+    @ns.doc('get_metrics')
+    @ns.produces(['text/plain'])
+    @ns.response(200, 'Metrics in the Prometheus text format')
+    def get(self):
+        """
+        Get the service metrics of this process
+        
+        Stage latencies (`autoquiz_stage_seconds`), request latencies, quiz fallbacks,
+        quiz cache lookups, OpenAI retries and token usage, and extracted PDF pages.
+        """
+        return Response(get_metrics().render(), mimetype='text/plain; version=0.0.4')
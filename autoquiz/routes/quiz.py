@@ -1,8 +1,35 @@
-from flask import request
-from flask_restx import Namespace, Resource, fields
-from autoquiz.models import Document
-import os
-import re
+from flask import request, current_app, jsonify, Response, stream_with_context
+from flask_restx import Namespace, Resource, fields, inputs
+from autoquiz.extensions import db
+from autoquiz.models import Document, Job, Quiz
+from autoquiz.utils.jobs import get_job_queue, job_handler
+from autoquiz.utils.cache import get_quiz_cache, make_cache_key, normalize_text
+from autoquiz.utils.tokens import count_tokens, split_into_chunks
+from autoquiz.utils.compaction import compact_page
+from autoquiz.utils.hashing import sha256_bytes
+from autoquiz.utils.llm import get_llm_client
+from autoquiz.utils.question_bank import get_question_bank
+from autoquiz.utils.sources import document_text
+from autoquiz.utils.quiz_parser import (
+    IncrementalJSONQuizParser, IncrementalQuizParser, parse_quiz_json, parse_quiz_to_json
+)
+from autoquiz.utils.metrics import BANK_QUIZZES, QUIZ_FALLBACKS, stage
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy.orm import undefer
+from itertools import zip_longest
+import json
+import math
+
+# Generation settings. Bump PROMPT_VERSION whenever create_prompt changes so
+# cached quizzes made with the old prompt are no longer served. The response
+# format (QUIZ_RESPONSE_FORMAT) only changes how the questions are returned,
+# so quizzes made with either format are shared.
+QUIZ_MODEL = "gpt-3.5-turbo"
+QUIZ_TEMPERATURE = 0.7
+QUIZ_MAX_TOKENS = 500
+PROMPT_OVERHEAD_TOKENS = 150  # the prompt template around the source text
+PROMPT_VERSION = 1
+DEFAULT_NUM_QUESTIONS = 3
 
 # Create namespace
 ns = Namespace('api/quiz', description='Quiz operations')
@@ -12,6 +39,18 @@ quiz_request = ns.model('QuizRequest', {
     'text': fields.String(required=True, description='Input text to generate a quiz from')
 })
 
+quiz_stream_request = ns.model('QuizStreamRequest', {
+    'text': fields.String(required=True, description='Input text to generate a quiz from'),
+    'num_questions': fields.Integer(description='Number of questions', default=DEFAULT_NUM_QUESTIONS)
+})
+
+quiz_batch_request = ns.model('QuizBatchRequest', {
+    'doc_ids': fields.List(fields.Integer, description='IDs of uploaded documents to generate quizzes from'),
+    'texts': fields.List(fields.String, description='Input texts to generate quizzes from'),
+    'topic': fields.String(description='Only use the parts of each document about this topic'),
+    'num_questions': fields.Integer(description='Number of questions per quiz', default=DEFAULT_NUM_QUESTIONS)
+})
+
 quiz_question = ns.model('QuizQuestion', {
     'question': fields.String(description='Question text'),
     'options': fields.List(fields.String, description='Answer options'),
@@ -26,17 +65,108 @@ error_response = ns.model('ErrorResponse', {
     'error': fields.String(description='Error message')
 })
 
+quiz_job_request = ns.model('QuizJobRequest', {
+    'text': fields.String(description='Input text to generate a quiz from'),
+    'doc_id': fields.Integer(description='ID of an uploaded document to generate a quiz from'),
+    'topic': fields.String(description='With doc_id: only use the parts of the document about this topic'),
+    'num_questions': fields.Integer(description='Number of questions', default=DEFAULT_NUM_QUESTIONS)
+})
+
+quiz_job_response = ns.model('QuizJobResponse', {
+    'id': fields.String(description='Job ID'),
+    'kind': fields.String(description='Job kind'),
+    'status': fields.String(description='queued, running, succeeded or failed'),
+    'created_at': fields.String(description='Enqueue timestamp'),
+    'started_at': fields.String(description='Start timestamp'),
+    'finished_at': fields.String(description='Completion timestamp'),
+    'result': fields.Nested(quiz_response, description='Generated quiz, once succeeded'),
+    'error': fields.String(description='Error message, once failed')
+})
+
+not_ready_response = ns.model('DocumentNotReadyResponse', {
+    'error': fields.String(description='Error message'),
+    'status': fields.String(description='Text extraction state of the document'),
+    'pages_total': fields.Integer(description='Number of pages, once known'),
+    'pages_done': fields.Integer(description='Pages extracted so far')
+})
+
+stored_quiz_response = ns.model('StoredQuizResponse', {
+    'id': fields.Integer(description='Quiz ID'),
+    'document_id': fields.Integer(description='Document the quiz was generated from'),
+    'quiz': fields.List(fields.Nested(quiz_question), description='Quiz questions'),
+    'topic': fields.String(description='Topic the quiz is scoped to, null for the whole document'),
+    'model': fields.String(description='Model that generated the quiz'),
+    'prompt_version': fields.Integer(description='Version of the prompt template'),
+    'created_at': fields.String(description='Generation timestamp')
+})
+
+# Parser for reading a document's quiz
+document_quiz_parser = ns.parser()
+document_quiz_parser.add_argument('num_questions', type=int, location='args', default=DEFAULT_NUM_QUESTIONS,
+                                  help='Number of questions')
+document_quiz_parser.add_argument('refresh', type=inputs.boolean, location='args', default=False,
+                                  help='Generate a new quiz instead of returning the stored one')
+document_quiz_parser.add_argument('topic', type=str, location='args',
+                                  help='Only use the parts of the document about this topic')
+
+# Parser for building a quiz from a document's question bank
+bank_quiz_parser = ns.parser()
+bank_quiz_parser.add_argument('num_questions', type=int, location='args', default=DEFAULT_NUM_QUESTIONS,
+                              help='Number of questions')
+bank_quiz_parser.add_argument('topic', type=str, location='args',
+                              help='Only use questions generated for this topic')
+
+bank_quiz_response = ns.model('BankQuizResponse', {
+    'document_id': fields.Integer(description='Document the questions were generated from'),
+    'quiz': fields.List(fields.Nested(quiz_question), description='Distinct questions drawn at random from the bank'),
+    'topic': fields.String(description='Topic the questions are scoped to, null for the whole document'),
+    'bank_size': fields.Integer(description='Questions in the bank the quiz was drawn from'),
+    'generated': fields.Integer(description='Questions added to the bank by generations made for this request')
+})
+
+# Parser for streaming a document's quiz
+document_stream_parser = ns.parser()
+document_stream_parser.add_argument('num_questions', type=int, location='args', default=DEFAULT_NUM_QUESTIONS,
+                                    help='Number of questions')
+document_stream_parser.add_argument('topic', type=str, location='args',
+                                    help='Only use the parts of the document about this topic')
+
+quiz_batch_item = ns.model('QuizBatchItem', {
+    'doc_id': fields.Integer(description='Document ID, for document items'),
+    'index': fields.Integer(description='Position in texts, for text items'),
+    'quiz': fields.List(fields.Nested(quiz_question), description='Generated quiz, when successful'),
+    'error': fields.String(description='Error message, when generation failed')
+})
+
+quiz_batch_response = ns.model('QuizBatchResponse', {
+    'results': fields.List(fields.Nested(quiz_batch_item), description='Documents first, then texts, in request order'),
+    'succeeded': fields.Integer(description='Number of items with a quiz'),
+    'failed': fields.Integer(description='Number of items with an error')
+})
+
+cache_stats_response = ns.model('CacheStatsResponse', {
+    'hits': fields.Integer(description='Lookups answered from either tier'),
+    'memory_hits': fields.Integer(description='Lookups answered from the in-process LRU'),
+    'durable_hits': fields.Integer(description='Lookups answered from the database tier'),
+    'misses': fields.Integer(description='Lookups that required a call to OpenAI'),
+    'hit_rate': fields.Float(description='hits / (hits + misses)'),
+    'memory_entries': fields.Integer(description='Entries in the in-process LRU'),
+    'durable_entries': fields.Integer(description='Entries in the database tier')
+})
+
 @ns.route('/generate')
 class QuizResource(Resource):
     @ns.doc('generate_quiz')
     @ns.expect(quiz_request)
     @ns.response(200, 'Success', quiz_response)
     @ns.response(400, 'Validation Error', error_response)
+    @ns.response(502, 'Quiz generation failed and QUIZ_FALLBACK_ENABLED is off', error_response)
     def post(self):
         """
         Generate a quiz from input text
         
         This endpoint accepts text content and returns a structured quiz based on that content.
+        If generation fails a sample quiz is returned with an `X-Quiz-Fallback: true` header.
         """
         data = request.get_json()
         input_text = data.get('text', '')
@@ -46,7 +176,10 @@ class QuizResource(Resource):
             return {'error': 'No input text provided'}, 400
 
         # Generate quiz
-        quiz = generate_quiz(input_text)
+        try:
+            quiz = generate_chunked_quiz(compact_page(input_text), fallback=False)
+        except Exception as e:
+            return quiz_fallback(input_text, e)
 
         # Return as json
         return {'quiz': quiz}
@@ -55,151 +188,827 @@ class QuizResource(Resource):
 @ns.param('doc_id', 'The document identifier')
 class DocumentQuizResource(Resource):
     @ns.doc('generate_quiz_from_document')
-    @ns.response(200, 'Success', quiz_response)
-    @ns.response(404, 'Document not found', error_response)
+    @ns.expect(document_quiz_parser)
+    @ns.response(200, 'Success', stored_quiz_response)
+    @ns.response(304, 'Quiz unchanged since the ETag given in If-None-Match')
+    @ns.response(404, 'Document not found, or nothing in it matches the topic', error_response)
+    @ns.response(409, 'Document text is not extracted yet', not_ready_response)
     @ns.response(500, 'Internal Server Error', error_response)
+    @ns.response(502, 'Quiz generation failed and QUIZ_FALLBACK_ENABLED is off', error_response)
     def get(self, doc_id):
         """
-        Generate a quiz from a previously uploaded document
+        Get the quiz of a previously uploaded document
         
-        This endpoint retrieves a document by ID and generates a quiz from its text content.
+        The first request generates a quiz from the document's text and stores it; later requests
+        return the stored quiz. Responses carry a strong `ETag`, and a request whose `If-None-Match`
+        matches it gets `304 Not Modified`. Pass `refresh=true` to generate a new quiz, and
+        `topic` to build the quiz only from the passages of the document that best match it.
         """
+        args = document_quiz_parser.parse_args()
         try:
             # Retrieve document from database
-            document = Document.query.get(doc_id)
+            with stage('document_lookup'):
+                document = Document.query.get(doc_id)
             
             if not document:
                 return {'error': f'Document with ID {doc_id} not found'}, 404
             
-            # Generate quiz from document content
-            quiz = generate_quiz(document.content)
+            if document.status != Document.READY:
+                return document_not_ready(document)
             
-            return {'quiz': quiz}, 200
+            num_questions = args['num_questions'] or DEFAULT_NUM_QUESTIONS
+            try:
+                stored_quiz = get_document_quiz(document, num_questions, refresh=args['refresh'], topic=args['topic'])
+            except LookupError as e:
+                return {'error': str(e)}, 404
+            except Exception as e:
+                # Serve a sample quiz for testing, without storing it. The
+                # compacted text was loaded for the prompt; the full text is not
+                return quiz_fallback(document.compact_content or '', e)
+            
+            response = jsonify(stored_quiz.to_dict())
+            response.set_etag(stored_quiz.etag)
+            response.headers['Cache-Control'] = 'no-cache'
+            return response.make_conditional(request)
             
         except Exception as e:
             return {'error': f'Error generating quiz: {str(e)}'}, 500
 
+@ns.route('/stream')
+class QuizStreamResource(Resource):
+    @ns.doc('stream_quiz')
+    @ns.expect(quiz_stream_request)
+    @ns.produces(['text/event-stream'])
+    @ns.response(200, 'Stream of question events followed by a done event')
+    @ns.response(400, 'Validation Error', error_response)
+    def post(self):
+        """
+        Generate a quiz from input text, streaming each question as it is generated
+        
+        This endpoint responds with Server-Sent Events: one `question` event (a JSON question)
+        per question as soon as it is complete, then a `done` event with the number of questions.
+        """
+        data = request.get_json() or {}
+        input_text = data.get('text', '')
+        num_questions = data.get('num_questions') or DEFAULT_NUM_QUESTIONS
+        
+        if not input_text:
+            return {'error': 'No input text provided'}, 400
+        if not isinstance(num_questions, int) or num_questions < 1:
+            return {'error': 'num_questions must be a positive integer'}, 400
+        
+        return quiz_event_stream(compact_page(input_text), num_questions)
 
-def generate_quiz(text):
-    """
-    Takes extracted text and generates a structured quiz
-    by calling OpenAI's Chat Completions API.
-    """
-    try:
-        # Try with direct import (for newer versions of openai)
-        import openai
+@ns.route('/document/<int:doc_id>/bank')
+@ns.param('doc_id', 'The document identifier')
+class DocumentBankQuizResource(Resource):
+    @ns.doc('get_quiz_from_question_bank')
+    @ns.expect(bank_quiz_parser)
+    @ns.response(200, 'Success', bank_quiz_response)
+    @ns.response(400, 'Validation Error', error_response)
+    @ns.response(404, 'Document not found, nothing in it matches the topic, or the question bank is disabled',
+                 error_response)
+    @ns.response(409, 'Document text is not extracted yet', not_ready_response)
+    @ns.response(500, 'Internal Server Error', error_response)
+    @ns.response(502, 'Quiz generation failed, the bank is empty and QUIZ_FALLBACK_ENABLED is off', error_response)
+    def get(self, doc_id):
+        """
+        Get a quiz of distinct questions from a document's question bank
         
-        # Set API key
-        openai.api_key = os.getenv("OPENAI_API_KEY")
+        Every question generated for a document is kept in its bank unless it is a near duplicate of
+        one already there. This endpoint draws `num_questions` questions from the bank at random, so
+        repeated requests get different quizzes without calling OpenAI. Only when the bank holds too
+        few questions (of the `topic`, if given) are new ones generated to top it up.
+        """
+        args = bank_quiz_parser.parse_args()
+        num_questions = args['num_questions'] or DEFAULT_NUM_QUESTIONS
+        if num_questions < 1:
+            return {'error': 'num_questions must be a positive integer'}, 400
+        
+        if get_question_bank() is None:
+            return {'error': 'Question bank is disabled'}, 404
         
-        # Try newer client method
         try:
-            client = openai.OpenAI(api_key=openai.api_key)
+            with stage('document_lookup'):
+                document = Document.query.get(doc_id)
             
-            # Send prompt to OpenAI and request a chat completion
-            response = client.chat.completions.create(
-                model="gpt-3.5-turbo",
-                messages=[{"role": "user", "content": create_prompt(text)}],
-                temperature=0.7,
-                max_tokens=500,
-            )
+            if not document:
+                return {'error': f'Document with ID {doc_id} not found'}, 404
             
-            raw_quiz = response.choices[0].message.content  # extract text from OpenAI
+            if document.status != Document.READY:
+                return document_not_ready(document)
             
-        except (AttributeError, TypeError):
-            # Fall back to older API style
-            response = openai.ChatCompletion.create(
-                model="gpt-3.5-turbo",
-                messages=[{"role": "user", "content": create_prompt(text)}],
-                temperature=0.7,
-                max_tokens=500,
-            )
+            try:
+                questions, bank_size, generated = get_bank_quiz(document, num_questions, topic=args['topic'])
+            except LookupError as e:
+                return {'error': str(e)}, 404
+            except Exception as e:
+                return quiz_fallback(document.compact_content or '', e)
             
-            raw_quiz = response.choices[0].message.content  # extract text from OpenAI
+            return {
+                'document_id': document.id,
+                'quiz': questions,
+                'topic': normalize_text(args['topic']).lower() or None,
+                'bank_size': bank_size,
+                'generated': generated
+            }
             
-        # Parse raw quiz text into JSON 
-        return parse_quiz_to_json(raw_quiz)
+        except Exception as e:
+            return {'error': f'Error building quiz: {str(e)}'}, 500
+
+@ns.route('/document/<int:doc_id>/stream')
+@ns.param('doc_id', 'The document identifier')
+class DocumentQuizStreamResource(Resource):
+    @ns.doc('stream_quiz_from_document')
+    @ns.expect(document_stream_parser)
+    @ns.produces(['text/event-stream'])
+    @ns.response(200, 'Stream of question events followed by a done event')
+    @ns.response(404, 'Document not found, or nothing in it matches the topic', error_response)
+    @ns.response(409, 'Document text is not extracted yet', not_ready_response)
+    def get(self, doc_id):
+        """
+        Generate a quiz from a previously uploaded document, streaming each question as it is generated
         
-    except Exception as e:
-        # If all else fails, provide a sample quiz for testing
-        return create_sample_quiz(text)
+        This endpoint responds with the same Server-Sent Events as `POST /api/quiz/stream`.
+        """
+        args = document_stream_parser.parse_args()
+        with stage('document_lookup'):
+            document = Document.query.get(doc_id)
+        
+        if not document:
+            return {'error': f'Document with ID {doc_id} not found'}, 404
+        
+        if document.status != Document.READY:
+            return document_not_ready(document)
+        
+        try:
+            text, tokens = document_text(document, args['topic'])
+        except LookupError as e:
+            return {'error': str(e)}, 404
+        
+        return quiz_event_stream(text, args['num_questions'] or DEFAULT_NUM_QUESTIONS, tokens=tokens)
 
+@ns.route('/batch')
+class QuizBatchResource(Resource):
+    @ns.doc('generate_quiz_batch')
+    @ns.expect(quiz_batch_request)
+    @ns.response(200, 'Success', quiz_batch_response)
+    @ns.response(400, 'Validation Error', error_response)
+    def post(self):
+        """
+        Generate quizzes for many documents and texts in one call
+        
+        All documents are loaded with a single query and the quizzes are generated concurrently.
+        Each item gets its own result: a quiz, or an error such as an unknown or unready document.
+        """
+        data = request.get_json() or {}
+        doc_ids = data.get('doc_ids') or []
+        texts = data.get('texts') or []
+        topic = data.get('topic')
+        num_questions = data.get('num_questions') or DEFAULT_NUM_QUESTIONS
+        max_items = current_app.config.get('QUIZ_BATCH_MAX_ITEMS', 100)
+        
+        if not isinstance(doc_ids, list) or not all(isinstance(doc_id, int) for doc_id in doc_ids):
+            return {'error': 'doc_ids must be a list of integers'}, 400
+        if not isinstance(texts, list) or not all(isinstance(text, str) and text for text in texts):
+            return {'error': 'texts must be a list of non-empty strings'}, 400
+        if not doc_ids and not texts:
+            return {'error': 'Provide doc_ids and/or texts'}, 400
+        if len(doc_ids) + len(texts) > max_items:
+            return {'error': f'A batch may contain at most {max_items} items'}, 400
+        if not isinstance(num_questions, int) or num_questions < 1:
+            return {'error': 'num_questions must be a positive integer'}, 400
+        
+        # One IN query for every document, including its compacted text
+        documents = {
+            document.id: document
+            for document in Document.query.options(undefer(Document.compact_content)).filter(Document.id.in_(doc_ids))
+        } if doc_ids else {}
+        
+        results = []
+        pending = []  # (result, (text, tokens)) of items that need generation
+        for doc_id in doc_ids:
+            result = {'doc_id': doc_id}
+            document = documents.get(doc_id)
+            if not document:
+                result['error'] = f'Document with ID {doc_id} not found'
+            elif document.status != Document.READY:
+                result['error'] = document_not_ready(document)[0]['error']
+            else:
+                try:
+                    pending.append((result, document_text(document, topic)))
+                except LookupError as e:
+                    result['error'] = str(e)
+            results.append(result)
+        for index, text in enumerate(texts):
+            result = {'index': index}
+            pending.append((result, (compact_page(text), None)))
+            results.append(result)
+        
+        outcomes = generate_batch([item for _, item in pending], num_questions)
+        for (result, (text, _)), (outcome, value) in zip(pending, outcomes):
+            result['quiz' if outcome == 'ok' else 'error'] = value
+            if outcome == 'ok' and 'doc_id' in result:
+                add_to_bank(result['doc_id'], value, normalize_text(topic).lower(), text)
+        
+        failed = sum(1 for result in results if 'error' in result)
+        return {'results': results, 'succeeded': len(results) - failed, 'failed': failed}
 
-def create_prompt(text):
-    """Create the prompt for OpenAI"""
-    return f"""
-    Generate a short 3-question multiple-choice quiz based on the following content:
+@ns.route('/jobs')
+class QuizJobListResource(Resource):
+    @ns.doc('enqueue_quiz_job')
+    @ns.expect(quiz_job_request)
+    @ns.response(202, 'Job queued', quiz_job_response)
+    @ns.response(400, 'Validation Error', error_response)
+    @ns.response(404, 'Document not found', error_response)
+    @ns.response(409, 'Document text is not extracted yet', not_ready_response)
+    def post(self):
+        """
+        Queue quiz generation from text or a document
+        
+        This endpoint returns a job ID right away. Poll `GET /api/quiz/jobs/<job_id>` for the result.
+        """
+        data = request.get_json() or {}
+        input_text = data.get('text')
+        doc_id = data.get('doc_id')
+        num_questions = data.get('num_questions') or DEFAULT_NUM_QUESTIONS
+        
+        if not input_text and doc_id is None:
+            return {'error': 'Provide either text or doc_id'}, 400
+        if not isinstance(num_questions, int) or num_questions < 1:
+            return {'error': 'num_questions must be a positive integer'}, 400
+        if doc_id is not None:
+            with stage('document_lookup'):
+                document = Document.query.get(doc_id)
+            if not document:
+                return {'error': f'Document with ID {doc_id} not found'}, 404
+            if document.status != Document.READY:
+                return document_not_ready(document)
+        
+        payload = {'num_questions': num_questions}
+        if doc_id is not None:
+            payload['doc_id'] = doc_id
+            payload['topic'] = data.get('topic')
+        else:
+            payload['text'] = input_text
+        
+        job = get_job_queue().enqueue('quiz', payload)
+        return job.to_dict(), 202, {'Location': f'/api/quiz/jobs/{job.id}'}
 
-    "{text}"
+@ns.route('/jobs/<string:job_id>')
+@ns.param('job_id', 'The job identifier')
+class QuizJobResource(Resource):
+    @ns.doc('get_quiz_job')
+    @ns.response(200, 'Success', quiz_job_response)
+    @ns.response(404, 'Job not found', error_response)
+    def get(self, job_id):
+        """
+        Get the status of a quiz job
+        
+        The generated quiz is included under `result` once the job has succeeded.
+        """
+        job = Job.query.get(job_id)
+        
+        if not job:
+            return {'error': f'Job with ID {job_id} not found'}, 404
+        
+        return job.to_dict()
 
-    Format:
-    1. Question
-       a) Option
-       b) Option
-       c) Option
-       d) Option
-       Answer: b)
+@ns.route('/cache')
+class QuizCacheResource(Resource):
+    @ns.doc('get_quiz_cache_stats')
+    @ns.response(200, 'Success', cache_stats_response)
+    def get(self):
+        """
+        Get quiz cache statistics
+        
+        This endpoint returns hit/miss counters and the size of each cache tier.
+        """
+        cache = get_quiz_cache()
+        if cache is None:
+            return {'error': 'Quiz cache is disabled'}, 404
+        return cache.stats()
+    
+    @ns.doc('clear_quiz_cache')
+    @ns.response(200, 'Cache cleared')
+    def delete(self):
+        """
+        Clear the quiz cache
+        
+        This endpoint removes every cached quiz from both tiers.
+        """
+        cache = get_quiz_cache()
+        if cache is not None:
+            cache.clear()
+        return {'message': 'Quiz cache cleared'}
+
+
+def document_not_ready(document):
+    """Build the 409 response for a document whose text is not extracted yet"""
+    if document.status == Document.FAILED:
+        message = f'Text extraction failed for document with ID {document.id}: {document.error}'
+    else:
+        message = f'Document with ID {document.id} is not ready yet, try again once its status is ready'
+    return {
+        'error': message,
+        'status': document.status,
+        'pages_total': document.pages_total,
+        'pages_done': document.pages_done
+    }, 409
+
+
+@job_handler('quiz')
+def run_quiz_job(payload):
     """
+    Generate a quiz for a queued job from its text or document
+    
+    Document quizzes are stored, so the job also pre-generates the quiz
+    served by GET /api/quiz/document/<doc_id>.
+    """
+    num_questions = payload.get('num_questions', DEFAULT_NUM_QUESTIONS)
+    if payload.get('doc_id') is None:
+        return {'quiz': generate_chunked_quiz(payload.get('text'), num_questions)}
+    
+    document = Document.query.get(payload['doc_id'])
+    if not document:
+        raise ValueError(f"Document with ID {payload['doc_id']} not found")
+    if document.status != Document.READY:
+        raise ValueError(f"Document with ID {payload['doc_id']} is not ready")
+    stored_quiz = get_document_quiz(document, num_questions, topic=payload.get('topic'))
+    return {'quiz': json.loads(stored_quiz.questions)}
 
 
-def parse_quiz_to_json(quiz_text):
+def get_document_quiz(document, num_questions=DEFAULT_NUM_QUESTIONS, refresh=False, topic=None):
     """
-    Parses the OpenAI-generated quiz text into structured JSON:
-    [
-      {
-        "question": "...",
-        "options": [...],
-        "answer": "..."
-      },
-      ...
-    ]
+    Return the stored quiz of a document, generating and storing it if needed
+    
+    Stored quizzes are matched on the topic, number of questions, model and
+    prompt version, so changing the prompt leads to new quizzes. With
+    `refresh` the stored quiz is replaced by a newly generated one.
+    Generation errors are raised and nothing is stored.
+    
+    Args:
+        document (Document): A ready document
+        num_questions (int): Number of questions
+        refresh (bool): Generate a new quiz even if one is stored
+        topic (str): Only use the parts of the document about this topic
+    
+    Returns:
+        Quiz: The stored quiz
+    """
+    topic = normalize_text(topic).lower()
+    stored = document.quizzes.filter_by(
+        num_questions=num_questions, topic=topic, model=QUIZ_MODEL, prompt_version=PROMPT_VERSION
+    )
+    if not refresh:
+        stored_quiz = stored.order_by(Quiz.created_at.desc()).first()
+        if stored_quiz:
+            return stored_quiz
+    
+    text, tokens = document_text(document, topic)
+    questions = generate_chunked_quiz(text, num_questions, fallback=False, refresh=refresh, tokens=tokens)
+    stored.delete(synchronize_session=False)
+    stored_quiz = Quiz.from_questions(
+        questions,
+        document_id=document.id,
+        num_questions=num_questions,
+        topic=topic,
+        model=QUIZ_MODEL,
+        prompt_version=PROMPT_VERSION,
+        source_hash=sha256_bytes(text.encode('utf-8'))
+    )
+    db.session.add(stored_quiz)
+    db.session.flush()
+    stored_quiz.update_etag()
+    db.session.commit()
+    add_to_bank(document.id, questions, topic, text)
+    return stored_quiz
+
+
+def add_to_bank(document_id, questions, topic, text):
+    """
+    Keep the questions generated from a document's text in its question bank
+    
+    Questions that are near duplicates of ones in the bank are dropped.
+    Nothing is kept when QUESTION_BANK_ENABLED is off.
+    
+    Args:
+        document_id (int): Document the questions were generated from
+        questions (list): Generated question dictionaries
+        topic (str): Normalized topic, empty for the whole document
+        text (str): Text the questions were generated from
+    
+    Returns:
+        int: Number of questions added
+    """
+    bank = get_question_bank()
+    if bank is None:
+        return 0
+    return bank.add(document_id, questions, topic, sha256_bytes(text.encode('utf-8')))
+
+
+def get_bank_quiz(document, num_questions=DEFAULT_NUM_QUESTIONS, topic=None):
+    """
+    Draw a quiz from a document's question bank, topping the bank up if needed
+    
+    When the bank holds fewer than num_questions questions (of the topic, if
+    given), new quizzes are generated, bypassing the quiz cache, and their
+    questions added to the bank, until it has enough, a generation adds
+    nothing new, or QUESTION_BANK_MAX_GENERATIONS generations were made. A
+    generation error stops the top-up and is only raised if the bank is
+    empty; otherwise the quiz has fewer questions.
+    
+    Args:
+        document (Document): A ready document
+        num_questions (int): Number of questions
+        topic (str): Only use questions generated for this topic
+    
+    Returns:
+        tuple: (questions, questions in the bank, questions added by generation)
+    """
+    bank = get_question_bank()
+    topic = normalize_text(topic).lower()
+    available = bank.count(document.id, topic)
+    generated = 0
+    text = tokens = None
+    for _ in range(current_app.config.get('QUESTION_BANK_MAX_GENERATIONS', 3)):
+        if available >= num_questions:
+            break
+        if text is None:
+            text, tokens = document_text(document, topic)
+        try:
+            questions = generate_chunked_quiz(text, num_questions, fallback=False, refresh=True, tokens=tokens)
+        except Exception:
+            if not available:
+                raise
+            break
+        added = add_to_bank(document.id, questions, topic, text)
+        available += added
+        generated += added
+        if not added:
+            # The model only repeats questions the bank already has
+            break
+    
+    BANK_QUIZZES.inc(source='bank' if text is None else 'generated')
+    return bank.sample(document.id, num_questions, topic), available, generated
+
+
+def fallback_enabled():
+    """Return True if failed generations are answered with a sample quiz"""
+    return current_app.config.get('QUIZ_FALLBACK_ENABLED', True)
+
+
+def quiz_fallback(text, error):
+    """
+    Build the response for a failed generation
+    
+    With QUIZ_FALLBACK_ENABLED a sample quiz is returned, marked with an
+    `X-Quiz-Fallback` header so clients and benchmarks can tell it apart
+    from a real quiz. Otherwise the error is reported as a 502.
+    """
+    if not fallback_enabled():
+        return {'error': f'Error generating quiz: {str(error)}'}, 502
+    return {'quiz': create_sample_quiz(text)}, 200, {'X-Quiz-Fallback': 'true'}
+
+
+def generate_quiz_questions(text, num_questions=DEFAULT_NUM_QUESTIONS, refresh=False):
+    """
+    Generate quiz questions for a text with a single OpenAI call
+    
+    Results are cached on the normalized text and generation settings, so
+    repeating a request returns the stored quiz without calling OpenAI;
+    `refresh` skips the lookup and replaces the cached quiz.
+    Errors are raised to the caller.
+    """
+    cache = get_quiz_cache()
+    cache_key = make_cache_key(text, QUIZ_MODEL, PROMPT_VERSION, QUIZ_TEMPERATURE, num_questions)
+    if cache is not None and not refresh:
+        with stage('cache_lookup'):
+            cached_quiz = cache.get(cache_key)
+        if cached_quiz is not None:
+            return cached_quiz
+    
+    json_output = json_responses()
+    with stage('prompt_build'):
+        prompt = create_prompt(text, num_questions, json_output)
+    
+    # Send prompt to OpenAI through the shared client and request a chat completion
+    with stage('llm_call'):
+        response = get_llm_client().chat_completion(
+            model=QUIZ_MODEL,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=QUIZ_TEMPERATURE,
+            max_tokens=QUIZ_MAX_TOKENS,
+            **response_options(json_output)
+        )
+    
+    raw_quiz = response.choices[0].message.content  # extract text from OpenAI
+    
+    # Parse raw quiz text into JSON, the model sometimes adds extra questions
+    with stage('parse'):
+        quiz = (parse_quiz_json if json_output else parse_quiz_to_json)(raw_quiz)[:num_questions]
+    
+    if cache is not None and quiz:
+        cache.set(cache_key, quiz)
+    return quiz
+
+
+def prompt_token_limit():
+    """Most source-text tokens one prompt may hold in the model's context window"""
+    config = current_app.config
+    return config.get('QUIZ_CONTEXT_TOKENS', 16385) - QUIZ_MAX_TOKENS - PROMPT_OVERHEAD_TOKENS
+
+
+def plan_chunks(text, num_questions=DEFAULT_NUM_QUESTIONS, tokens=None):
+    """
+    Decide how to split text for generation
+    
+    Text that fits in one prompt is kept whole. Longer text is split into
+    token-bounded chunks, of which evenly spaced ones are kept so that at
+    most QUIZ_TOKEN_BUDGET tokens (and QUIZ_MAX_CHUNKS chunks) are sent in
+    total. Each chunk is asked for a share of the questions plus some
+    spares so duplicates can be dropped. Chunks never exceed what fits in
+    the model's context next to the prompt and the answer.
+    
+    Args:
+        text (str): Source text
+        num_questions (int): Questions in the quiz
+        tokens (int): Token count of the text if already known, e.g. stored at ingest
+    
+    Returns:
+        tuple: (list of chunks, number of questions to ask per chunk)
+    """
+    config = current_app.config
+    budget = config.get('QUIZ_TOKEN_BUDGET', 20000)
+    chunk_tokens = max(1, min(config.get('QUIZ_CHUNK_TOKENS', 2500), prompt_token_limit(), budget))
+    max_chunks = max(1, min(config.get('QUIZ_MAX_CHUNKS', 8), budget // chunk_tokens))
+    
+    if tokens is None:
+        tokens = count_tokens(text, QUIZ_MODEL)
+    if tokens <= chunk_tokens:
+        return [text], num_questions
+    
+    chunks = split_into_chunks(text, chunk_tokens, QUIZ_MODEL)
+    if len(chunks) > max_chunks:
+        step = (len(chunks) - 1) / (max_chunks - 1) if max_chunks > 1 else 0
+        chunks = [chunks[round(i * step)] for i in range(max_chunks)]
+    
+    return chunks, max(1, math.ceil(num_questions * 1.5 / len(chunks)))
+
+
+def generate_chunked_quiz(text, num_questions=DEFAULT_NUM_QUESTIONS, fallback=True, refresh=False, tokens=None):
+    """
+    Generate a quiz for text of any length
+    
+    Text that fits in one prompt is sent as is. Longer text is split into
+    token-bounded chunks (map): candidate questions are generated for the
+    chunks concurrently, then de-duplicated and picked round-robin across
+    chunks so the quiz covers the whole text (reduce). Chunks that fail are
+    skipped; if every chunk fails a sample quiz is returned, or the error
+    is raised when `fallback` is False. `refresh` bypasses cached quizzes.
+    `tokens` is the token count of the text, when already known.
+    """
+    chunks, per_chunk = plan_chunks(text, num_questions, tokens)
+    if len(chunks) == 1:
+        try:
+            return generate_quiz_questions(chunks[0], num_questions, refresh=refresh)
+        except Exception:
+            if not fallback:
+                raise
+            # If all else fails, provide a sample quiz for testing
+            return create_sample_quiz(text)
+    
+    app = current_app._get_current_object()
+    
+    def generate_for_chunk(chunk):
+        with app.app_context():
+            try:
+                return generate_quiz_questions(chunk, per_chunk, refresh=refresh)
+            except Exception:
+                return []
+    
+    workers = min(len(chunks), current_app.config.get('QUIZ_CHUNK_CONCURRENCY', 8))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        candidates = list(executor.map(generate_for_chunk, chunks))
+    
+    quiz = select_questions(candidates, num_questions)
+    if not quiz and not fallback:
+        raise RuntimeError('No questions could be generated for any part of the text')
+    return quiz or create_sample_quiz(text)
+
+
+def generate_batch(items, num_questions=DEFAULT_NUM_QUESTIONS):
+    """
+    Generate quizzes for many texts concurrently
+    
+    Items run on QUIZ_BATCH_CONCURRENCY threads; the shared OpenAI client
+    still caps how many upstream calls are in flight across the process.
+    A failing item does not affect the others.
+    
+    Args:
+        items (list): (text, token count or None) tuples to generate quizzes for
+        num_questions (int): Questions per quiz
+    
+    Returns:
+        list: ('ok', quiz) or ('error', message) tuples, in the order of `items`
+    """
+    app = current_app._get_current_object()
+    
+    def generate_item(item):
+        text, tokens = item
+        with app.app_context():
+            try:
+                return 'ok', generate_chunked_quiz(text, num_questions, fallback=False, tokens=tokens)
+            except Exception as e:
+                return 'error', f'Error generating quiz: {str(e)}'
+    
+    if not items:
+        return []
+    workers = min(len(items), current_app.config.get('QUIZ_BATCH_CONCURRENCY', 8))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(generate_item, items))
+
+
+def stream_quiz_questions(text, num_questions=DEFAULT_NUM_QUESTIONS, tokens=None):
+    """
+    Yield quiz questions one by one as they are parsed from streamed completions
+    
+    Chunks of long text are streamed one after another and duplicates are
+    skipped. Cached chunks are replayed without calling OpenAI, and each
+    completed chunk is added to the cache. A failing chunk is skipped when
+    there are several; with a single chunk the error is raised.
     """
-    # Split text into blocks based on questions
-    questions = re.split(r'\n(?=\d+\.)', quiz_text.strip())
-    structured = []
+    chunks, per_chunk = plan_chunks(text, num_questions, tokens)
+    seen = set()
+    emitted = 0
+    for chunk in chunks:
+        try:
+            for question in stream_chunk_questions(chunk, per_chunk):
+                key = normalize_text(question['question']).lower()
+                if key in seen:
+                    continue
+                seen.add(key)
+                yield question
+                emitted += 1
+                if emitted == num_questions:
+                    return
+        except Exception:
+            if len(chunks) == 1:
+                raise
+
+
+def stream_chunk_questions(text, num_questions):
+    """Stream the questions of a single prompt, through the quiz cache"""
+    cache = get_quiz_cache()
+    cache_key = make_cache_key(text, QUIZ_MODEL, PROMPT_VERSION, QUIZ_TEMPERATURE, num_questions)
+    with stage('cache_lookup'):
+        cached_quiz = cache.get(cache_key) if cache is not None else None
+    if cached_quiz is not None:
+        yield from cached_quiz
+        return
+    
+    json_output = json_responses()
+    with stage('prompt_build'):
+        prompt = create_prompt(text, num_questions, json_output)
+    
+    parser = IncrementalJSONQuizParser() if json_output else IncrementalQuizParser()
+    quiz = []
+    pieces = get_llm_client().stream_chat_completion(
+        model=QUIZ_MODEL,
+        messages=[{"role": "user", "content": prompt}],
+        temperature=QUIZ_TEMPERATURE,
+        max_tokens=QUIZ_MAX_TOKENS,
+        **response_options(json_output)
+    )
+    for piece in pieces:
+        for question in parser.feed(piece):
+            quiz.append(question)
+            yield question
+    for question in parser.finish():
+        quiz.append(question)
+        yield question
+    
+    if cache is not None and quiz:
+        cache.set(cache_key, quiz)
 
-    for q in questions:
-        lines = q.strip().split('\n')  # Split each block into lines
-        if len(lines) < 6:
-            continue  # Skip incomplete questions
 
-        # Extract question text
-        question_text = lines[0].split('.', 1)[1].strip() if len(lines[0].split('.', 1)) > 1 else "Question"
+def sse_event(event, data):
+    """Format a Server-Sent Event with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
 
-        # Extract options
-        options = []
-        for i in range(1, min(5, len(lines))):
-            parts = lines[i].split(')', 1)
-            if len(parts) > 1:
-                options.append(parts[1].strip())
+
+def quiz_event_stream(text, num_questions=DEFAULT_NUM_QUESTIONS, tokens=None):
+    """
+    Build a text/event-stream response that sends each question as a
+    `question` event, then a `done` event. If no question could be
+    generated, the sample quiz is sent instead (`fallback: true`), or an
+    `error` event when QUIZ_FALLBACK_ENABLED is off; a failure after the
+    first question ends the stream with an `error` event.
+    """
+    fallback = fallback_enabled()
+    
+    def events():
+        count = 0
+        error = 'No questions could be generated'
+        try:
+            for question in stream_quiz_questions(text, num_questions, tokens):
+                count += 1
+                yield sse_event('question', question)
+        except Exception as e:
+            error = str(e)
+            if count:
+                yield sse_event('error', {'error': f'Error generating quiz: {error}'})
+                return
+        if count:
+            yield sse_event('done', {'count': count, 'fallback': False})
+            return
+        if not fallback:
+            yield sse_event('error', {'error': f'Error generating quiz: {error}'})
+            return
         
-        if len(options) < 4:
-            continue  # Skip if we don't have enough options
+        # Nothing could be generated, provide a sample quiz for testing
+        sample_quiz = create_sample_quiz(text)
+        for question in sample_quiz:
+            yield sse_event('question', question)
+        yield sse_event('done', {'count': len(sample_quiz), 'fallback': True})
+    
+    return Response(
+        stream_with_context(events()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+def select_questions(candidates, num_questions):
+    """
+    Pick up to num_questions distinct questions, taking one from each
+    chunk's candidates in turn
+    """
+    seen = set()
+    selected = []
+    for round_questions in zip_longest(*candidates):
+        for question in round_questions:
+            if question is None:
+                continue
+            key = normalize_text(question['question']).lower()
+            if key in seen:
+                continue
+            seen.add(key)
+            selected.append(question)
+            if len(selected) == num_questions:
+                return selected
+    return selected
+
+
+def json_responses():
+    """Whether completions are requested as JSON (QUIZ_RESPONSE_FORMAT=json)"""
+    return current_app.config.get('QUIZ_RESPONSE_FORMAT', 'text') == 'json'
+
+
+def response_options(json_output):
+    """Extra chat completion arguments for the response format"""
+    return {'response_format': {'type': 'json_object'}} if json_output else {}
+
+
+def create_prompt(text, num_questions=DEFAULT_NUM_QUESTIONS, json_output=False):
+    """
+    Create the prompt for OpenAI
+    
+    With `json_output` the model is asked for a JSON object instead of the
+    numbered text layout, so the answer needs no text parsing.
+    """
+    if json_output:
+        return f"""
+    Generate a short {num_questions}-question multiple-choice quiz based on the following content:
 
-        # Extract the correct answer 
-        answer_line = lines[-1]
-        answer_letter = re.search(r'Answer:\s*([a-d])\)?', answer_line, re.IGNORECASE)
-        if not answer_letter:
-            continue  # Skip if no answer found
+    "{text}"
 
-        # Map answer to the option
-        answer_index = ord(answer_letter.group(1).lower()) - ord('a')
-        if not (0 <= answer_index < len(options)):
-            answer_index = 0  # Default to first option if index is out of range
+    Respond with a JSON object of this form, with four options per question:
+    {{"questions": [{{"question": "...", "options": ["...", "...", "...", "..."], "answer": "b"}}]}}
+    "answer" is the letter of the correct option (a-d).
+    """
+    return f"""
+    Generate a short {num_questions}-question multiple-choice quiz based on the following content:
 
-        structured.append({
-            "question": question_text,
-            "options": options,
-            "answer": options[answer_index]
-        })
+    "{text}"
 
-    return structured
+    Format:
+    1. Question
+       a) Option
+       b) Option
+       c) Option
+       d) Option
+       Answer: b)
+    """
 
 
 def create_sample_quiz(text):
     """Create a sample quiz when OpenAI generation fails"""
+    # Only ever called as a fallback, so this counts them all
+    QUIZ_FALLBACKS.inc()
+    
     # Extract a few words to use in the sample quiz
-    words = text.split()
+    words = text[:200].split()
     topic = " ".join(words[:3]) if len(words) >= 3 else "this topic"
     
     return [
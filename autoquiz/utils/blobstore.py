@@ -0,0 +1,192 @@
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from flask import current_app
+from sqlalchemy import text
+from autoquiz.extensions import db
+from autoquiz.models import Blob
+
+# Bytes read per chunk when streaming a blob
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+
+class BlobStore:
+    """
+    Content-addressed storage for uploaded files
+
+    Blobs are keyed by the SHA-256 of their contents, so storing the same
+    file twice is a no-op. Reads are done in ranges to keep memory per
+    request bounded regardless of file size.
+    """
+
+    def put_file(self, key, file_path):
+        """Store the file at `file_path` under `key`"""
+        raise NotImplementedError
+
+    def put_bytes(self, key, data):
+        """Store `data` under `key`"""
+        raise NotImplementedError
+
+    def put_stream(self, key, stream):
+        """Store the contents of a readable, seekable stream under `key`"""
+        raise NotImplementedError
+
+    def exists(self, key):
+        """Return True if a blob is stored under `key`"""
+        return self.size(key) is not None
+
+    def size(self, key):
+        """Return the size in bytes of a blob, or None if it is missing"""
+        raise NotImplementedError
+
+    def iter_range(self, key, start, stop, chunk_size=DEFAULT_CHUNK_SIZE):
+        """Yield the bytes start..stop-1 of a blob in chunks"""
+        raise NotImplementedError
+
+    def delete(self, key):
+        """Remove a blob if it exists"""
+        raise NotImplementedError
+
+    @contextmanager
+    def local_path(self, key):
+        """Provide a filesystem path holding the blob, for tools that need one"""
+        fd, temp_path = tempfile.mkstemp(suffix='.pdf')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in self.iter_range(key, 0, self.size(key)):
+                    f.write(chunk)
+            yield temp_path
+        finally:
+            os.unlink(temp_path)
+
+
+class FileBlobStore(BlobStore):
+    """Stores blobs as files under a data directory, fanned out by key prefix"""
+
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def path_for(self, key):
+        return os.path.join(self.root, key[:2], key)
+
+    def _write(self, key, write):
+        path = self.path_for(key)
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temporary name first so readers never see a partial file
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                write(f)
+            os.replace(temp_path, path)
+        except Exception:
+            os.unlink(temp_path)
+            raise
+
+    def put_file(self, key, file_path):
+        def write(f):
+            with open(file_path, 'rb') as src:
+                shutil.copyfileobj(src, f)
+        self._write(key, write)
+
+    def put_bytes(self, key, data):
+        self._write(key, lambda f: f.write(data))
+
+    def put_stream(self, key, stream):
+        path = self.path_for(key)
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # A spooled upload on the same filesystem is renamed into place
+        move_to = getattr(stream, 'move_to', None)
+        if move_to is not None and move_to(path):
+            return
+        stream.seek(0)
+        self._write(key, lambda f: shutil.copyfileobj(stream, f, DEFAULT_CHUNK_SIZE))
+
+    def size(self, key):
+        try:
+            return os.path.getsize(self.path_for(key))
+        except OSError:
+            return None
+
+    def iter_range(self, key, start, stop, chunk_size=DEFAULT_CHUNK_SIZE):
+        with open(self.path_for(key), 'rb') as f:
+            f.seek(start)
+            remaining = stop - start
+            while remaining > 0:
+                chunk = f.read(min(chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+
+    def delete(self, key):
+        try:
+            os.unlink(self.path_for(key))
+        except FileNotFoundError:
+            pass
+
+    @contextmanager
+    def local_path(self, key):
+        # Blobs are already files, no copy needed
+        yield self.path_for(key)
+
+
+class DatabaseBlobStore(BlobStore):
+    """Stores blobs in the `blobs` table as binary columns"""
+
+    def put_file(self, key, file_path):
+        with open(file_path, 'rb') as f:
+            self.put_bytes(key, f.read())
+
+    def put_stream(self, key, stream):
+        if self.exists(key):
+            return
+        stream.seek(0)
+        self.put_bytes(key, stream.read())
+
+    def put_bytes(self, key, data):
+        if self.exists(key):
+            return
+        db.session.add(Blob(key=key, data=data, size=len(data)))
+        db.session.commit()
+
+    def size(self, key):
+        row = db.session.query(Blob.size).filter_by(key=key).first()
+        return row.size if row else None
+
+    def iter_range(self, key, start, stop, chunk_size=DEFAULT_CHUNK_SIZE):
+        # substr() on a BLOB works on bytes and is 1-based
+        query = text('SELECT substr(data, :offset, :length) FROM blobs WHERE key = :key')
+        for offset in range(start, stop, chunk_size):
+            length = min(chunk_size, stop - offset)
+            chunk = db.session.execute(query, {'key': key, 'offset': offset + 1, 'length': length}).scalar()
+            if not chunk:
+                break
+            yield chunk
+
+    def delete(self, key):
+        Blob.query.filter_by(key=key).delete()
+        db.session.commit()
+
+
+def init_app(app):
+    """Create the blob store selected by BLOB_STORE and attach it to the app"""
+    backend = app.config.get('BLOB_STORE', 'file')
+    if backend == 'file':
+        store = FileBlobStore(app.config['BLOB_DIR'])
+    elif backend == 'database':
+        store = DatabaseBlobStore()
+    else:
+        raise ValueError(f'Unknown BLOB_STORE: {backend}')
+    app.extensions['blob_store'] = store
+    return store
+
+
+def get_blob_store():
+    """Return the blob store of the current app"""
+    return current_app.extensions['blob_store']
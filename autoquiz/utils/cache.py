@@ -0,0 +1,189 @@
+import datetime
+import hashlib
+import json
+import re
+import threading
+from collections import OrderedDict
+from flask import current_app
+from sqlalchemy import func, select
+from sqlalchemy.exc import SQLAlchemyError
+from autoquiz.extensions import db
+from autoquiz.models import CachedQuiz
+
+_WHITESPACE = re.compile(r'\s+')
+
+# Durable writes between two evictions; in between the table can grow this
+# many rows past durable_max_entries
+EVICT_EVERY = 32
+
+
+def normalize_text(text):
+    """Collapse runs of whitespace so formatting-only differences share a cache entry"""
+    return _WHITESPACE.sub(' ', text or '').strip()
+
+
+def make_cache_key(text, model, prompt_version, temperature, num_questions):
+    """
+    Build the cache key of a quiz generation request
+
+    Args:
+        text (str): Source text
+        model (str): Model name
+        prompt_version (int): Version of the prompt template
+        temperature (float): Sampling temperature
+        num_questions (int): Number of questions requested
+
+    Returns:
+        str: Hex encoded SHA-256 of the normalized inputs
+    """
+    digest = hashlib.sha256()
+    digest.update(json.dumps([model, prompt_version, temperature, num_questions]).encode('utf-8'))
+    digest.update(b'\0')
+    digest.update(normalize_text(text).encode('utf-8'))
+    return digest.hexdigest()
+
+
+class QuizCache:
+    """
+    Two-tier cache for generated quizzes
+
+    Lookups go to an in-process LRU first and then to the `quiz_cache`
+    table, which survives restarts and is shared by all workers using the
+    same database. Entries expire after `ttl` seconds; each tier is capped
+    at a number of entries and evicts the least recently used ones.
+
+    The table is read and written in short transactions on connections of
+    its own, so a cache lookup never commits or rolls back the caller's
+    session. It is trimmed every EVICT_EVERY writes.
+    """
+
+    def __init__(self, max_entries=256, durable_max_entries=10000, ttl=7 * 24 * 3600):
+        self.max_entries = max_entries
+        self.durable_max_entries = durable_max_entries
+        self.ttl = datetime.timedelta(seconds=ttl)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.memory_hits = 0
+        self.durable_hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        """Number of entries in the in-process tier"""
+        return len(self._entries)
+
+    def _now(self):
+        return datetime.datetime.utcnow()
+
+    def get(self, key):
+        """Return the cached quiz for `key`, or None"""
+        now = self._now()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                stored_at, value = entry
+                if now - stored_at < self.ttl:
+                    self._entries.move_to_end(key)
+                    self.memory_hits += 1
+                    return value
+                del self._entries[key]
+
+        table = CachedQuiz.__table__
+        try:
+            with db.engine.begin() as conn:
+                row = conn.execute(
+                    select(table.c.value, table.c.created_at).where(table.c.key == key)
+                ).first()
+                if row is not None and now - row.created_at < self.ttl:
+                    conn.execute(table.update().where(table.c.key == key).values(accessed_at=now))
+                elif row is not None:
+                    conn.execute(table.delete().where(table.c.key == key))
+                    row = None
+        except SQLAlchemyError:
+            # The durable tier is best effort; a locked database counts as a miss
+            row = None
+
+        if row is not None:
+            value = json.loads(row.value)
+            self._remember(key, value, row.created_at)
+            with self._lock:
+                self.durable_hits += 1
+            return value
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key, value):
+        """Store a quiz in both tiers"""
+        now = self._now()
+        self._remember(key, value, now)
+
+        table = CachedQuiz.__table__
+        with self._lock:
+            self._writes += 1
+            evict = self._writes % EVICT_EVERY == 0
+        try:
+            with db.engine.begin() as conn:
+                conn.execute(table.delete().where(table.c.key == key))
+                conn.execute(table.insert().values(key=key, value=json.dumps(value), created_at=now, accessed_at=now))
+                if evict:
+                    self._evict_durable(conn)
+        except SQLAlchemyError:
+            pass
+
+    def _remember(self, key, value, stored_at):
+        with self._lock:
+            self._entries[key] = (stored_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _evict_durable(self, conn):
+        """Drop expired rows and all but the durable_max_entries most recently used, in one statement"""
+        table = CachedQuiz.__table__
+        recent = select(table.c.key).order_by(table.c.accessed_at.desc()).limit(self.durable_max_entries)
+        conn.execute(table.delete().where(
+            (table.c.created_at < self._now() - self.ttl) | table.c.key.notin_(recent.scalar_subquery())
+        ))
+
+    def clear(self):
+        """Empty both tiers"""
+        with self._lock:
+            self._entries.clear()
+        with db.engine.begin() as conn:
+            conn.execute(CachedQuiz.__table__.delete())
+
+    def stats(self):
+        """Hit/miss counters and tier sizes"""
+        with self._lock:
+            hits = self.memory_hits + self.durable_hits
+            lookups = hits + self.misses
+            stats = {
+                'hits': hits,
+                'memory_hits': self.memory_hits,
+                'durable_hits': self.durable_hits,
+                'misses': self.misses,
+                'hit_rate': hits / lookups if lookups else 0.0,
+                'memory_entries': len(self._entries)
+            }
+        with db.engine.connect() as conn:
+            stats['durable_entries'] = conn.execute(select(func.count()).select_from(CachedQuiz.__table__)).scalar()
+        return stats
+
+
+def init_app(app):
+    """Create the quiz cache and attach it to the app, unless QUIZ_CACHE_ENABLED is off"""
+    cache = None
+    if app.config.get('QUIZ_CACHE_ENABLED', True):
+        cache = QuizCache(
+            max_entries=app.config.get('QUIZ_CACHE_SIZE', 256),
+            durable_max_entries=app.config.get('QUIZ_CACHE_DURABLE_SIZE', 10000),
+            ttl=app.config.get('QUIZ_CACHE_TTL', 7 * 24 * 3600)
+        )
+    app.extensions['quiz_cache'] = cache
+    return cache
+
+
+def get_quiz_cache():
+    """Return the quiz cache of the current app, or None when caching is disabled"""
+    return current_app.extensions.get('quiz_cache')
@@ -0,0 +1,115 @@
+import math
+import re
+from collections import Counter
+
+# Lines at the top and bottom of a page where running headers and footers live
+EDGE_LINES = 2
+
+# Longer lines are body text, however often they repeat
+MAX_BOILERPLATE_CHARS = 100
+
+# A line is boilerplate if it is at the edge of at least this share of pages
+REPEATED_FRACTION = 0.5
+
+# Documents with fewer pages are not checked for repeated lines
+MIN_PAGES_FOR_REPEATS = 3
+
+# If compaction removes more than this share of a document's text, what looked
+# like headers and footers was its content (e.g. slides built from one
+# template), so the pages are only normalized
+MAX_REMOVED_FRACTION = 0.5
+
+_PAGE_NUMBER = re.compile(r'^[-\u2013\u2014 ]*(?:page\s+)?\d{1,5}(?:\s*(?:of|/)\s*\d{1,5})?[-\u2013\u2014 ]*$', re.IGNORECASE)
+_DIGITS = re.compile(r'\d+')
+_SPACES = re.compile(r'[ \t\u00a0\u2000-\u200b]+')
+_HYPHENATED = re.compile(r'(\w)-\n([a-z])')
+_BLANK_LINES = re.compile(r'\n{3,}')
+
+
+def _line_signature(line):
+    """Compare lines ignoring case, spacing and numbers, so "Page 3 of 9" matches "Page 4 of 9\""""
+    return _DIGITS.sub('#', _SPACES.sub(' ', line).strip().lower())
+
+
+def _edge_indexes(lines):
+    """Indexes of the non-empty lines at the top and bottom of a page, leaving at least one line between them"""
+    content = [index for index, line in enumerate(lines) if line.strip()]
+    edge = min(EDGE_LINES, (len(content) - 1) // 2)
+    if edge <= 0:
+        return set()
+    return set(content[:edge] + content[-edge:])
+
+
+def _text_size(text):
+    """Number of non-whitespace characters"""
+    return sum(not char.isspace() for char in text)
+
+
+def find_repeated_lines(pages):
+    """
+    Find running headers and footers
+
+    Returns:
+        set: Signatures of lines found at the edge of at least
+        REPEATED_FRACTION of the pages
+    """
+    if len(pages) < MIN_PAGES_FOR_REPEATS:
+        return set()
+    seen = Counter()
+    for page in pages:
+        lines = page.split('\n')
+        seen.update({
+            _line_signature(lines[index]) for index in _edge_indexes(lines)
+            if len(lines[index]) <= MAX_BOILERPLATE_CHARS
+        })
+    threshold = max(2, math.ceil(len(pages) * REPEATED_FRACTION))
+    return {signature for signature, count in seen.items() if count >= threshold and signature}
+
+
+def compact_page(text, repeated=frozenset(), strip_edges=True):
+    """
+    Compact the text of one page
+
+    Removes running headers/footers and page numbers at the page edges
+    (unless `strip_edges` is false), joins words hyphenated across line
+    breaks and normalizes whitespace.
+    """
+    lines = text.split('\n')
+    edges = _edge_indexes(lines) if strip_edges else set()
+    kept = []
+    for index, line in enumerate(lines):
+        line = _SPACES.sub(' ', line).strip()
+        if index in edges and (_line_signature(line) in repeated or _PAGE_NUMBER.match(line)):
+            continue
+        kept.append(line)
+    text = _HYPHENATED.sub(r'\1\2', '\n'.join(kept))
+    return _BLANK_LINES.sub('\n\n', text).strip()
+
+
+def compact_pages(pages):
+    """
+    Compact the extracted pages of a document for prompting
+
+    When more than MAX_REMOVED_FRACTION of the text would be stripped as
+    headers, footers and page numbers, nothing is stripped.
+
+    Args:
+        pages (list): Text of each page, in order
+
+    Returns:
+        list: Compacted text of each page; pages left empty are ''
+    """
+    repeated = find_repeated_lines(pages)
+    compacted = [compact_page(page, repeated) for page in pages]
+    original_size = sum(_text_size(page) for page in pages)
+    if original_size - sum(_text_size(page) for page in compacted) > original_size * MAX_REMOVED_FRACTION:
+        return [compact_page(page, strip_edges=False) for page in pages]
+    return compacted
+
+
+def compact_text(text):
+    """
+    Compact a document's stored text, whose pages are separated by blank
+    lines (see extract_pdf_text)
+    """
+    return '\n\n'.join(page for page in compact_pages(text.split('\n\n')) if page)
@@ -0,0 +1,109 @@
+import lzma
+import zlib
+from flask import current_app, has_app_context
+from sqlalchemy.types import LargeBinary, TypeDecorator
+
+# The first byte of a stored value names its codec, so the format can change
+# without rewriting old rows
+CODECS = {
+    'none': b't',
+    'zlib': b'z',
+    'lzma': b'x',
+}
+DEFAULT_CODEC = 'zlib'
+
+# Shorter texts are stored as is, compression would not pay off
+MIN_COMPRESS_CHARS = 256
+
+
+def compress_text(text, codec=DEFAULT_CODEC):
+    """
+    Encode text for storage
+
+    Args:
+        text (str): Text to store
+        codec (str): 'zlib', 'lzma' or 'none'
+
+    Returns:
+        bytes: Codec tag followed by the (compressed) UTF-8 text
+    """
+    if codec not in CODECS:
+        raise ValueError(f'Unknown codec {codec!r}, expected one of {", ".join(CODECS)}')
+    data = text.encode('utf-8')
+    if codec == 'none' or len(text) < MIN_COMPRESS_CHARS:
+        return CODECS['none'] + data
+    if codec == 'zlib':
+        packed = zlib.compress(data, 6)
+    else:
+        packed = lzma.compress(data, preset=6)
+    if len(packed) >= len(data):
+        return CODECS['none'] + data
+    return CODECS[codec] + packed
+
+
+def decompress_text(value):
+    """
+    Decode a value written by compress_text
+
+    Text stored before compression was introduced is returned as is.
+    """
+    if isinstance(value, str):
+        return value
+    value = bytes(value)
+    tag, data = value[:1], value[1:]
+    if tag == CODECS['zlib']:
+        data = zlib.decompress(data)
+    elif tag == CODECS['lzma']:
+        data = lzma.decompress(data)
+    elif tag != CODECS['none']:
+        raise ValueError(f'Unknown compressed text tag {tag!r}')
+    return data.decode('utf-8')
+
+
+def stored_codec(value):
+    """Name of the codec a stored value was written with ('text' for old plain text)"""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return 'text'
+    tag = bytes(value[:1])
+    return next((name for name, codec_tag in CODECS.items() if codec_tag == tag), 'unknown')
+
+
+def content_codec():
+    """The codec new values are written with (CONTENT_CODEC)"""
+    if has_app_context():
+        return current_app.config.get('CONTENT_CODEC', DEFAULT_CODEC)
+    return DEFAULT_CODEC
+
+
+class CompressedText(TypeDecorator):
+    """
+    Text column stored compressed
+
+    Values are compressed with CONTENT_CODEC when written and decompressed
+    when the column is loaded, so models and routes work with plain str.
+    Combined with a deferred column, text is only decompressed when it is
+    actually read. Rows written as plain TEXT earlier are read unchanged;
+    `flask autoquiz compress-content` rewrites them.
+    """
+
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return compress_text(value, content_codec())
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return decompress_text(value)
+
+    def result_processor(self, dialect, coltype):
+        # LargeBinary's processor turns values into bytes, which fails for
+        # old rows that hold str, so only decompress here
+        def process(value):
+            return self.process_result_value(value, dialect)
+        return process
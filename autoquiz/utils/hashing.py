@@ -0,0 +1,35 @@
+import hashlib
+
+# Read size used when hashing files
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def sha256_bytes(data):
+    """
+    Hash a bytes object
+
+    Args:
+        data (bytes): Data to hash
+
+    Returns:
+        str: Hex encoded SHA-256 digest
+    """
+    return hashlib.sha256(data).hexdigest()
+
+
+def sha256_file(file_path, chunk_size=HASH_CHUNK_SIZE):
+    """
+    Hash a file without loading it into memory at once
+
+    Args:
+        file_path (str): Path to the file
+        chunk_size (int): Bytes read per iteration
+
+    Returns:
+        str: Hex encoded SHA-256 digest
+    """
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
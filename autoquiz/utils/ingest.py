@@ -0,0 +1,376 @@
+import functools
+import logging
+import multiprocessing
+import os
+from collections import namedtuple
+from flask import current_app
+from autoquiz.extensions import db
+from autoquiz.models import Document, DocumentPage
+from autoquiz.utils.blobstore import get_blob_store
+from autoquiz.utils.jobs import get_job_queue, job_handler
+from autoquiz.utils.hashing import sha256_file
+from autoquiz.utils.pdf import extract_pdf_file, iter_pdf_pages, count_pdf_pages, page_hashes
+from autoquiz.utils.metrics import PDF_PAGES, stage
+from autoquiz.utils.compaction import compact_pages
+from autoquiz.utils.tokens import count_tokens
+from autoquiz.utils import search
+from autoquiz.utils.sources import invalidate_document_quizzes
+from sqlalchemy.orm import undefer
+
+logger = logging.getLogger(__name__)
+
+# Pages extracted between two progress updates
+PROGRESS_EVERY = 8
+
+# Documents written per transaction by bulk_ingest
+BULK_BATCH_SIZE = 50
+
+# Files a bulk ingestion worker process extracts before it is replaced, so
+# memory held on to by pdfminer is given back
+BULK_TASKS_PER_CHILD = 50
+
+# Outcome of one file of a bulk ingestion; status is ready, failed or skipped
+BulkResult = namedtuple('BulkResult', ['path', 'content_hash', 'doc_id', 'status', 'pages'])
+
+
+def match_pages(hashes, previous):
+    """
+    Find the stored pages a revised file still contains
+
+    Args:
+        hashes (list): Content hash of each page of the new file, in order
+        previous (dict): Page number -> DocumentPage stored for the old file
+
+    Returns:
+        dict: New page number -> the DocumentPage with the same content.
+        Pages that failed before are never reused. When several stored pages
+        have the same hash, the one at the same page number is preferred.
+    """
+    by_hash = {}
+    for page in previous.values():
+        if page.content_hash:
+            by_hash.setdefault(page.content_hash, page)
+    reused = {}
+    for page_number, content_hash in enumerate(hashes, start=1):
+        same = previous.get(page_number)
+        if same is not None and same.content_hash and same.content_hash == content_hash:
+            reused[page_number] = same
+        elif content_hash in by_hash:
+            reused[page_number] = by_hash[content_hash]
+    return reused
+
+
+def ingest_document(document):
+    """
+    Extract the text of a stored PDF into its Document row
+
+    The status moves from pending to processing and then to ready, or to
+    failed with an error message. pages_done is committed every
+    PROGRESS_EVERY pages so clients can follow the progress. The pages
+    are compacted for prompting once, here, and the compacted pages are
+    added to the full-text chunk index.
+
+    The text of every page is kept with a hash of its content streams.
+    When a revised file replaces the document, the pages are hashed first
+    and only those whose hash is new are extracted; the others are copied
+    from the stored pages. Only the index chunks of changed pages are
+    rebuilt and only quizzes whose source text changed are deleted, so the
+    cost follows the size of the change rather than of the document.
+
+    Args:
+        document (Document): Document whose file is in the blob store
+    """
+    config = current_app.config
+    try:
+        previous = {page.page_number: page for page in document.pages.options(undefer(DocumentPage.text))}
+        with get_blob_store().local_path(document.content_hash) as file_path:
+            document.status = Document.PROCESSING
+            document.pages_total = count_pdf_pages(file_path)
+            document.pages_done = 0
+            document.error = None
+            db.session.commit()
+
+            reused = {}
+            todo = None
+            if previous:
+                with stage('page_hash'):
+                    hashes = page_hashes(file_path)
+                reused = match_pages(hashes, previous)
+                todo = [number for number in range(1, len(hashes) + 1) if number not in reused]
+                PDF_PAGES.inc(len(reused), outcome='reused')
+
+            extracted = {}
+            if todo is None or todo:
+                pages = iter_pdf_pages(
+                    file_path,
+                    workers=config.get('PDF_EXTRACT_WORKERS'),
+                    page_timeout=config.get('PDF_PAGE_TIMEOUT'),
+                    pages=todo
+                )
+                for done, page in enumerate(pages, start=len(reused) + 1):
+                    extracted[page.page_number] = page
+                    if done % PROGRESS_EVERY == 0:
+                        document.pages_done = done
+                        db.session.commit()
+
+        # Text and hash of every page of the new file, in order
+        pages = []
+        for page_number in range(1, document.pages_total + 1):
+            if page_number in reused:
+                pages.append((page_number, reused[page_number].text, reused[page_number].content_hash))
+            else:
+                # Failed pages get no hash, so the next revision extracts them again
+                page = extracted.get(page_number)
+                if page is None or page.error:
+                    pages.append((page_number, '', None))
+                else:
+                    pages.append((page_number, page.text, page.content_hash))
+
+        new_compacted = fill_document_text(document, pages)
+        document.pages_done = document.pages_total
+        document.status = Document.READY
+
+        # Compacted text per page before the new pages replace the old ones
+        old_compacted = {}
+        if previous:
+            old_pages = [(page.page_number, page.text) for _, page in sorted(previous.items()) if page.text]
+            old_compacted = dict(zip(
+                (page_number for page_number, _ in old_pages),
+                compact_pages([text for _, text in old_pages])
+            ))
+        save_pages(document, pages, previous)
+        db.session.commit()
+        
+        # Index the pages for topic-scoped quizzes
+        if previous:
+            reindex_pages(document, new_compacted, old_compacted, reused)
+        else:
+            search.index_document(document.id, new_compacted)
+        
+        # Stored quizzes and bank questions generated from text that changed are out of date
+        if document.quizzes.first() is not None or document.bank_questions.first() is not None:
+            invalidate_document_quizzes(document)
+        
+        # Have the quiz ready before anyone asks for it
+        if config.get('QUIZ_PREGENERATE'):
+            get_job_queue().enqueue('quiz', {'doc_id': document.id})
+    except Exception as e:
+        logger.exception('Ingestion of document %s failed', document.id)
+        db.session.rollback()
+        document.status = Document.FAILED
+        document.error = f'Error extracting text from PDF: {str(e)}'
+        db.session.commit()
+
+
+def fill_document_text(document, pages):
+    """
+    Set the text, compacted text and token count of a document from its pages
+
+    Args:
+        document (Document): Document being ingested
+        pages (list): (page_number, text, content_hash) tuples in page order
+
+    Returns:
+        list: (page_number, compacted text) of the pages with text left, to index
+    """
+    page_texts = [(page_number, text) for page_number, text, _ in pages if text]
+    document.content = "".join(text + "\n\n" for _, text in page_texts)
+    compacted = compact_pages([text for _, text in page_texts])
+    document.compact_content = "\n\n".join(text for text in compacted if text)
+    document.content_tokens = count_tokens(document.compact_content)
+    return [(page_number, text) for (page_number, _), text in zip(page_texts, compacted) if text]
+
+
+def save_pages(document, pages, previous):
+    """
+    Store the text and hash of each page, updating only rows that changed
+
+    Args:
+        document (Document): Document being ingested
+        pages (list): (page_number, text, content_hash) tuples of the new file
+        previous (dict): Page number -> DocumentPage stored before
+    """
+    for page_number, text, content_hash in pages:
+        row = previous.get(page_number)
+        if row is None:
+            db.session.add(DocumentPage(
+                document_id=document.id, page_number=page_number, text=text, content_hash=content_hash
+            ))
+        elif row.content_hash != content_hash or row.text != text:
+            row.text = text
+            row.content_hash = content_hash
+    for page_number, row in previous.items():
+        if page_number > len(pages):
+            db.session.delete(row)
+
+
+def reindex_pages(document, new_compacted, old_compacted, reused):
+    """
+    Bring the chunk index of a re-ingested document up to date
+
+    Chunks of pages whose compacted text is unchanged are kept, and
+    renumbered if the page moved; the other pages are indexed again.
+    Compaction looks across pages (running headers), so a page is only
+    kept when its compacted text is exactly the same as before.
+
+    Args:
+        document (Document): Document being ingested
+        new_compacted (list): (page_number, compacted text) of the new file
+        old_compacted (dict): Page number -> compacted text of the old file
+        reused (dict): New page number -> DocumentPage of the old file with the same content
+    """
+    kept = set()
+    moved = {}
+    added = []
+    for page_number, text in new_compacted:
+        old = reused.get(page_number)
+        old_number = old.page_number if old is not None else None
+        if old_number is not None and old_number not in kept and old_compacted.get(old_number) == text:
+            kept.add(old_number)
+            if old_number != page_number:
+                moved[old_number] = page_number
+        else:
+            added.append((page_number, text))
+    removed = [page_number for page_number in old_compacted if page_number not in kept]
+    with stage('search_index'):
+        inserted = search.update_pages(document.id, removed=removed, moved=moved, added=added)
+    logger.info(
+        'Re-ingested document %s: %d of %d pages reused, %d pages (%d chunks) re-indexed',
+        document.id, len(reused), document.pages_total, len(added), inserted
+    )
+
+
+def page_rows(results):
+    """(page_number, text, content_hash) tuples from PageResults; failed pages are empty and unhashed"""
+    return [
+        (page.page_number, '', None) if page.error else (page.page_number, page.text, page.content_hash)
+        for page in results
+    ]
+
+
+def bulk_ingest(paths, workers=None, batch_size=BULK_BATCH_SIZE, skip_hashes=()):
+    """
+    Ingest PDF files from disk without going through the API
+
+    Files are hashed first; files already stored as a document, listed in
+    `skip_hashes` or seen earlier in `paths` are skipped without being
+    extracted. The rest are extracted whole, one file per task, in a pool
+    of `workers` processes. Documents, their pages and their index chunks
+    are written `batch_size` documents per transaction, pages and chunks
+    with a single bulk insert each. Quizzes are generated on first request.
+
+    Args:
+        paths (list): Paths of the PDF files
+        workers (int): Worker processes, defaults to the CPU count
+        batch_size (int): Documents written per transaction
+        skip_hashes (iterable): Hashes of files to leave out, e.g. from a manifest
+
+    Yields:
+        BulkResult: One per file, once its document is committed (or it was skipped)
+    """
+    config = current_app.config
+    workers = workers or os.cpu_count() or 1
+    known = set(skip_hashes)
+    known.update(row.content_hash for row in db.session.query(Document.content_hash).filter(
+        Document.content_hash.isnot(None)
+    ))
+
+    hashes = {}
+    for path in paths:
+        content_hash = sha256_file(path)
+        if content_hash in known:
+            yield BulkResult(path, content_hash, None, 'skipped', 0)
+            continue
+        known.add(content_hash)
+        hashes[path] = content_hash
+
+    extract = functools.partial(extract_pdf_file, page_timeout=config.get('PDF_PAGE_TIMEOUT'))
+    if workers <= 1 or len(hashes) <= 1:
+        pool = None
+        results = map(extract, hashes)
+    else:
+        pool = multiprocessing.Pool(min(workers, len(hashes)), maxtasksperchild=BULK_TASKS_PER_CHILD)
+        results = pool.imap_unordered(extract, hashes)
+
+    try:
+        batch = []
+        for path, pages, error in results:
+            batch.append((path, hashes[path], pages, error))
+            if len(batch) >= batch_size:
+                yield from _write_batch(batch)
+                batch = []
+        if batch:
+            yield from _write_batch(batch)
+    finally:
+        if pool is not None:
+            pool.terminate()
+            pool.join()
+
+
+def _write_batch(batch):
+    """Store the files and documents of a bulk_ingest batch in one transaction"""
+    store = get_blob_store()
+    documents = []
+    for path, content_hash, results, error in batch:
+        with stage('blob_put'):
+            store.put_file(content_hash, path)
+        document = Document(
+            filename=os.path.basename(path),
+            content_hash=content_hash,
+            pages_total=len(results),
+            pages_done=len(results)
+        )
+        pages = page_rows(results)
+        if error:
+            document.status = Document.FAILED
+            document.error = f'Error extracting text from PDF: {error}'
+            compacted = []
+        else:
+            document.status = Document.READY
+            with stage('compaction'):
+                compacted = fill_document_text(document, pages)
+        PDF_PAGES.inc(sum(1 for page in results if not page.error), outcome='ok')
+        PDF_PAGES.inc(sum(1 for page in results if page.error), outcome='error')
+        documents.append((path, document, pages, compacted))
+
+    with stage('db_commit'):
+        db.session.add_all(document for _, document, _, _ in documents)
+        db.session.flush()
+        db.session.bulk_insert_mappings(DocumentPage, [
+            {'document_id': document.id, 'page_number': page_number, 'text': text, 'content_hash': content_hash}
+            for _, document, pages, _ in documents
+            for page_number, text, content_hash in pages
+        ])
+        search.add_documents([(document.id, compacted) for _, document, _, compacted in documents])
+        db.session.commit()
+
+    results = [
+        BulkResult(path, document.content_hash, document.id, document.status, len(pages))
+        for path, document, pages, _ in documents
+    ]
+    # Nothing in the batch is needed any more, don't let the session grow
+    db.session.expunge_all()
+    return results
+
+
+@job_handler('ingest')
+def run_ingest_job(payload):
+    """Ingest the document of a queued job"""
+    document = Document.query.get(payload['doc_id'])
+    if not document:
+        raise ValueError(f"Document with ID {payload['doc_id']} not found")
+    ingest_document(document)
+    return {'doc_id': document.id, 'status': document.status}
+
+
+def schedule_ingestion(document):
+    """
+    Ingest a document in the background, or right away when INGEST_ASYNC is off
+
+    Args:
+        document (Document): Newly stored document in the pending state
+    """
+    if current_app.config.get('INGEST_ASYNC', True):
+        get_job_queue().enqueue('ingest', {'doc_id': document.id})
+    else:
+        ingest_document(document)
@@ -0,0 +1,233 @@
+import datetime
+import json
+import logging
+import threading
+import time
+from flask import current_app
+from sqlalchemy import and_, or_, text
+from sqlalchemy.exc import SQLAlchemyError
+from autoquiz.extensions import db
+from autoquiz.models import Job
+
+logger = logging.getLogger(__name__)
+
+# Job kind -> function(payload) returning a JSON serializable result
+HANDLERS = {}
+
+
+def job_handler(kind):
+    """Register the decorated function as the handler of a job kind"""
+    def decorator(func):
+        HANDLERS[kind] = func
+        return func
+    return decorator
+
+
+class JobQueue:
+    """
+    Job queue backed by the `jobs` table with a local pool of worker threads
+
+    Enqueueing is a single INSERT, so request handlers return immediately.
+    Workers claim queued jobs with a conditional UPDATE, which makes it safe
+    for several processes (e.g. gunicorn workers) to share one table: each
+    job is run exactly once. Idle workers wake up on local enqueues and poll
+    every `poll_interval` seconds for jobs queued by other processes.
+
+    A claimed job holds a lease of `stale_after` seconds, which a heartbeat
+    thread renews while the job runs. Workers periodically requeue running
+    jobs whose lease has expired, i.e. whose process crashed or hung, so a
+    long job of a live process is never run twice.
+    """
+
+    def __init__(self, app, workers=4, poll_interval=1.0, stale_after=60):
+        self.app = app
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.stale_after = datetime.timedelta(seconds=stale_after)
+        # Leases are renewed (and expired ones looked for) several times per lease
+        self.heartbeat_interval = max(0.05, stale_after / 4)
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._threads = []
+        self._start_lock = threading.Lock()
+        self._running = set()
+        self._running_lock = threading.Lock()
+        self._requeued_at = 0.0
+
+    def enqueue(self, kind, payload):
+        """
+        Add a job to the queue
+
+        Args:
+            kind (str): Registered handler name
+            payload (dict): JSON serializable arguments for the handler
+
+        Returns:
+            Job: The queued job
+        """
+        if kind not in HANDLERS:
+            raise ValueError(f'No handler registered for job kind: {kind}')
+        job = Job(kind=kind, payload=json.dumps(payload))
+        db.session.add(job)
+        db.session.commit()
+        self.start()
+        self._wakeup.set()
+        return job
+
+    def start(self):
+        """Start the worker threads, once"""
+        with self._start_lock:
+            if self._threads or self.workers <= 0:
+                return
+            for number in range(self.workers):
+                thread = threading.Thread(target=self._work, name=f'autoquiz-job-worker-{number}', daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            thread = threading.Thread(target=self._heartbeat, name='autoquiz-job-heartbeat', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout=None):
+        """Ask the workers to exit after their current job"""
+        self._stop.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+        self._stop.clear()
+
+    def _work(self):
+        with self.app.app_context():
+            while not self._stop.is_set():
+                try:
+                    self._requeue_due()
+                    job_id = self.claim_next()
+                except SQLAlchemyError:
+                    logger.exception('Could not claim a job')
+                    db.session.rollback()
+                    job_id = None
+                if job_id is None:
+                    self._wakeup.wait(self.poll_interval)
+                    self._wakeup.clear()
+                    continue
+                self.run(job_id)
+
+    def _heartbeat(self):
+        with self.app.app_context():
+            while not self._stop.wait(self.heartbeat_interval):
+                try:
+                    self.renew_leases()
+                except SQLAlchemyError:
+                    logger.exception('Could not renew job leases')
+
+    def renew_leases(self):
+        """Extend the lease of the jobs this process is running"""
+        with self._running_lock:
+            job_ids = list(self._running)
+        if not job_ids:
+            return
+        with db.engine.begin() as conn:
+            conn.execute(
+                Job.__table__.update()
+                .where(Job.id.in_(job_ids), Job.status == Job.RUNNING)
+                .values(lease_expires_at=datetime.datetime.utcnow() + self.stale_after)
+            )
+
+    def _requeue_due(self):
+        """Look for expired leases every heartbeat_interval, whichever worker gets to it"""
+        now = time.monotonic()
+        with self._running_lock:
+            if now - self._requeued_at < self.heartbeat_interval:
+                return
+            self._requeued_at = now
+        self.requeue_stale()
+
+    def claim_next(self):
+        """Atomically mark the oldest queued job as running and return its id"""
+        while True:
+            job_id = db.session.query(Job.id).filter_by(status=Job.QUEUED).order_by(Job.created_at).limit(1).scalar()
+            if job_id is None:
+                db.session.commit()
+                return None
+            # Only one worker can move the job out of 'queued'
+            now = datetime.datetime.utcnow()
+            claimed = db.session.execute(
+                text(
+                    'UPDATE jobs SET status = :running, started_at = :now, lease_expires_at = :lease '
+                    'WHERE id = :id AND status = :queued'
+                ),
+                {'running': Job.RUNNING, 'queued': Job.QUEUED, 'now': now, 'lease': now + self.stale_after,
+                 'id': job_id}
+            ).rowcount
+            db.session.commit()
+            if claimed:
+                return job_id
+
+    def run(self, job_id):
+        """Run a claimed job and store its result or error, renewing its lease meanwhile"""
+        with self._running_lock:
+            self._running.add(job_id)
+        try:
+            self._run(job_id)
+        finally:
+            with self._running_lock:
+                self._running.discard(job_id)
+
+    def _run(self, job_id):
+        job = Job.query.get(job_id)
+        try:
+            result = HANDLERS[job.kind](json.loads(job.payload))
+            job.result = json.dumps(result)
+            job.status = Job.SUCCEEDED
+        except Exception as e:
+            logger.exception('Job %s failed', job_id)
+            db.session.rollback()
+            job = Job.query.get(job_id)
+            job.error = str(e)
+            job.status = Job.FAILED
+        job.finished_at = datetime.datetime.utcnow()
+        job.lease_expires_at = None
+        db.session.commit()
+        db.session.remove()
+
+    def requeue_stale(self):
+        """
+        Put running jobs whose lease has expired back in the queue
+
+        Jobs claimed before leases existed have none; they are requeued once
+        they have been running for stale_after.
+
+        Returns:
+            int: Number of jobs requeued
+        """
+        now = datetime.datetime.utcnow()
+        with db.engine.begin() as conn:
+            return conn.execute(
+                Job.__table__.update()
+                .where(
+                    Job.status == Job.RUNNING,
+                    or_(
+                        Job.lease_expires_at < now,
+                        and_(Job.lease_expires_at.is_(None), Job.started_at < now - self.stale_after)
+                    )
+                )
+                .values(status=Job.QUEUED, started_at=None, lease_expires_at=None)
+            ).rowcount
+
+
+def init_app(app):
+    """Create the job queue and start its workers with the first request"""
+    queue = JobQueue(
+        app,
+        workers=app.config.get('JOB_WORKERS', 4),
+        poll_interval=app.config.get('JOB_POLL_INTERVAL', 1.0),
+        stale_after=app.config.get('JOB_STALE_AFTER', 60)
+    )
+    app.extensions['job_queue'] = queue
+    app.before_first_request(queue.start)
+    return queue
+
+
+def get_job_queue():
+    """Return the job queue of the current app"""
+    return current_app.extensions['job_queue']
@@ -0,0 +1,72 @@
+import importlib
+import threading
+
+# Heavy third-party modules the app imports on first use (see preload)
+HEAVY_MODULES = ('openai', 'httpx', 'pdfplumber', 'numpy')
+
+
+class LazyModule:
+    """
+    Stand-in for a module that is imported on first attribute access
+
+    Importing pdfplumber (pdfminer, PIL) and openai (pydantic, httpx) takes
+    a large share of startup time, while a worker serving document listings
+    never needs them. `openai = lazy_import('openai')` keeps call sites
+    unchanged: `openai.OpenAI(...)` imports openai the first time it runs.
+    """
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+
+    def load(self):
+        """Import the module (once) and return it"""
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    self._module = importlib.import_module(self._name)
+        return self._module
+
+    @property
+    def loaded(self):
+        return self._module is not None
+
+    def __getattr__(self, attr):
+        return getattr(self.load(), attr)
+
+    def __repr__(self):
+        state = 'loaded' if self.loaded else 'not loaded'
+        return f'<LazyModule {self._name!r} ({state})>'
+
+
+_modules = {}
+_modules_lock = threading.Lock()
+
+
+def lazy_import(name):
+    """Return the LazyModule for `name`, shared by every caller"""
+    with _modules_lock:
+        if name not in _modules:
+            _modules[name] = LazyModule(name)
+        return _modules[name]
+
+
+def preload(names=HEAVY_MODULES):
+    """
+    Import heavy modules now instead of on first use
+
+    Called in the gunicorn master when APP_PRELOAD is set, so forked
+    workers share the imported modules' memory copy-on-write and the
+    first quiz or upload of each worker does not pay for the import.
+
+    Returns:
+        list: Names of the modules that were imported
+    """
+    loaded = []
+    for name in names:
+        module = lazy_import(name)
+        if not module.loaded:
+            module.load()
+            loaded.append(name)
+    return loaded
@@ -0,0 +1,456 @@
+import collections
+import contextlib
+import email.utils
+import os
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from flask import current_app, has_app_context
+from autoquiz.utils.lazy import lazy_import
+from autoquiz.utils.metrics import LLM_BREAKER_REJECTIONS, LLM_BREAKER_TRIPS, LLM_HEDGES, LLM_RETRIES, LLM_TOKENS
+
+# Imported on first use, so processes that never call OpenAI start faster
+httpx = lazy_import('httpx')
+openai = lazy_import('openai')
+
+# HTTP status codes worth retrying besides 5xx
+RETRYABLE_STATUS_CODES = {408, 409, 429}
+
+# Latencies of recent calls kept to estimate the hedging delay, and how
+# many are needed before it is trusted
+LATENCY_WINDOW = 200
+MIN_LATENCY_SAMPLES = 20
+
+# Hedges that may be sent in a row; each call earns hedge_ratio of one, so
+# credit saved up while upstream was fast cannot double a slowdown's load
+HEDGE_BURST = 5
+
+
+class LLMUnavailableError(Exception):
+    """Raised without (again) calling OpenAI: the circuit breaker is open or the deadline has passed"""
+
+
+class CircuitBreaker:
+    """
+    Stops calls to an upstream that keeps failing
+
+    Closed, calls go through; `failure_threshold` failures in a row open
+    the breaker. Open, calls are rejected right away for `reset_timeout`
+    seconds. Then it is half-open: a single trial call goes through, and
+    closes the breaker if it succeeds or opens it again if it fails.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._trial = False
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                return self.HALF_OPEN
+            return self._state
+
+    def allow(self):
+        """Return True if a call may go ahead; every allowed call must be followed by a record_* call"""
+        if self.failure_threshold <= 0:
+            return True
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._state = self.HALF_OPEN
+                self._trial = False
+            if self._state == self.HALF_OPEN and not self._trial:
+                self._trial = True
+                return True
+        LLM_BREAKER_REJECTIONS.inc()
+        return False
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or (
+                self._state == self.CLOSED and 0 < self.failure_threshold <= self._failures
+            ):
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+                self._trial = False
+                LLM_BREAKER_TRIPS.inc()
+
+
+class LLMClient:
+    """
+    Process-wide OpenAI client
+
+    One instance is shared by every request so connections are reused
+    (keep-alive) instead of paying TCP/TLS setup per quiz. A semaphore caps
+    how many upstream calls run at once, and failed calls are retried on
+    429/5xx and connection errors with jittered exponential backoff,
+    honoring Retry-After when the server sends it.
+
+    Tail latency is bounded in three ways:
+
+    - `deadline`: seconds a call may take including retries; attempts are
+      cut short and no retry is started that could not finish in time.
+    - Hedging: when a completion has not arrived after `hedge_after`
+      seconds (by default the `hedge_quantile` of recent latencies), the
+      same request is sent again and whichever answers first is used. At
+      most `hedge_ratio` of calls are hedged, so a slow upstream does not
+      get twice the load.
+    - A CircuitBreaker: after `breaker_failures` failed attempts in a row,
+      calls fail immediately with LLMUnavailableError for
+      `breaker_reset` seconds, so callers serve cached or fallback
+      quizzes instead of waiting on an outage.
+    """
+
+    def __init__(self, api_key=None, base_url=None, timeout=60.0, max_connections=20,
+                 max_keepalive_connections=10, max_concurrency=8, max_retries=3,
+                 backoff_base=0.5, backoff_max=20.0, deadline=None, hedge_after='auto',
+                 hedge_quantile=0.9, hedge_ratio=0.2, breaker_failures=5, breaker_reset=30.0):
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.max_keepalive_connections = max_keepalive_connections
+        self.http_client = None
+        self.api_key = api_key
+        self.base_url = base_url
+        self._client = None
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._semaphore = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self.retries = 0
+        self.deadline = deadline or None
+        self.hedge_after = hedge_after
+        self.hedge_quantile = hedge_quantile
+        self.hedge_ratio = hedge_ratio
+        self.breaker = CircuitBreaker(breaker_failures, breaker_reset)
+        self._latencies = collections.deque(maxlen=LATENCY_WINDOW)
+        self._hedge_credit = 1.0
+        # Attempts run here so a slow one can be hedged; losers finish in the background
+        self._executor = ThreadPoolExecutor(max_concurrency * 4, thread_name_prefix='autoquiz-llm')
+
+    @property
+    def client(self):
+        """
+        The underlying openai.OpenAI client, created on first use so the app
+        starts without an API key (quiz generation then falls back to samples)
+        and without importing openai and httpx
+        """
+        with self._lock:
+            if self._client is None:
+                self.http_client = httpx.Client(
+                    limits=httpx.Limits(
+                        max_connections=self.max_connections,
+                        max_keepalive_connections=self.max_keepalive_connections,
+                        keepalive_expiry=30.0
+                    ),
+                    timeout=httpx.Timeout(self.timeout, connect=min(self.timeout, 10.0))
+                )
+                self._client = openai.OpenAI(
+                    api_key=self.api_key or os.getenv('OPENAI_API_KEY'),
+                    base_url=self.base_url or None,
+                    http_client=self.http_client,
+                    max_retries=0  # retries are handled here so they can honor the concurrency limit
+                )
+            return self._client
+
+    def chat_completion(self, deadline=None, **kwargs):
+        """
+        Create a chat completion, retrying transient failures
+
+        Args:
+            deadline (float): Seconds the call may take including retries,
+                defaults to the client's deadline
+            **kwargs: Arguments of `client.chat.completions.create`
+
+        Returns:
+            The OpenAI ChatCompletion response
+
+        Raises:
+            LLMUnavailableError: If the circuit breaker is open or the deadline passed
+        """
+        expires = self._expires(deadline)
+        attempt = 0
+        while True:
+            try:
+                return self._hedged_attempt(kwargs, expires)
+            except openai.APIError as e:
+                if attempt >= self.max_retries or not self._is_retryable(e):
+                    raise
+                delay = self._retry_delay(attempt, e)
+                if expires is not None and time.monotonic() + delay >= expires:
+                    raise
+            attempt += 1
+            with self._lock:
+                self.retries += 1
+            LLM_RETRIES.inc()
+            time.sleep(delay)
+
+    def _expires(self, deadline):
+        deadline = deadline or self.deadline
+        return time.monotonic() + deadline if deadline else None
+
+    def _attempt_timeout(self, expires):
+        """Timeout of the next attempt: the client timeout, cut to what is left of the deadline"""
+        if expires is None:
+            return self.timeout
+        remaining = expires - time.monotonic()
+        if remaining <= 0:
+            raise LLMUnavailableError('OpenAI call deadline exceeded')
+        return min(self.timeout, remaining)
+
+    def _attempt(self, kwargs, timeout, limit=True):
+        """A single call, guarded by the circuit breaker and (with `limit`) the concurrency limit"""
+        if not self.breaker.allow():
+            raise LLMUnavailableError('OpenAI calls are suspended after repeated failures (circuit breaker open)')
+        try:
+            with self._semaphore if limit else contextlib.nullcontext():
+                start = time.monotonic()
+                response = self.client.chat.completions.create(timeout=timeout, **kwargs)
+        except openai.APIError as e:
+            if self._is_retryable(e):
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()  # upstream answered, the request was at fault
+            raise
+        except Exception:
+            self.breaker.record_failure()
+            raise
+        self.breaker.record_success()
+        with self._lock:
+            self._latencies.append(time.monotonic() - start)
+        usage = getattr(response, 'usage', None)
+        if usage is not None:
+            LLM_TOKENS.inc(usage.prompt_tokens or 0, kind='prompt')
+            LLM_TOKENS.inc(usage.completion_tokens or 0, kind='completion')
+        return response
+
+    def _hedged_attempt(self, kwargs, expires):
+        """
+        Make an attempt and, if it is slower than the hedging delay, a
+        second one; return the first response to arrive
+
+        If one of them fails, the other is still waited for. When both fail
+        the first attempt's error is raised. A hedge that has not started
+        when the first attempt answers is cancelled and its credit returned.
+        """
+        timeout = self._attempt_timeout(expires)
+        hedge_after = self.hedge_delay()
+        with self._lock:
+            self._hedge_credit = min(HEDGE_BURST, self._hedge_credit + self.hedge_ratio)
+        if hedge_after is None or hedge_after >= timeout:
+            return self._attempt(kwargs, timeout)
+
+        # The caller holds the concurrency slot rather than the attempts, so
+        # a slow attempt left running after its hedge won does not keep it;
+        # hedges themselves are limited by hedge_ratio instead
+        with self._semaphore:
+            primary = self._executor.submit(self._attempt, kwargs, timeout, False)
+            try:
+                return primary.result(timeout=hedge_after)
+            except FutureTimeoutError:
+                pass
+            if self.breaker.state != CircuitBreaker.CLOSED:
+                return primary.result()
+            with self._lock:
+                allowed = self._hedge_credit >= 1
+                if allowed:
+                    self._hedge_credit -= 1
+            if not allowed:
+                return primary.result()
+
+            LLM_HEDGES.inc(outcome='sent')
+            hedge = self._executor.submit(self._attempt, kwargs, max(0.001, timeout - hedge_after), False)
+            try:
+                pending = {primary, hedge}
+                while pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        if future.exception() is None:
+                            if future is hedge:
+                                LLM_HEDGES.inc(outcome='won')
+                            return future.result()
+                return primary.result()
+            finally:
+                # A hedge still queued behind busy attempts was never sent; it
+                # is dropped and its credit given back
+                if hedge.cancel():
+                    with self._lock:
+                        self._hedge_credit = min(HEDGE_BURST, self._hedge_credit + 1)
+                    LLM_HEDGES.inc(outcome='cancelled')
+
+    def hedge_delay(self):
+        """
+        Seconds after which an attempt is hedged, or None when hedging is off
+
+        With `hedge_after='auto'` this is the `hedge_quantile` of the
+        latencies of recent successful calls, once there are enough of them.
+        """
+        if self.hedge_after in (None, '', 'off', 0, '0'):
+            return None
+        if self.hedge_after != 'auto':
+            return float(self.hedge_after)
+        with self._lock:
+            if len(self._latencies) < MIN_LATENCY_SAMPLES:
+                return None
+            latencies = sorted(self._latencies)
+        return latencies[min(len(latencies) - 1, int(len(latencies) * self.hedge_quantile))]
+
+    def stream_chat_completion(self, **kwargs):
+        """
+        Create a streamed chat completion and yield its text as it arrives
+
+        Failures before the first piece of text are retried like
+        chat_completion, within the client's deadline and subject to the
+        circuit breaker; once text has been yielded errors are raised.
+        Streams are not hedged. The concurrency slot is held until the
+        stream is exhausted or closed.
+
+        Args:
+            **kwargs: Arguments of `client.chat.completions.create`
+
+        Yields:
+            str: Pieces of the completion text
+        """
+        expires = self._expires(None)
+        attempt = 0
+        while True:
+            started = False
+            timeout = self._attempt_timeout(expires)
+            if not self.breaker.allow():
+                raise LLMUnavailableError('OpenAI calls are suspended after repeated failures (circuit breaker open)')
+            recorded = False
+            try:
+                with self._semaphore:
+                    for chunk in self.client.chat.completions.create(stream=True, timeout=timeout, **kwargs):
+                        if not chunk.choices:
+                            continue
+                        delta = chunk.choices[0].delta.content
+                        if delta:
+                            if not started:
+                                started = recorded = True
+                                self.breaker.record_success()
+                            yield delta
+                    return
+            except openai.APIError as e:
+                retryable = self._is_retryable(e)
+                if not recorded and retryable:
+                    self.breaker.record_failure()
+                    recorded = True
+                if started or attempt >= self.max_retries or not retryable:
+                    raise
+                delay = self._retry_delay(attempt, e)
+                if expires is not None and time.monotonic() + delay >= expires:
+                    raise
+            finally:
+                # Upstream answered (or the caller stopped reading first)
+                if not recorded:
+                    self.breaker.record_success()
+            attempt += 1
+            with self._lock:
+                self.retries += 1
+            LLM_RETRIES.inc()
+            time.sleep(delay)
+
+    def _is_retryable(self, error):
+        if isinstance(error, openai.APIConnectionError):  # includes timeouts
+            return True
+        if isinstance(error, openai.APIStatusError):
+            return error.status_code >= 500 or error.status_code in RETRYABLE_STATUS_CODES
+        return False
+
+    def _retry_delay(self, attempt, error):
+        """Seconds to wait before the next attempt"""
+        retry_after = _parse_retry_after(getattr(error, 'response', None))
+        if retry_after is not None:
+            return min(retry_after, self.backoff_max)
+        # "Full jitter": a random delay up to the exponential backoff ceiling
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        if self.http_client is not None:
+            self.http_client.close()
+
+
+def _parse_retry_after(response):
+    """Read a Retry-After header given in seconds or as an HTTP date"""
+    if response is None:
+        return None
+    value = response.headers.get('retry-after')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+def create_client(config):
+    """Build an LLMClient from a config mapping"""
+    return LLMClient(
+        api_key=config.get('OPENAI_API_KEY'),
+        base_url=config.get('OPENAI_BASE_URL'),
+        timeout=config.get('LLM_TIMEOUT', 60.0),
+        max_connections=config.get('LLM_MAX_CONNECTIONS', 20),
+        max_keepalive_connections=config.get('LLM_MAX_KEEPALIVE_CONNECTIONS', 10),
+        max_concurrency=config.get('LLM_MAX_CONCURRENCY', 8),
+        max_retries=config.get('LLM_MAX_RETRIES', 3),
+        deadline=config.get('LLM_DEADLINE', 60.0),
+        hedge_after=config.get('LLM_HEDGE_AFTER', 'auto'),
+        hedge_quantile=config.get('LLM_HEDGE_QUANTILE', 0.9),
+        hedge_ratio=config.get('LLM_HEDGE_MAX_RATIO', 0.2),
+        breaker_failures=config.get('LLM_BREAKER_FAILURES', 5),
+        breaker_reset=config.get('LLM_BREAKER_RESET', 30.0)
+    )
+
+
+def init_app(app):
+    """Create the shared OpenAI client and attach it to the app"""
+    client = create_client(app.config)
+    app.extensions['llm'] = client
+    return client
+
+
+_default_client = None
+_default_lock = threading.Lock()
+
+
+def get_llm_client():
+    """
+    Return the OpenAI client of the current app
+
+    Outside an application context (scripts using autoquiz.quiz_generator)
+    a process-wide client configured from the environment is used.
+    """
+    global _default_client
+    if has_app_context():
+        return current_app.extensions['llm']
+    with _default_lock:
+        if _default_client is None:
+            _default_client = create_client({'OPENAI_BASE_URL': os.getenv('OPENAI_BASE_URL')})
+        return _default_client
@@ -0,0 +1,284 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from flask import current_app, g, has_app_context, request
+
+# Upper bounds (seconds) of the latency histogram buckets
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labelnames, values, extra=()):
+    pairs = list(zip(labelnames, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """A monotonically increasing count per label combination"""
+
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        # Without labels the counter is exported as 0 before its first increment
+        self._values = {} if self.labelnames else {(): 0}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            return self._values.get(key, 0)
+
+    def samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            yield f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}'
+
+
+class Histogram:
+    """Observations counted into fixed buckets, with their sum and count"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                # Per-bucket (not cumulative) counts, one extra for +Inf, then sum
+                state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][index] += 1
+            state[1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the seconds spent in the with block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self):
+        with self._lock:
+            values = sorted((key, (list(counts), total)) for key, (counts, total) in self._values.items())
+        for key, (counts, total) in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, [('le', _format_value(float(bound)))])
+                yield f'{self.name}_bucket{labels} {cumulative}'
+            labels = _format_labels(self.labelnames, key)
+            yield f'{self.name}_sum{labels} {_format_value(total)}'
+            yield f'{self.name}_count{labels} {cumulative}'
+
+
+class MetricsRegistry:
+    """
+    In-process metrics, rendered in the Prometheus text exposition format
+
+    Metrics are plain counters and bucketed histograms guarded by a lock
+    each, so recording costs a dict update. Values are per process; scrape
+    every process (or run one) to see all of them.
+    """
+
+    def __init__(self):
+        self._metrics = {}
+        self._collectors = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name, documentation, labelnames, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, documentation, labelnames, **kwargs)
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets=buckets)
+
+    def set_collector(self, key, collector):
+        """
+        Register a callable returning (name, kind, documentation, samples)
+        tuples at scrape time, for values kept elsewhere (e.g. cache counters).
+        `samples` is a list of (labels dict, value). A collector registered
+        under the same key is replaced.
+        """
+        with self._lock:
+            self._collectors[key] = collector
+
+    def render(self):
+        lines = []
+        with self._lock:
+            metrics = sorted(self._metrics.values(), key=lambda metric: metric.name)
+            collectors = list(self._collectors.values())
+        for metric in metrics:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            lines.extend(metric.samples())
+        for collector in collectors:
+            for name, kind, documentation, samples in collector():
+                lines.append(f'# HELP {name} {documentation}')
+                lines.append(f'# TYPE {name} {kind}')
+                for labels, value in samples:
+                    labelnames = tuple(labels)
+                    lines.append(
+                        f'{name}{_format_labels(labelnames, [labels[n] for n in labelnames])} {_format_value(value)}'
+                    )
+        return '\n'.join(lines) + '\n'
+
+
+# Metrics are per process, like the OpenAI client outside an app context
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    'autoquiz_stage_seconds', 'Time spent in each stage of request handling', ['stage']
+)
+REQUEST_SECONDS = REGISTRY.histogram(
+    'autoquiz_http_request_seconds', 'HTTP request latency', ['method', 'endpoint', 'status']
+)
+QUIZ_FALLBACKS = REGISTRY.counter(
+    'autoquiz_quiz_fallbacks_total', 'Quizzes answered with the sample quiz because generation failed'
+)
+LLM_RETRIES = REGISTRY.counter(
+    'autoquiz_llm_retries_total', 'OpenAI calls retried after a transient failure'
+)
+LLM_HEDGES = REGISTRY.counter(
+    'autoquiz_llm_hedges_total', 'Duplicate OpenAI requests sent for slow calls, how many answered first and how many were dropped unsent',
+    ['outcome']
+)
+LLM_BREAKER_TRIPS = REGISTRY.counter(
+    'autoquiz_llm_breaker_trips_total', 'Times the OpenAI circuit breaker opened'
+)
+LLM_BREAKER_REJECTIONS = REGISTRY.counter(
+    'autoquiz_llm_breaker_rejections_total', 'OpenAI calls not made because the circuit breaker was open'
+)
+LLM_TOKENS = REGISTRY.counter(
+    'autoquiz_llm_tokens_total', 'Tokens reported in OpenAI responses', ['kind']
+)
+PDF_PAGES = REGISTRY.counter(
+    'autoquiz_pdf_pages_total', 'PDF pages extracted', ['outcome']
+)
+BANK_QUESTIONS = REGISTRY.counter(
+    'autoquiz_question_bank_questions_total', 'Generated questions offered to the question bank, added or near duplicates',
+    ['outcome']
+)
+BANK_QUIZZES = REGISTRY.counter(
+    'autoquiz_question_bank_quizzes_total', 'Quizzes built from the question bank, by whether OpenAI was called',
+    ['source']
+)
+
+
+def stage(name):
+    """
+    Time a stage of request handling, e.g. `with stage('llm_call'): ...`
+
+    Observations go to the autoquiz_stage_seconds histogram.
+    """
+    return STAGE_SECONDS.time(stage=name)
+
+
+def _cache_samples(app):
+    cache = app.extensions.get('quiz_cache')
+    if cache is None:
+        return []
+    return [
+        ('autoquiz_quiz_cache_lookups_total', 'counter', 'Quiz cache lookups by result', [
+            ({'result': 'memory_hit'}, cache.memory_hits),
+            ({'result': 'durable_hit'}, cache.durable_hits),
+            ({'result': 'miss'}, cache.misses),
+        ]),
+        ('autoquiz_quiz_cache_memory_entries', 'gauge', 'Entries in the in-process quiz cache', [
+            ({}, len(cache)),
+        ]),
+    ]
+
+
+def _llm_samples(app):
+    client = app.extensions.get('llm')
+    if client is None:
+        return []
+    hedge_delay = client.hedge_delay()
+    return [
+        ('autoquiz_llm_breaker_open', 'gauge', 'Whether OpenAI calls are suspended by the circuit breaker', [
+            ({}, 0 if client.breaker.state == 'closed' else 1),
+        ]),
+        ('autoquiz_llm_hedge_delay_seconds', 'gauge', 'Seconds after which a slow OpenAI call is hedged, 0 when off', [
+            ({}, hedge_delay or 0),
+        ]),
+    ]
+
+
+def init_app(app):
+    """Time every request and expose the app's cache and OpenAI client state"""
+    @app.before_request
+    def _start_timer():
+        g._metrics_start = time.perf_counter()
+
+    @app.after_request
+    def _observe_request(response):
+        start = g.pop('_metrics_start', None)
+        if start is None:
+            return response
+        labels = {
+            'method': request.method,
+            'endpoint': request.url_rule.rule if request.url_rule else 'unmatched',
+            'status': response.status_code
+        }
+
+        def observe():
+            REQUEST_SECONDS.observe(time.perf_counter() - start, **labels)
+
+        if response.is_streamed:
+            # The body (e.g. SSE quiz events) is only generated while it is
+            # sent, so a streamed request ends when the server closes it
+            response.call_on_close(observe)
+        else:
+            observe()
+        return response
+
+    REGISTRY.set_collector('quiz_cache', lambda: _cache_samples(app))
+    REGISTRY.set_collector('llm', lambda: _llm_samples(app))
+    app.extensions['metrics'] = REGISTRY
+    return REGISTRY
+
+
+def get_metrics():
+    """Return the metrics registry of the current app, or the process-wide one"""
+    if has_app_context():
+        return current_app.extensions.get('metrics', REGISTRY)
+    return REGISTRY
@@ -1,27 +1,371 @@
-import pdfplumber
+import atexit
 import base64
+import hashlib
+import multiprocessing
+import os
+import signal
+import threading
+from collections import namedtuple
+from contextlib import contextmanager
+from autoquiz.utils.lazy import lazy_import
+from autoquiz.utils.metrics import PDF_PAGES, stage
 
-def extract_pdf_text(file_path):
+# Imported on first use (pdfminer and PIL are slow to import)
+pdfplumber = lazy_import('pdfplumber')
+
+# Result of extracting a single page. `error` is None on success.
+# `content_hash` fingerprints the page's content streams (see page_content_hash).
+PageResult = namedtuple('PageResult', ['page_number', 'text', 'error', 'content_hash'], defaults=[None])
+
+# Number of consecutive pages handed to a worker process in one task
+DEFAULT_PAGES_PER_TASK = 8
+
+# Seconds a single page may take before it is abandoned
+DEFAULT_PAGE_TIMEOUT = 30
+
+# Extra seconds the parent waits for a range, so the worker's own per-page
+# alarm fires first and only the slow page is lost
+PAGE_TIMEOUT_GRACE = 1.0
+
+# How extraction worker processes are started. Forking a process that runs
+# other threads (job workers, gunicorn gthread workers) copies locks those
+# threads may hold, e.g. in logging or the SQLAlchemy pool, into a child
+# where nobody releases them; a forkserver forks from a clean process.
+POOL_START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+# Idle worker pools kept per worker count for later extractions
+MAX_IDLE_POOLS = 2
+
+_idle_pools = {}
+_pools_lock = threading.Lock()
+
+
+def count_pdf_pages(file_path):
     """
-    Extract text from a PDF file using pdfplumber
-    
+    Count the pages of a PDF file without extracting any text
+
     Args:
         file_path (str): Path to the PDF file
-        
+
     Returns:
-        str: Extracted text content
+        int: Number of pages
+    """
+    with pdfplumber.open(file_path) as pdf:
+        return len(pdf.pages)
+
+
+def page_content_hash(page):
+    """
+    Fingerprint what a page draws, without extracting its text
+
+    Hashes the decoded content streams of the page together with the names
+    of its fonts. Saving a revised PDF rewrites object numbers and offsets,
+    but an unchanged page keeps the same drawing operators, so its hash
+    stays the same.
+
+    Args:
+        page (pdfplumber.page.Page): Page to hash
+
+    Returns:
+        str: Hex encoded SHA-256 digest
+    """
+    from pdfminer.pdftypes import resolve1
+
+    digest = hashlib.sha256()
+    for stream in page.page_obj.contents:
+        digest.update(resolve1(stream).get_data())
+    fonts = resolve1(resolve1(page.page_obj.resources or {}).get('Font')) or {}
+    for name in sorted(fonts):
+        font = resolve1(fonts[name]) or {}
+        digest.update(f'\0{name}={resolve1(font.get("BaseFont"))}'.encode('utf-8'))
+    return digest.hexdigest()
+
+
+def page_hashes(file_path):
+    """
+    Hash every page of a PDF file (see page_content_hash)
+
+    Much cheaper than extracting the text, so it is used to find the pages
+    of a revised file that need to be extracted again.
+
+    Args:
+        file_path (str): Path to the PDF file
+
+    Returns:
+        list: Hashes in page order, None for pages that could not be read
+    """
+    hashes = []
+    with pdfplumber.open(file_path) as pdf:
+        for page in pdf.pages:
+            try:
+                hashes.append(page_content_hash(page))
+            except Exception:
+                hashes.append(None)
+    return hashes
+
+
+def _extract_page_range(file_path, start, end, page_timeout=None):
+    """
+    Extract the text of pages start..end-1 (0-based), in a worker process or in-process
+
+    A page taking longer than `page_timeout` seconds is interrupted (where
+    SIGALRM is usable) and returned with an error.
+
+    Returns:
+        list: PageResult tuples in page order
+    """
+    with pdfplumber.open(file_path, pages=range(start + 1, end + 1)) as pdf:
+        results = []
+        for page in pdf.pages:
+            try:
+                with _page_alarm(page_timeout):
+                    results.append(_extract_page(page))
+            except _PageTimeout as e:
+                results.append(PageResult(page.page_number, "", str(e)))
+        return results
+
+
+def _extract_page(page):
+    """Extract and hash a single pdfplumber page"""
+    try:
+        text = page.extract_text() or ""
+        return PageResult(page.page_number, text, None, page_content_hash(page))
+    except Exception as e:
+        return PageResult(page.page_number, "", str(e))
+
+
+class _PageTimeout(Exception):
+    pass
+
+
+def _raise_page_timeout(signum, frame):
+    raise _PageTimeout('Timed out extracting page')
+
+
+def _alarm_usable():
+    """Whether _page_alarm can interrupt this thread (Unix, main thread)"""
+    return hasattr(signal, 'setitimer') and threading.current_thread() is threading.main_thread()
+
+
+@contextmanager
+def _page_alarm(seconds):
+    """Interrupt the block after `seconds` with SIGALRM, where that is possible (Unix main thread)"""
+    if not seconds or not _alarm_usable():
+        yield
+        return
+    previous = signal.signal(signal.SIGALRM, _raise_page_timeout)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def extract_pdf_file(file_path, page_timeout=None):
+    """
+    Extract all pages of a PDF file in the calling process
+
+    Bulk ingestion spreads whole files over a process pool, which keeps
+    every core busy with less overhead than splitting each file into page
+    ranges. A page taking longer than `page_timeout` seconds is interrupted
+    and returned with an error. Errors are returned rather than raised so
+    one broken file does not stop the pool.
+
+    Args:
+        file_path (str): Path to the PDF file
+        page_timeout (float): Seconds allowed per page, defaults to DEFAULT_PAGE_TIMEOUT
+
+    Returns:
+        tuple: (file_path, list of PageResult, error or None)
     """
-    text_content = ""
+    page_timeout = page_timeout or DEFAULT_PAGE_TIMEOUT
     try:
+        pages = []
         with pdfplumber.open(file_path) as pdf:
             for page in pdf.pages:
-                extracted_text = page.extract_text()
-                if extracted_text:
-                    text_content += extracted_text + "\n\n"
+                with _page_alarm(page_timeout):
+                    pages.append(_extract_page(page))
+        return file_path, pages, None
+    except Exception as e:
+        return file_path, [], str(e)
+
+
+def _split_ranges(page_count, pages_per_task):
+    """Split [0, page_count) into consecutive (start, end) ranges"""
+    return [
+        (start, min(start + pages_per_task, page_count))
+        for start in range(0, page_count, pages_per_task)
+    ]
+
+
+def _page_runs(page_numbers, pages_per_task):
+    """Group 1-based page numbers into consecutive (start, end) ranges (0-based, end exclusive)"""
+    ranges = []
+    for number in sorted(set(page_numbers)):
+        if ranges and ranges[-1][1] == number - 1 and ranges[-1][1] - ranges[-1][0] < pages_per_task:
+            ranges[-1] = (ranges[-1][0], number)
+        else:
+            ranges.append((number - 1, number))
+    return ranges
+
+
+def iter_pdf_pages(file_path, workers=None, page_timeout=None, pages_per_task=DEFAULT_PAGES_PER_TASK, pages=None):
+    """
+    Extract text from a PDF page by page, spreading page ranges over a process pool
+
+    Results are yielded in page order as soon as each range is finished. A page
+    that takes longer than `page_timeout` seconds is interrupted and yielded with
+    an error. Small documents (a single range) and `workers=1` are extracted
+    in-process when SIGALRM can interrupt the calling thread, otherwise in a
+    worker process. Workers come from long-lived pools started with
+    POOL_START_METHOD. If a worker does not return a range in time (its alarm
+    could not fire), its pool is replaced and the range's pages are retried
+    one by one, each in a new process, so only the stuck page is lost.
+
+    Args:
+        file_path (str): Path to the PDF file
+        workers (int): Worker processes to use, defaults to the CPU count
+        page_timeout (float): Seconds allowed per page, defaults to DEFAULT_PAGE_TIMEOUT
+        pages_per_task (int): Consecutive pages extracted per worker task
+        pages (list): Only extract these page numbers (1-based), defaults to all pages
+
+    Yields:
+        PageResult: One result per page, in order
+    """
+    workers = workers or os.cpu_count() or 1
+    page_timeout = page_timeout or DEFAULT_PAGE_TIMEOUT
+    if pages is None:
+        with stage('pdf_open'):
+            page_count = count_pdf_pages(file_path)
+        ranges = _split_ranges(page_count, pages_per_task)
+    else:
+        ranges = _page_runs(pages, pages_per_task)
+
+    for page in _iter_page_ranges(file_path, ranges, workers, page_timeout):
+        PDF_PAGES.inc(outcome='error' if page.error else 'ok')
+        yield page
+
+
+def _context():
+    context = multiprocessing.get_context(POOL_START_METHOD)
+    if POOL_START_METHOD == 'forkserver':
+        # Workers are forked from a server that has already imported pdfplumber
+        context.set_forkserver_preload(['autoquiz.utils.pdf', 'pdfplumber'])
+    return context
+
+
+def _checkout_pool(workers):
+    """Take an idle pool of `workers` processes, or start one"""
+    with _pools_lock:
+        idle = _idle_pools.get(workers)
+        if idle:
+            return idle.pop()
+    return _context().Pool(processes=workers)
+
+
+def _release_pool(pool, workers, healthy=True):
+    """Keep a pool for the next extraction, or stop it if it may still be busy or enough are idle"""
+    if healthy:
+        with _pools_lock:
+            idle = _idle_pools.setdefault(workers, [])
+            if len(idle) < MAX_IDLE_POOLS:
+                idle.append(pool)
+                return
+    pool.terminate()
+    pool.join()
+
+
+def shutdown_pools():
+    """Stop the idle extraction pools"""
+    with _pools_lock:
+        pools = [pool for idle in _idle_pools.values() for pool in idle]
+        _idle_pools.clear()
+    for pool in pools:
+        pool.terminate()
+        pool.join()
+
+
+atexit.register(shutdown_pools)
+
+
+def _iter_page_ranges(file_path, ranges, workers, page_timeout):
+    """
+    Yield the PageResults of the given ranges in order, in-process or from a pool
+
+    Pools are long-lived: each extraction checks one out and hands it back,
+    so concurrent extractions don't queue behind each other's pages (which
+    would eat into their timeouts) and process start-up is paid once.
+    """
+    if (workers <= 1 or len(ranges) <= 1) and _alarm_usable():
+        for start, end in ranges:
+            with stage('pdf_page_range'):
+                results = _extract_page_range(file_path, start, end, page_timeout)
+            yield from results
+        return
+
+    workers = max(1, min(workers, len(ranges)))
+    pool = _checkout_pool(workers)
+    healthy = False
+    try:
+        pending = [pool.apply_async(_extract_page_range, (file_path, start, end, page_timeout))
+                   for start, end in ranges]
+        for index, (start, end) in enumerate(ranges):
+            try:
+                # Time spent waiting for each range, i.e. extraction not overlapped by the pool
+                with stage('pdf_page_range'):
+                    results = pending[index].get(timeout=page_timeout * (end - start) + PAGE_TIMEOUT_GRACE)
+            except multiprocessing.TimeoutError:
+                # A worker is stuck where its alarm can't reach it: replace the
+                # pool, hand it the ranges still to do and retry this one page by page
+                _release_pool(pool, workers, healthy=False)
+                pool = _checkout_pool(workers)
+                for later, (later_start, later_end) in enumerate(ranges[index + 1:], index + 1):
+                    pending[later] = pool.apply_async(
+                        _extract_page_range, (file_path, later_start, later_end, page_timeout)
+                    )
+                results = list(_retry_pages(file_path, start, end, page_timeout))
+            yield from results
+        healthy = True
+    finally:
+        # An abandoned generator leaves tasks running, so its pool is stopped
+        _release_pool(pool, workers, healthy)
+
+
+def _retry_pages(file_path, start, end, page_timeout):
+    """Extract the pages of a timed-out range one by one, each in a new worker process"""
+    for index in range(start, end):
+        pool = _context().Pool(processes=1)
+        try:
+            result = pool.apply_async(_extract_page_range, (file_path, index, index + 1, page_timeout))
+            yield from result.get(timeout=page_timeout + PAGE_TIMEOUT_GRACE)
+        except multiprocessing.TimeoutError:
+            yield PageResult(index + 1, "", "Timed out extracting page")
+        finally:
+            pool.terminate()
+            pool.join()
+
+
+def extract_pdf_text(file_path, workers=None, page_timeout=None):
+    """
+    Extract text from a PDF file using pdfplumber
+
+    Args:
+        file_path (str): Path to the PDF file
+        workers (int): Worker processes to use, defaults to the CPU count
+        page_timeout (float): Seconds allowed per page before it is skipped
+
+    Returns:
+        str: Extracted text content
+    """
+    try:
+        return "".join(
+            page.text + "\n\n"
+            for page in iter_pdf_pages(file_path, workers=workers, page_timeout=page_timeout)
+            if page.text
+        )
     except Exception as e:
         raise Exception(f"Error extracting text from PDF: {str(e)}")
-    
-    return text_content
 
 def encode_file_to_base64(file_path):
     """
@@ -0,0 +1,350 @@
+import datetime
+import json
+import random
+import re
+import threading
+import zlib
+from collections import OrderedDict, namedtuple
+from flask import current_app
+from sqlalchemy import func, select
+from sqlalchemy.exc import SQLAlchemyError
+from autoquiz.extensions import db
+from autoquiz.models import BankQuestion
+from autoquiz.utils.lazy import lazy_import
+from autoquiz.utils.metrics import BANK_QUESTIONS
+
+np = lazy_import('numpy')
+
+# Length of the question vectors; more dimensions mean fewer hash collisions
+DEFAULT_DIMENSIONS = 256
+
+# Cosine similarity at or above which two questions are near duplicates.
+# Rephrasings of a question with the same answer score 0.8-0.9; questions
+# that differ in their subject or answer stay below 0.65.
+DEFAULT_SIMILARITY = 0.75
+
+# Share of the similarity that comes from the answer. Questions that differ
+# only in their subject ("boiling point of water" / "of ethanol") are told
+# apart by their answers.
+ANSWER_WEIGHT = 0.4
+
+# Rows of the bank compared with new questions per matrix product
+SIMILARITY_BLOCK_ROWS = 8192
+
+_WORDS = re.compile(r'\w+')
+
+# Words that only shape a question ("Which of the following is ...") and
+# would make unrelated questions look alike
+STOP_WORDS = frozenset((
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'did', 'do', 'does', 'following', 'for', 'from', 'how',
+    'in', 'is', 'it', 'its', 'of', 'on', 'or', 'that', 'the', 'these', 'this', 'to', 'was', 'were', 'what',
+    'when', 'where', 'which', 'who', 'whom', 'why', 'with'
+))
+
+# Ids and L2-normalized float32 vectors (one row each) of a document's bank
+_Index = namedtuple('_Index', ['ids', 'matrix', 'max_id'])
+
+
+def text_features(text):
+    """
+    List the n-grams a text is embedded from
+
+    Word unigrams and bigrams without stop words, and character trigrams of
+    the words, so "mitochondria" and "mitochondrion" still overlap.
+
+    Args:
+        text (str): Question or answer text
+
+    Returns:
+        list: Feature strings, with repeats
+    """
+    words = [word for word in _WORDS.findall(str(text or '').lower()) if word not in STOP_WORDS]
+    features = words + [f'{first} {second}' for first, second in zip(words, words[1:])]
+    for word in words:
+        padded = f'<{word}>'
+        features.extend('#' + padded[i:i + 3] for i in range(len(padded) - 2))
+    return features
+
+
+def hash_vectors(texts, dimensions=DEFAULT_DIMENSIONS):
+    """
+    Embed texts with the hashing trick
+
+    Each feature is hashed with CRC-32, which is the same in every process,
+    to a dimension and a sign; a text's vector is its signed feature counts,
+    scaled to unit length. Texts without features get a zero vector.
+
+    Args:
+        texts (list): Texts to embed
+        dimensions (int): Length of the vectors
+
+    Returns:
+        numpy.ndarray: float32 array of shape (len(texts), dimensions)
+    """
+    rows = []
+    hashes = []
+    for row, text in enumerate(texts):
+        for feature in text_features(text):
+            rows.append(row)
+            hashes.append(zlib.crc32(feature.encode('utf-8')))
+
+    vectors = np.zeros((len(texts), dimensions), dtype=np.float32)
+    if hashes:
+        hashes = np.array(hashes, dtype=np.uint32)
+        signs = np.where(hashes >> 31, -1.0, 1.0).astype(np.float32)
+        np.add.at(vectors, (np.array(rows, dtype=np.intp), hashes % dimensions), signs)
+    vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    return vectors
+
+
+def embed_questions(questions, dimensions=DEFAULT_DIMENSIONS):
+    """
+    Embed questions for near duplicate checks
+
+    The question and the answer are embedded separately and blended with
+    ANSWER_WEIGHT, so the cosine similarity of two questions is roughly
+    that of their questions and answers, weighted. Options are left out:
+    they are shuffled and mostly wrong.
+
+    Args:
+        questions (list): Question dictionaries with 'question' and 'answer'
+        dimensions (int): Length of the vectors
+
+    Returns:
+        numpy.ndarray: Unit float32 vectors, shape (len(questions), dimensions)
+    """
+    vectors = (1 - ANSWER_WEIGHT) ** 0.5 * hash_vectors([q.get('question') for q in questions], dimensions)
+    vectors += ANSWER_WEIGHT ** 0.5 * hash_vectors([q.get('answer') for q in questions], dimensions)
+    vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    return vectors
+
+
+def unique_mask(vectors, matrix, similarity=DEFAULT_SIMILARITY):
+    """
+    Tell which new questions are not near duplicates
+
+    A question is dropped if its cosine similarity with a row of `matrix`,
+    or with an earlier kept question of the batch, reaches `similarity`.
+    The bank is compared in blocks of SIMILARITY_BLOCK_ROWS rows, one matrix
+    product each, so memory stays bounded for large banks.
+
+    Args:
+        vectors (numpy.ndarray): Unit vectors of the new questions
+        matrix (numpy.ndarray): Unit vectors of the bank
+        similarity (float): Near duplicate threshold
+
+    Returns:
+        numpy.ndarray: Boolean array, True for questions to keep
+    """
+    best = np.full(len(vectors), -1.0, dtype=np.float32)
+    for start in range(0, len(matrix), SIMILARITY_BLOCK_ROWS):
+        block = vectors @ matrix[start:start + SIMILARITY_BLOCK_ROWS].T
+        np.maximum(best, block.max(axis=1), out=best)
+    keep = best < similarity
+
+    within = vectors @ vectors.T
+    for i in range(1, len(vectors)):
+        if keep[i] and (within[i, :i][keep[:i]] >= similarity).any():
+            keep[i] = False
+    return keep
+
+
+class QuestionBank:
+    """
+    Near-duplicate-free store of the questions generated for each document
+
+    Questions are kept in the `question_bank` table with a float16 copy of
+    their vector. The vectors of a document are loaded into one float32
+    matrix on first use and kept for the `max_documents` most recently used
+    documents; each use checks the row count and highest id, appends rows
+    added since (by this or another process) and reloads after deletions.
+    Stored vectors of another length, e.g. after changing `dimensions`, are
+    recomputed from their question when loaded.
+    """
+
+    def __init__(self, dimensions=DEFAULT_DIMENSIONS, similarity=DEFAULT_SIMILARITY, max_documents=64):
+        self.dimensions = dimensions
+        self.similarity = similarity
+        self.max_documents = max_documents
+        self._indexes = OrderedDict()
+        self._lock = threading.Lock()
+        self._add_lock = threading.Lock()
+
+    def embed(self, questions):
+        """Embed questions with this bank's dimensions"""
+        return embed_questions(questions, self.dimensions)
+
+    def _load(self, conn, document_id, after=None):
+        """Read the ids and vectors of a document's questions, optionally only those after an id"""
+        table = BankQuestion.__table__
+        query = select(table.c.id, table.c.vector).where(table.c.document_id == document_id)
+        if after is not None:
+            query = query.where(table.c.id > after)
+        rows = conn.execute(query.order_by(table.c.id)).all()
+
+        ids = np.array([row.id for row in rows], dtype=np.int64)
+        width = self.dimensions * 2  # float16
+        blobs = [row.vector for row in rows]
+        stale = [i for i, blob in enumerate(blobs) if len(blob) != width]
+        if stale:
+            stale_ids = [rows[i].id for i in stale]
+            questions = {
+                row.id: {'question': row.question, 'answer': row.answer}
+                for row in conn.execute(
+                    select(table.c.id, table.c.question, table.c.answer).where(table.c.id.in_(stale_ids))
+                )
+            }
+            vectors = self.embed([questions[question_id] for question_id in stale_ids]).astype(np.float16)
+            for i, vector in zip(stale, vectors):
+                blobs[i] = vector.tobytes()
+
+        matrix = np.frombuffer(b''.join(blobs), dtype=np.float16).reshape(len(rows), self.dimensions)
+        return ids, matrix.astype(np.float32)
+
+    def _index(self, document_id, conn=None):
+        """Return the up to date index of a document, loading what changed since it was cached"""
+        if conn is None:
+            with db.engine.connect() as conn:
+                return self._index(document_id, conn)
+
+        table = BankQuestion.__table__
+        count, max_id = conn.execute(
+            select(func.count(table.c.id), func.max(table.c.id)).where(table.c.document_id == document_id)
+        ).one()
+
+        with self._lock:
+            index = self._indexes.get(document_id)
+        if index is not None and len(index.ids) == count and index.max_id == max_id:
+            with self._lock:
+                if document_id in self._indexes:
+                    self._indexes.move_to_end(document_id)
+            return index
+
+        if index is not None and count > len(index.ids) and index.max_id is not None:
+            ids, matrix = self._load(conn, document_id, after=index.max_id)
+            if len(index.ids) + len(ids) == count:
+                index = _Index(np.concatenate([index.ids, ids]), np.concatenate([index.matrix, matrix]), max_id)
+            else:
+                index = None
+        else:
+            index = None
+        if index is None:
+            ids, matrix = self._load(conn, document_id)
+            index = _Index(ids, matrix, int(ids[-1]) if len(ids) else None)
+
+        with self._lock:
+            self._indexes[document_id] = index
+            self._indexes.move_to_end(document_id)
+            while len(self._indexes) > self.max_documents:
+                self._indexes.popitem(last=False)
+        return index
+
+    def add(self, document_id, questions, topic='', source_hash=None):
+        """
+        Add the questions that are not near duplicates of the document's bank
+
+        The bank is read and written in a transaction of its own, so the
+        caller's session is neither flushed nor rolled back.
+
+        Args:
+            document_id (int): Document the questions were generated from
+            questions (list): Question dictionaries
+            topic (str): Normalized topic of the generation, empty for the whole document
+            source_hash (str): SHA-256 of the text the questions were generated from
+
+        Returns:
+            int: Number of questions added
+        """
+        questions = [question for question in questions if question.get('question')]
+        if not questions:
+            return 0
+        vectors = self.embed(questions)
+
+        # One adder per process at a time, so concurrent generations for a
+        # document can't both add the same question
+        with self._add_lock:
+            try:
+                with db.engine.begin() as conn:
+                    keep = unique_mask(vectors, self._index(document_id, conn).matrix, self.similarity)
+                    rows = [
+                        {
+                            'document_id': document_id,
+                            'question': question['question'],
+                            'options': json.dumps(question.get('options') or []),
+                            'answer': question.get('answer') or '',
+                            'topic': topic or '',
+                            'source_hash': source_hash,
+                            'vector': vector.astype(np.float16).tobytes(),
+                            'created_at': datetime.datetime.utcnow()
+                        }
+                        for question, vector, kept in zip(questions, vectors, keep) if kept
+                    ]
+                    if rows:
+                        conn.execute(BankQuestion.__table__.insert(), rows)
+            except SQLAlchemyError:
+                # The bank is best effort; a locked database keeps nothing
+                return 0
+
+        BANK_QUESTIONS.inc(len(rows), outcome='added')
+        BANK_QUESTIONS.inc(len(questions) - len(rows), outcome='duplicate')
+        return len(rows)
+
+    def count(self, document_id, topic=''):
+        """Number of questions of a document, only those of `topic` if given"""
+        table = BankQuestion.__table__
+        query = select(func.count(table.c.id)).where(table.c.document_id == document_id)
+        if topic:
+            query = query.where(table.c.topic == topic)
+        with db.engine.connect() as conn:
+            return conn.execute(query).scalar()
+
+    def sample(self, document_id, num_questions, topic=''):
+        """
+        Pick random questions of a document
+
+        Args:
+            document_id (int): Document ID
+            num_questions (int): Number of questions
+            topic (str): Only pick questions generated for this topic
+
+        Returns:
+            list: Up to num_questions question dictionaries
+        """
+        table = BankQuestion.__table__
+        query = select(table.c.id).where(table.c.document_id == document_id)
+        if topic:
+            query = query.where(table.c.topic == topic)
+        with db.engine.connect() as conn:
+            ids = conn.execute(query).scalars().all()
+            chosen = random.sample(ids, min(num_questions, len(ids)))
+            if not chosen:
+                return []
+            rows = {
+                row.id: row
+                for row in conn.execute(
+                    select(table.c.id, table.c.question, table.c.options, table.c.answer).where(table.c.id.in_(chosen))
+                )
+            }
+        return [
+            {'question': rows[question_id].question, 'options': json.loads(rows[question_id].options),
+             'answer': rows[question_id].answer}
+            for question_id in chosen
+        ]
+
+
+def init_app(app):
+    """Create the question bank and attach it to the app, unless QUESTION_BANK_ENABLED is off"""
+    bank = None
+    if app.config.get('QUESTION_BANK_ENABLED', True):
+        bank = QuestionBank(
+            dimensions=app.config.get('QUESTION_BANK_DIMENSIONS', DEFAULT_DIMENSIONS),
+            similarity=app.config.get('QUESTION_BANK_SIMILARITY', DEFAULT_SIMILARITY),
+            max_documents=app.config.get('QUESTION_BANK_CACHE_DOCUMENTS', 64)
+        )
+    app.extensions['question_bank'] = bank
+    return bank
+
+
+def get_question_bank():
+    """Return the question bank of the current app, or None when it is disabled"""
+    return current_app.extensions.get('question_bank')
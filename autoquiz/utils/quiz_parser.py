@@ -0,0 +1,354 @@
+import json
+import re
+
+# Questions need this many options, and never have more
+MIN_OPTIONS = 2
+MAX_OPTIONS = 6
+
+# Every line of quiz text is classified by one pattern; the named group that
+# matched last tells which kind of line it is:
+#   question: "2. What ...", "2) ...", "Q2: ...", "Question 2 - ...", "Question: ..."
+#   answer:   "Answer: b)", "Correct answer - B", "(Answer: b) Paris)", "The answer is c"
+#   option:   "a) ...", "A. ...", "(a) ...", "- b: ...", "[c] ..."
+#   text:     anything else, e.g. a wrapped question or option
+# Blank lines don't match.
+QUIZ_LINE = re.compile(r"""
+    ^[ \t]*(?:
+        (?:\#+[ \t]*)?(?:(?:q(?:uestion)?[ \t]*)?\d{1,3}[ \t]*[.):-]|q(?:uestion)?[ \t]*[.:-])[ \t]*(?P<question>.*)
+      | (?:[-*•][ \t]*)?\(?(?:the[ \t]+)?(?:correct[ \t]+)?answer\b[ \t]*(?:is\b)?[ \t]*[:=-]?[ \t]*(?P<answer>.*)
+      | (?:[-*•][ \t]*)?[(\[]?(?P<letter>[a-f])(?:[)\]][ \t]*|[.:][ \t]+)(?P<option>\S.*)
+      | (?P<text>\S.*)
+    )$""", re.IGNORECASE | re.MULTILINE | re.VERBOSE)
+# The option letter an answer starts with: "b", "b)", "(b)", "B. Paris"
+ANSWER_LETTER = re.compile(r'^[(\[]?([a-f])(?:[)\].:]|\s|$)', re.IGNORECASE)
+# Markdown emphasis models like to wrap questions and answers in
+MARKUP = re.compile(r'\*\*|__|`')
+
+# Characters that matter while scanning streamed JSON, outside and inside strings
+_JSON_STRUCTURE = re.compile(r'[\[\]{}"]')
+_JSON_STRING = re.compile(r'["\\]')
+
+
+def _clean(text):
+    return text.strip().rstrip(')').strip()
+
+
+def _resolve_answer(value, letters, options):
+    """
+    Find the option an answer refers to, by its text or its letter
+
+    Args:
+        value (str): Text after "Answer:", e.g. "b)", "B. Paris" or "Paris"
+        letters (list): Letter of each option, lowercase
+        options (list): Option texts
+
+    Returns:
+        str: The option text, or None if the answer matches no option
+    """
+    value = value.strip()
+    by_letter = None
+    letter = ANSWER_LETTER.match(value)
+    if letter and letter.group(1).lower() in letters:
+        by_letter = options[letters.index(letter.group(1).lower())]
+        rest = _clean(value[letter.end():]).rstrip('.').lower()
+        # "b", "b)" or "b) <text of b>"
+        if not rest or rest == by_letter.rstrip('.').lower():
+            return by_letter
+
+    wanted = _clean(value).rstrip('.').lower()
+    for option in options:
+        if option.rstrip('.').lower() == wanted:
+            return option
+    return by_letter
+
+
+def _make_question(text, letters, options, answer):
+    """Build a question dictionary, or None unless it is usable as is"""
+    if not text or not MIN_OPTIONS <= len(options) <= MAX_OPTIONS:
+        return None
+    answer = _resolve_answer(answer, letters, options)
+    if answer is None:
+        return None
+    return {
+        "question": text,
+        "options": options,
+        "answer": answer
+    }
+
+
+class QuizParser:
+    """
+    Single-pass parser for quiz text, fed one line at a time
+
+    Tolerates the variations models produce around the prompted layout:
+    other numbering ("1)", "Q1:"), option markers ("A.", "(a)"), markdown
+    emphasis, blank lines, questions and options wrapped over several
+    lines, two to six options and answers given by letter or by text.
+    A question is complete when its answer line has been read.
+    """
+
+    def __init__(self):
+        self._reset()
+
+    def _reset(self):
+        self._question = []
+        self._numbered = False
+        self._letters = []
+        self._options = []
+
+    def feed_line(self, line):
+        """
+        Add a line of quiz text
+
+        Returns:
+            dict: The question completed by this line, or None
+        """
+        match = QUIZ_LINE.match(MARKUP.sub('', line))
+        return self.feed_match(match) if match else None
+
+    def feed_match(self, match):
+        """Add a line classified by QUIZ_LINE"""
+        kind = match.lastgroup
+        if kind == 'question':
+            self._reset()
+            self._numbered = True
+            self._question.append(match.group(kind).strip())
+            return None
+
+        if kind == 'answer' and self._options:
+            question = _make_question(' '.join(self._question).strip(), self._letters, self._options, match.group(kind))
+            self._reset()
+            return question
+
+        if kind == 'option' and (self._question or self._options):
+            self._letters.append(match.group('letter').lower())
+            self._options.append(match.group(kind).strip())
+            return None
+
+        line = match.group().strip()
+        if self._options:
+            # An option wrapped onto the next line
+            self._options[-1] = f'{self._options[-1]} {line}'
+        elif self._numbered:
+            self._question.append(line)
+        else:
+            # Unnumbered question: the last line before the options, so
+            # introductions like "Here is your quiz:" are not included
+            self._question = [line]
+        return None
+
+
+def parse_quiz_to_json(quiz_text):
+    """
+    Parses the OpenAI-generated quiz text into structured JSON:
+    [
+      {
+        "question": "...",
+        "options": [...],
+        "answer": "..."
+      },
+      ...
+    ]
+    Questions without a usable answer are skipped.
+    """
+    parser = QuizParser()
+    structured = []
+    # One scan over the whole text; blank lines are skipped by the pattern
+    for match in QUIZ_LINE.finditer(MARKUP.sub('', quiz_text)):
+        question = parser.feed_match(match)
+        if question:
+            structured.append(question)
+    return structured
+
+
+class IncrementalQuizParser:
+    """
+    Parses quiz text that arrives in pieces, e.g. from a streamed completion
+
+    Text is fed as it comes in; a question is returned as soon as its
+    `Answer:` line is complete, so it can be shown before the rest of the
+    quiz has been generated. It produces the same questions as
+    parse_quiz_to_json on the full text.
+    """
+
+    def __init__(self):
+        self._partial_line = ''
+        self._parser = QuizParser()
+
+    def feed(self, text):
+        """
+        Add a piece of text
+
+        Returns:
+            list: Questions completed by this piece
+        """
+        lines = (self._partial_line + text).split('\n')
+        self._partial_line = lines.pop()  # last piece may be an unfinished line
+        completed = []
+        for line in lines:
+            question = self._parser.feed_line(line)
+            if question:
+                completed.append(question)
+        return completed
+
+    def finish(self):
+        """
+        Flush the remaining text once the stream has ended
+
+        Returns:
+            list: Questions completed by the remaining text
+        """
+        completed = []
+        if self._partial_line:
+            question = self._parser.feed_line(self._partial_line)
+            self._partial_line = ''
+            if question:
+                completed.append(question)
+        return completed
+
+
+def question_from_json(item):
+    """
+    Validate one question of a JSON-mode completion
+
+    Options may be a list or a {"a": ..., "b": ...} object; the answer an
+    option letter, a 0-based index or the option text.
+
+    Returns:
+        dict: {"question", "options", "answer"}, or None if it is unusable
+    """
+    if not isinstance(item, dict):
+        return None
+    text = item.get('question')
+    options = item.get('options')
+    answer = item.get('answer')
+    if isinstance(options, dict):
+        letters = [str(letter).strip().lower()[:1] for letter in options]
+        options = list(options.values())
+    else:
+        letters = list('abcdef')
+    if not isinstance(text, str) or not isinstance(options, list):
+        return None
+    if not all(isinstance(option, str) and option.strip() for option in options):
+        return None
+    options = [option.strip() for option in options]
+    if isinstance(answer, int) and not isinstance(answer, bool):
+        answer = options[answer] if 0 <= answer < len(options) else ''
+    if not isinstance(answer, str):
+        return None
+    return _make_question(text.strip(), letters[:len(options)], options, answer)
+
+
+def _json_questions(data):
+    if isinstance(data, dict):
+        data = data.get('questions', data.get('quiz'))
+    if not isinstance(data, list):
+        return []
+    return [question for question in map(question_from_json, data) if question]
+
+
+def parse_quiz_json(quiz_text):
+    """
+    Parse a completion requested in JSON mode:
+    {"questions": [{"question": "...", "options": [...], "answer": "b"}, ...]}
+
+    Text that is not JSON (the model ignored the requested format) is
+    parsed with parse_quiz_to_json instead.
+    """
+    try:
+        data = json.loads(quiz_text)
+    except ValueError:
+        return parse_quiz_to_json(quiz_text)
+    return _json_questions(data)
+
+
+class IncrementalJSONQuizParser:
+    """
+    Parses a streamed JSON-mode completion
+
+    Scans the text for objects nested in the questions array and returns
+    each question as soon as its closing brace arrives, like
+    IncrementalQuizParser does for text.
+    """
+
+    def __init__(self):
+        self._buffer = ''
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._starts = []  # (depth, position) of the open objects
+        self._found = 0
+
+    def feed(self, text):
+        """
+        Add a piece of text
+
+        Returns:
+            list: Questions completed by this piece
+        """
+        self._buffer += text
+        buffer = self._buffer
+        completed = []
+        while True:
+            if self._in_string:
+                match = _JSON_STRING.search(buffer, self._pos)
+                if not match:
+                    self._pos = len(buffer)
+                    break
+                if match.group() == '\\':
+                    if match.end() >= len(buffer):
+                        self._pos = match.start()  # the escaped character is in the next piece
+                        break
+                    self._pos = match.end() + 1
+                    continue
+                self._in_string = False
+                self._pos = match.end()
+                continue
+
+            match = _JSON_STRUCTURE.search(buffer, self._pos)
+            if not match:
+                self._pos = len(buffer)
+                break
+            char = match.group()
+            self._pos = match.end()
+            if char == '"':
+                self._in_string = True
+            elif char in '[{':
+                self._depth += 1
+                if char == '{':
+                    self._starts.append((self._depth, match.start()))
+            else:
+                if char == '}' and self._starts:
+                    depth, start = self._starts.pop()
+                    if depth > 1:
+                        question = self._parse_object(buffer[start:match.end()])
+                        if question:
+                            completed.append(question)
+                self._depth -= 1
+        self._found += len(completed)
+        return completed
+
+    def _parse_object(self, text):
+        try:
+            item = json.loads(text)
+        except ValueError:
+            return None
+        if not isinstance(item, dict) or 'question' not in item:
+            return None
+        return question_from_json(item)
+
+    def finish(self):
+        """
+        Flush the remaining text once the stream has ended
+
+        Returns:
+            list: Questions found only now, when the completion was plain
+            text instead of JSON
+        """
+        if self._found:
+            return []
+        try:
+            json.loads(self._buffer)
+            return []
+        except ValueError:
+            return parse_quiz_to_json(self._buffer)
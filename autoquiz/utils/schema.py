@@ -0,0 +1,104 @@
+import zlib
+from sqlalchemy import inspect, text
+from sqlalchemy.schema import CreateColumn, CreateIndex
+from autoquiz.extensions import db
+
+# SQL run once, right after a column is added to an existing table
+BACKFILLS = {
+    ('documents', 'content_length'): 'UPDATE documents SET content_length = coalesce(length(content), 0)',
+}
+
+# Bump when the schema changes in a way the models don't show (e.g. the
+# document_chunks tables), so existing databases are set up again
+SCHEMA_REVISION = 2
+
+
+def upgrade_schema():
+    """
+    Bring an existing database up to date with the models
+
+    `db.create_all()` only creates missing tables. This adds columns and
+    indexes that were introduced after a table was first created, so older
+    SQLite files keep working without a separate migration tool. New
+    columns must be nullable or have a server default.
+
+    Returns:
+        list: Names of the columns that were added
+    """
+    engine = db.engine
+    inspector = inspect(engine)
+    added = []
+
+    with engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            if not inspector.has_table(table.name):
+                continue
+
+            existing = {column['name'] for column in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing:
+                    continue
+                definition = CreateColumn(column).compile(dialect=engine.dialect)
+                conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {definition}'))
+                backfill = BACKFILLS.get((table.name, column.name))
+                if backfill:
+                    conn.execute(text(backfill))
+                added.append(f'{table.name}.{column.name}')
+
+            indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in indexes:
+                    conn.execute(CreateIndex(index))
+
+    return added
+
+
+def schema_version():
+    """
+    Fingerprint of the models' tables, columns and indexes
+
+    Returns:
+        int: Non-negative 31-bit number, so it fits SQLite's user_version
+    """
+    dialect = db.engine.dialect
+    parts = [str(SCHEMA_REVISION)]
+    for table in db.metadata.sorted_tables:
+        parts.append(table.name)
+        parts.extend(f'{column.name} {column.type.compile(dialect=dialect)}' for column in table.columns)
+        parts.extend(sorted(index.name for index in table.indexes))
+    return zlib.crc32('\n'.join(parts).encode('utf-8')) & 0x7fffffff
+
+
+def ensure_schema(*setup):
+    """
+    Create and upgrade the database schema unless it is already current
+
+    Running `db.create_all()` and `upgrade_schema()` means reflecting every
+    table on each start. On SQLite the schema_version() of the last setup is
+    kept in `PRAGMA user_version`, so a process starting against an
+    up-to-date database only reads that number. Other databases are always
+    checked.
+
+    Args:
+        *setup: Extra callables run with the schema setup (e.g. creating
+            the full-text index)
+
+    Returns:
+        bool: True if the schema was set up, False if it was already current
+    """
+    sqlite = db.engine.dialect.name == 'sqlite'
+    version = schema_version()
+    if sqlite:
+        with db.engine.connect() as conn:
+            if conn.execute(text('PRAGMA user_version')).scalar() == version:
+                return False
+
+    db.create_all()
+    upgrade_schema()
+    for step in setup:
+        step()
+
+    if sqlite:
+        with db.engine.begin() as conn:
+            conn.execute(text(f'PRAGMA user_version = {version}'))
+    return True
@@ -0,0 +1,225 @@
+import logging
+import re
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from autoquiz.extensions import db
+from autoquiz.utils.tokens import split_into_chunks
+
+logger = logging.getLogger(__name__)
+
+# Target size of an indexed chunk; a few paragraphs of a page
+CHUNK_TOKENS = 300
+
+_TERMS = re.compile(r'\w+')
+
+
+# Whether full-text search works, per database URL: set by create_index, or
+# looked up once on first use by processes that skipped the schema setup
+_available = {}
+
+# Chunks live in a regular table, indexed on document_id, so per-document
+# lookups, deletes and renumbering don't scan the corpus. The FTS5 table
+# indexes their text (and document_id, so a search is restricted to one
+# document inside the MATCH) without storing a second copy; triggers keep
+# it in sync.
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS document_chunks ('
+    'id INTEGER PRIMARY KEY, document_id INTEGER NOT NULL, page_number INTEGER, text TEXT NOT NULL)',
+    'CREATE INDEX IF NOT EXISTS ix_document_chunks_document ON document_chunks (document_id, page_number)',
+    "CREATE VIRTUAL TABLE IF NOT EXISTS document_chunks_fts USING fts5("
+    "text, document_id, content = 'document_chunks', content_rowid = 'id', tokenize = 'porter unicode61')",
+    'CREATE TRIGGER IF NOT EXISTS document_chunks_ai AFTER INSERT ON document_chunks BEGIN '
+    'INSERT INTO document_chunks_fts (rowid, text, document_id) VALUES (new.id, new.text, new.document_id); END',
+    'CREATE TRIGGER IF NOT EXISTS document_chunks_ad AFTER DELETE ON document_chunks BEGIN '
+    "INSERT INTO document_chunks_fts (document_chunks_fts, rowid, text, document_id) "
+    "VALUES ('delete', old.id, old.text, old.document_id); END",
+    'CREATE TRIGGER IF NOT EXISTS document_chunks_au AFTER UPDATE OF text, document_id ON document_chunks BEGIN '
+    "INSERT INTO document_chunks_fts (document_chunks_fts, rowid, text, document_id) "
+    "VALUES ('delete', old.id, old.text, old.document_id); "
+    'INSERT INTO document_chunks_fts (rowid, text, document_id) VALUES (new.id, new.text, new.document_id); END',
+)
+
+
+def create_index():
+    """
+    Create the document_chunks table and its FTS5 index if they do not exist
+
+    Databases from before the chunks had their own table keep them in an
+    FTS5 table named document_chunks; its rows are moved to the new tables.
+
+    Returns:
+        bool: True if full-text search is available on this database
+    """
+    if db.engine.dialect.name != 'sqlite':
+        return False
+    try:
+        with db.engine.begin() as conn:
+            legacy = conn.execute(text(
+                "SELECT 1 FROM sqlite_master WHERE name = 'document_chunks' AND sql LIKE 'CREATE VIRTUAL TABLE%'"
+            )).first() is not None
+            if legacy:
+                conn.execute(text('ALTER TABLE document_chunks RENAME TO document_chunks_legacy'))
+            for statement in SCHEMA:
+                conn.execute(text(statement))
+            if legacy:
+                conn.execute(text(
+                    'INSERT INTO document_chunks (document_id, page_number, text) '
+                    'SELECT document_id, page_number, text FROM document_chunks_legacy ORDER BY rowid'
+                ))
+                conn.execute(text('DROP TABLE document_chunks_legacy'))
+        available = True
+    except OperationalError:
+        logger.warning('SQLite was built without FTS5, topic search is disabled')
+        available = False
+    _available[str(db.engine.url)] = available
+    return available
+
+
+def is_available():
+    """Return True if the document_chunks tables exist"""
+    if db.engine.dialect.name != 'sqlite':
+        return False
+    key = str(db.engine.url)
+    if key not in _available:
+        _available[key] = db.session.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'document_chunks_fts'"
+        )).first() is not None
+    return _available[key]
+
+
+def index_document(document_id, pages):
+    """
+    Replace the indexed chunks of a document
+
+    Args:
+        document_id (int): Document ID
+        pages (list): (page_number, text) tuples; page_number may be None
+    """
+    if not is_available():
+        return
+    rows = _chunk_rows(document_id, pages)
+    delete_document(document_id)
+    _insert_chunks(rows)
+    db.session.commit()
+
+
+def add_documents(documents):
+    """
+    Index the chunks of several new documents in one insert, without committing
+
+    Args:
+        documents (list): (document_id, pages) tuples, pages as for index_document
+    """
+    if is_available():
+        _insert_chunks([row for document_id, pages in documents for row in _chunk_rows(document_id, pages)])
+
+
+def _chunk_rows(document_id, pages):
+    return [
+        {'text': chunk, 'document_id': document_id, 'page_number': page_number}
+        for page_number, page_text in pages
+        for chunk in split_into_chunks(page_text, CHUNK_TOKENS)
+    ]
+
+
+def _insert_chunks(rows):
+    if rows:
+        db.session.execute(
+            text('INSERT INTO document_chunks (text, document_id, page_number) '
+                 'VALUES (:text, :document_id, :page_number)'),
+            rows
+        )
+
+
+def update_pages(document_id, removed=(), moved=None, added=()):
+    """
+    Update the indexed chunks of some pages of a document, leaving the others
+
+    Used when a revised file replaces a document: chunks of unchanged pages
+    are kept, those of pages that only moved are renumbered.
+
+    Args:
+        document_id (int): Document ID
+        removed (list): Page numbers whose chunks are dropped
+        moved (dict): Old page number -> new page number
+        added (list): (page_number, text) tuples of pages indexed anew
+
+    Returns:
+        int: Number of chunks inserted
+    """
+    if not is_available():
+        return 0
+    params = {'id': document_id}
+    for page_number in removed:
+        db.session.execute(
+            text('DELETE FROM document_chunks WHERE document_id = :id AND page_number = :page'),
+            dict(params, page=page_number)
+        )
+    if moved:
+        # Renumber through negative numbers so pages can swap places
+        for old, new in moved.items():
+            db.session.execute(
+                text('UPDATE document_chunks SET page_number = :new WHERE document_id = :id AND page_number = :old'),
+                dict(params, old=old, new=-new)
+            )
+        db.session.execute(
+            text('UPDATE document_chunks SET page_number = -page_number WHERE document_id = :id AND page_number < 0'),
+            params
+        )
+    rows = _chunk_rows(document_id, added)
+    _insert_chunks(rows)
+    db.session.commit()
+    return len(rows)
+
+
+def delete_document(document_id):
+    """Remove the indexed chunks of a document, without committing"""
+    if is_available():
+        db.session.execute(text('DELETE FROM document_chunks WHERE document_id = :id'), {'id': document_id})
+
+
+def has_chunks(document_id):
+    """Return True if a document has been indexed"""
+    return is_available() and db.session.execute(
+        text('SELECT 1 FROM document_chunks WHERE document_id = :id LIMIT 1'), {'id': document_id}
+    ).first() is not None
+
+
+def build_match_query(topic):
+    """
+    Turn free text into an FTS5 query matching any of its words
+
+    Each word is quoted so FTS5 operators in user input are taken literally.
+    """
+    terms = _TERMS.findall(topic or '')
+    return ' OR '.join(f'"{term}"' for term in terms)
+
+
+def search_chunks(document_id, topic, limit=8):
+    """
+    Find the chunks of a document that best match a topic
+
+    Chunks are ranked with BM25 and the best `limit` are returned in
+    document order (page, then position on the page), so the selected passages read naturally in a prompt.
+
+    Args:
+        document_id (int): Document ID
+        topic (str): Free text topic, e.g. "chapter 3: thermodynamics"
+        limit (int): Maximum number of chunks
+
+    Returns:
+        list: (page_number, text) tuples
+    """
+    match = build_match_query(topic)
+    if not match or not is_available():
+        return []
+    rows = db.session.execute(
+        text('SELECT c.id, c.page_number, c.text FROM document_chunks_fts '
+             'JOIN document_chunks AS c ON c.id = document_chunks_fts.rowid '
+             'WHERE document_chunks_fts MATCH :match '
+             'ORDER BY bm25(document_chunks_fts, 1.0, 0.0) LIMIT :limit'),
+        {'match': f'document_id : "{int(document_id)}" AND text : ({match})', 'limit': limit}
+    ).fetchall()
+    # Chunks of pages re-indexed after a revision have newer ids than their neighbours
+    rows = sorted(rows, key=lambda row: (row.page_number or 0, row.id))
+    return [(row.page_number, row.text) for row in rows]
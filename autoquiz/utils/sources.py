@@ -0,0 +1,96 @@
+from flask import current_app
+from sqlalchemy import or_
+from autoquiz.extensions import db
+from autoquiz.models import BankQuestion
+from autoquiz.utils.compaction import compact_text
+from autoquiz.utils.hashing import sha256_bytes
+from autoquiz.utils.metrics import stage
+from autoquiz.utils.tokens import count_tokens
+from autoquiz.utils import search
+
+
+def compacted_content(document):
+    """
+    Return the compacted text of a document (see autoquiz.utils.compaction)
+
+    It is computed once at ingest together with its token count; documents
+    ingested before compaction existed get both on first use.
+    """
+    if document.compact_content is None:
+        with stage('compaction'):
+            document.compact_content = compact_text(document.content or '')
+            document.content_tokens = count_tokens(document.compact_content)
+        db.session.commit()
+    return document.compact_content
+
+
+def document_text(document, topic=None):
+    """
+    Return the text a document's quiz is generated from
+
+    Without a topic this is the compacted text of the whole document. With
+    a topic it is the QUIZ_TOPIC_CHUNKS chunks that best match it in the
+    full-text index (BM25), in document order, so the prompt size depends
+    on the topic and not on the document. Documents ingested before the
+    index existed are indexed on first use. Without FTS5 the whole text is
+    used.
+
+    Returns:
+        tuple: (text, token count), the count is None when it is not known
+
+    Raises:
+        LookupError: If no part of the document matches the topic
+    """
+    if not topic or not search.is_available():
+        return compacted_content(document), document.content_tokens
+    if not search.has_chunks(document.id):
+        search.index_document(document.id, [(None, compacted_content(document))])
+    with stage('topic_search'):
+        chunks = search.search_chunks(document.id, topic, current_app.config.get('QUIZ_TOPIC_CHUNKS', 8))
+    if not chunks:
+        raise LookupError(f'No content in document with ID {document.id} matches the topic "{topic}"')
+    return '\n\n'.join(chunk for _, chunk in chunks), None
+
+
+def invalidate_document_quizzes(document):
+    """
+    Delete the stored quizzes and bank questions of a document whose source text has changed
+
+    Called after a revised file replaced the document. The text of each
+    stored quiz's topic is looked up again and quizzes generated from other
+    text are deleted, so a change on one page keeps the quizzes of topics
+    found elsewhere. Quizzes stored before their source was recorded are
+    always deleted. Questions in the document's question bank are checked
+    the same way.
+
+    Args:
+        document (Document): A ready document
+
+    Returns:
+        int: Number of quizzes deleted
+    """
+    sources = {}
+
+    def source_hash(topic):
+        if topic not in sources:
+            try:
+                text, _ = document_text(document, topic)
+                sources[topic] = sha256_bytes(text.encode('utf-8'))
+            except LookupError:
+                sources[topic] = None
+        return sources[topic]
+
+    deleted = 0
+    for stored_quiz in document.quizzes:
+        if stored_quiz.source_hash is None or stored_quiz.source_hash != source_hash(stored_quiz.topic):
+            db.session.delete(stored_quiz)
+            deleted += 1
+
+    bank_topics = db.session.query(BankQuestion.topic).filter(BankQuestion.document_id == document.id).distinct()
+    for (topic,) in bank_topics.all():
+        stale = document.bank_questions.filter(BankQuestion.topic == topic)
+        if source_hash(topic) is not None:
+            stale = stale.filter(or_(BankQuestion.source_hash.is_(None), BankQuestion.source_hash != source_hash(topic)))
+        stale.delete(synchronize_session=False)
+    db.session.commit()
+    return deleted
@@ -0,0 +1,46 @@
+from sqlalchemy import event
+from sqlalchemy.pool import QueuePool
+from autoquiz.extensions import db
+
+
+def apply_pragmas(dbapi_connection, pragmas):
+    """
+    Run PRAGMA statements on a raw SQLite connection
+
+    Args:
+        dbapi_connection: sqlite3 connection
+        pragmas (dict): PRAGMA name -> value, run in order
+    """
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+    finally:
+        cursor.close()
+
+
+def init_app(app):
+    """
+    Tune the app's SQLite engine
+
+    SQLITE_PRAGMAS are run on every new connection. When a pool size is
+    configured, connections are kept in a QueuePool (SQLAlchemy opens a new
+    connection per checkout for SQLite files otherwise) and may be used by
+    any thread, so check_same_thread is turned off. Other databases are
+    left untouched.
+    Must be called after `db.init_app(app)`.
+    """
+    if not app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'):
+        return
+
+    # Copy so the options of the config class are not changed
+    options = dict(app.config.get('SQLALCHEMY_ENGINE_OPTIONS') or {})
+    if options.get('pool_size'):
+        options.setdefault('poolclass', QueuePool)
+        options['connect_args'] = {'check_same_thread': False, **options.get('connect_args', {})}
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = options
+
+    pragmas = app.config.get('SQLITE_PRAGMAS')
+    if pragmas:
+        engine = db.get_engine(app)
+        event.listen(engine, 'connect', lambda dbapi_connection, record: apply_pragmas(dbapi_connection, pragmas))
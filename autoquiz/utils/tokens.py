@@ -0,0 +1,97 @@
+import re
+
+try:
+    import tiktoken
+except ImportError:  # pragma: no cover - optional dependency
+    tiktoken = None
+
+# Word pieces used by the fallback estimate: runs of letters/digits or single symbols
+_PIECES = re.compile(r'\w+|[^\w\s]')
+_PARAGRAPHS = re.compile(r'\n\s*\n')
+_SENTENCES = re.compile(r'(?<=[.!?])\s+')
+
+_encodings = {}
+
+
+def _encoding_for(model):
+    if model not in _encodings:
+        try:
+            _encodings[model] = tiktoken.encoding_for_model(model)
+        except KeyError:
+            _encodings[model] = tiktoken.get_encoding('cl100k_base')
+    return _encodings[model]
+
+
+def count_tokens(text, model='gpt-3.5-turbo'):
+    """
+    Count the tokens of a text for a model
+
+    Uses tiktoken when it is installed. Otherwise the count is estimated
+    locally: long words are split into several tokens by the real
+    tokenizers, so each word piece counts as one token per 4 characters.
+
+    Args:
+        text (str): Text to measure
+        model (str): Model whose tokenizer is used
+
+    Returns:
+        int: Number of tokens
+    """
+    if not text:
+        return 0
+    if tiktoken is not None:
+        return len(_encoding_for(model).encode(text))
+    return sum(len(piece) // 4 + 1 for piece in _PIECES.findall(text))
+
+
+def _split_oversized(paragraph, max_tokens, model):
+    """Split a paragraph that is over budget into sentences, then words"""
+    pieces = _SENTENCES.split(paragraph)
+    if len(pieces) == 1:
+        pieces = paragraph.split()
+    parts, current, current_tokens = [], [], 0
+    for piece in pieces:
+        tokens = count_tokens(piece, model)
+        if current and current_tokens + tokens > max_tokens:
+            parts.append(' '.join(current))
+            current, current_tokens = [], 0
+        current.append(piece)
+        current_tokens += tokens
+    if current:
+        parts.append(' '.join(current))
+    return parts
+
+
+def split_into_chunks(text, max_tokens, model='gpt-3.5-turbo'):
+    """
+    Split text into chunks of at most `max_tokens` tokens
+
+    Paragraphs are kept together where possible; a paragraph larger than
+    the budget is split on sentence boundaries, and on words as a last resort.
+
+    Args:
+        text (str): Text to split
+        max_tokens (int): Token budget of a chunk
+        model (str): Model whose tokenizer is used
+
+    Returns:
+        list: Chunks of text, in document order
+    """
+    chunks, current, current_tokens = [], [], 0
+    for paragraph in _PARAGRAPHS.split(text or ''):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        tokens = count_tokens(paragraph, model)
+        parts = [(paragraph, tokens)]
+        if tokens > max_tokens:
+            parts = [(part, count_tokens(part, model)) for part in _split_oversized(paragraph, max_tokens, model)]
+        for part, part_tokens in parts:
+            if current and current_tokens + part_tokens > max_tokens:
+                chunks.append('\n\n'.join(current))
+                current, current_tokens = [], 0
+            current.append(part)
+            current_tokens += part_tokens
+    if current:
+        chunks.append('\n\n'.join(current))
+    return chunks
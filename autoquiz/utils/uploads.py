@@ -0,0 +1,137 @@
+import hashlib
+import io
+import os
+import tempfile
+from flask import Request, current_app
+
+# Defaults for UPLOAD_MAX_BYTES and UPLOAD_SPOOL_MEMORY
+DEFAULT_MAX_BYTES = 50 * 1024 * 1024
+DEFAULT_SPOOL_MEMORY = 4 * 1024 * 1024
+
+
+class HashingSpool:
+    """
+    Buffer for an uploaded file that hashes it while it is received
+
+    The multipart parser writes the file into it once. Data stays in memory
+    up to `max_memory` bytes and is moved to a temporary file in `spool_dir`
+    beyond that. With the spool directory on the same filesystem as the blob
+    store, a large upload is then moved into the store with a rename instead
+    of being copied. The temporary file is removed on close unless it was
+    moved.
+    """
+
+    def __init__(self, max_memory=DEFAULT_SPOOL_MEMORY, spool_dir=None):
+        self.max_memory = max_memory
+        self.spool_dir = spool_dir
+        self.size = 0
+        self._digest = hashlib.sha256()
+        self._file = io.BytesIO()
+        self._path = None
+
+    @property
+    def on_disk(self):
+        return self._path is not None
+
+    def hexdigest(self):
+        """SHA-256 of everything written so far"""
+        return self._digest.hexdigest()
+
+    def write(self, data):
+        self._digest.update(data)
+        self.size += len(data)
+        if self._path is None and self._file.tell() + len(data) > self.max_memory:
+            self._rollover()
+        return self._file.write(data)
+
+    def _rollover(self):
+        if self.spool_dir:
+            os.makedirs(self.spool_dir, exist_ok=True)
+        fd, path = tempfile.mkstemp(prefix='upload-', dir=self.spool_dir)
+        disk = os.fdopen(fd, 'w+b')
+        disk.write(self._file.getbuffer())
+        self._file = disk
+        self._path = path
+
+    def move_to(self, path):
+        """
+        Move the spooled file to `path` with a rename
+
+        Returns:
+            bool: False if the data is in memory (or on another filesystem)
+            and has to be copied instead
+        """
+        if self._path is None:
+            return False
+        self._file.flush()
+        try:
+            os.replace(self._path, path)
+        except OSError:
+            return False
+        self._file.close()
+        self._path = None
+        return True
+
+    def close(self):
+        self._file.close()
+        if self._path is not None:
+            try:
+                os.unlink(self._path)
+            except FileNotFoundError:
+                pass
+            self._path = None
+
+    def __getattr__(self, name):
+        # read, readline, seek, tell, flush, ... of the current buffer
+        return getattr(self._file, name)
+
+    def __iter__(self):
+        return iter(self._file)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class UploadRequest(Request):
+    """Request class that receives uploaded files into HashingSpool buffers"""
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        config = current_app.config
+        return HashingSpool(
+            max_memory=config.get('UPLOAD_SPOOL_MEMORY', DEFAULT_SPOOL_MEMORY),
+            spool_dir=config.get('UPLOAD_SPOOL_DIR')
+        )
+
+
+def upload_digest(file_storage):
+    """
+    Return the SHA-256 of an uploaded file
+
+    Files received by UploadRequest were hashed on arrival; other streams
+    are read once and rewound.
+    """
+    stream = file_storage.stream
+    if isinstance(stream, HashingSpool):
+        return stream.hexdigest()
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: stream.read(1024 * 1024), b''):
+        digest.update(chunk)
+    stream.seek(0)
+    return digest.hexdigest()
+
+
+def init_app(app):
+    """
+    Receive uploads with UploadRequest and reject bodies over UPLOAD_MAX_BYTES
+
+    Flask checks MAX_CONTENT_LENGTH against the Content-Length header before
+    reading the body, so oversized uploads get 413 without being buffered.
+    """
+    app.request_class = UploadRequest
+    app.config['MAX_CONTENT_LENGTH'] = app.config.get('UPLOAD_MAX_BYTES', DEFAULT_MAX_BYTES)
+    if app.config.get('UPLOAD_SPOOL_DIR') is None and app.config.get('BLOB_STORE', 'file') == 'file':
+        # Next to the blobs, so large uploads can be renamed into the store
+        app.config['UPLOAD_SPOOL_DIR'] = os.path.join(app.config['BLOB_DIR'], 'spool')
@@ -0,0 +1,106 @@
+"""
+Compare importing a directory of PDFs through the upload API and with
+`flask autoquiz ingest`.
+
+Writes `--files` synthetic PDFs, then imports them into a fresh database in a
+child process each: once by posting every file to /api/documents with
+INGEST_ASYNC off (one request, extraction and set of commits per file), once
+with the bulk ingest command (files extracted in a process pool, documents
+written in batches). Reports files and pages per second.
+
+Usage:
+    python benchmarks/bench_bulk_ingest.py --files 200 --pages 4 --workers 4
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+MODES = ("api", "bulk")
+
+
+def run_mode(mode, directory, workers):
+    """Import the directory in this process and return the numbers"""
+    sys.path.insert(0, ROOT)
+    from app import create_app
+    from autoquiz.cli import ingest
+    from autoquiz.models import Document, DocumentPage
+
+    app = create_app()
+    app.config["PDF_EXTRACT_WORKERS"] = workers
+    paths = sorted(os.path.join(directory, name) for name in os.listdir(directory) if name.endswith(".pdf"))
+
+    start = time.perf_counter()
+    if mode == "api":
+        client = app.test_client()
+        for path in paths:
+            with open(path, "rb") as f:
+                response = client.post("/api/documents", data={"file": (f, os.path.basename(path))},
+                                       content_type="multipart/form-data")
+            assert response.status_code == 201, response.json
+    else:
+        result = app.test_cli_runner().invoke(ingest, [
+            directory, "--workers", str(workers), "--manifest", os.path.join(tempfile.mkdtemp(), "manifest")
+        ])
+        assert result.exit_code == 0, result.output
+    seconds = time.perf_counter() - start
+
+    with app.app_context():
+        return {
+            "seconds": seconds,
+            "documents": Document.query.filter_by(status=Document.READY).count(),
+            "pages": DocumentPage.query.count(),
+        }
+
+
+def spawn(mode, directory, workers):
+    """Run one mode in a child process with its own database"""
+    data_dir = tempfile.mkdtemp(prefix="autoquiz-bulk-")
+    env = dict(
+        os.environ,
+        DATABASE_URI=f"sqlite:///{os.path.join(data_dir, 'bench.db')}",
+        BLOB_DIR=os.path.join(data_dir, "blobs"),
+        INGEST_ASYNC="0",
+        JOB_WORKERS="0",
+    )
+    output = subprocess.run(
+        [sys.executable, __file__, "--child", mode, "--directory", directory, "--workers", str(workers)],
+        env=env, check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--files", type=int, default=200, help="PDF files to import")
+    parser.add_argument("--pages", type=int, default=4, help="pages per file")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="extraction processes")
+    parser.add_argument("--directory", help=argparse.SUPPRESS)
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_mode(args.child, args.directory, args.workers)))
+        return
+
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    from synthetic_pdf import write_pdf
+
+    directory = tempfile.mkdtemp(prefix="autoquiz-pdfs-")
+    for number in range(args.files):
+        write_pdf(os.path.join(directory, f"doc{number:05d}.pdf"), args.pages, seed=number)
+
+    print(f"{'mode':>5} {'seconds':>8} {'documents':>10} {'files/s':>8} {'pages/s':>8}")
+    for mode in MODES:
+        result = spawn(mode, directory, args.workers)
+        print(f"{mode:>5} {result['seconds']:>8.2f} {result['documents']:>10} "
+              f"{result['documents'] / result['seconds']:>8.2f} {result['pages'] / result['seconds']:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+"""
+Measure how long a fresh process takes to build the app, and its memory use.
+
+Each run starts a new Python process that imports app.py, calls create_app()
+and reports the import and create_app() times, the peak RSS and which heavy
+dependencies (openai, httpx, pdfplumber) ended up imported. Runs go against
+a new database (schema created) and then the same database again (schema
+already current), with and without preloading the heavy modules.
+
+Pass --max-seconds / --max-rss-mb to fail (exit status 1) when a warm start
+without preloading is slower or larger, e.g. in CI.
+
+Usage:
+    python benchmarks/bench_cold_start.py --repeat 5 --max-seconds 1.5 --max-rss-mb 120
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+
+def measure(preload):
+    """Build the app in this process and return its numbers"""
+    import resource
+    import time
+
+    start = time.perf_counter()
+    sys.path.insert(0, ROOT)
+    from app import create_app
+    imported = time.perf_counter()
+    app = create_app("production")
+    created = time.perf_counter()
+    if preload:
+        from autoquiz.utils.lazy import preload as preload_modules
+        preload_modules()
+    done = time.perf_counter()
+
+    with app.app_context():
+        from autoquiz.extensions import db
+        db.engine.dispose()
+
+    return {
+        "import": imported - start,
+        "create_app": created - imported,
+        "preload": done - created,
+        "total": done - start,
+        # ru_maxrss is in KiB on Linux
+        "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "heavy": sorted(name for name in ("openai", "httpx", "pdfplumber") if name in sys.modules),
+    }
+
+
+def spawn(data_dir, preload):
+    """Start one process against the database in `data_dir`"""
+    env = dict(
+        os.environ,
+        DATABASE_URI=f"sqlite:///{os.path.join(data_dir, 'bench.db')}",
+        BLOB_DIR=os.path.join(data_dir, "blobs"),
+        JOB_WORKERS="0",
+    )
+    args = [sys.executable, __file__, "--child"] + (["--preload"] if preload else [])
+    output = subprocess.run(args, env=env, check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--repeat", type=int, default=5, help="warm starts per variant")
+    parser.add_argument("--max-seconds", type=float, help="fail if a warm start takes longer")
+    parser.add_argument("--max-rss-mb", type=float, help="fail if a warm start uses more memory")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--preload", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(measure(args.preload)))
+        return 0
+
+    data_dir = tempfile.mkdtemp(prefix="autoquiz-start-")
+    runs = {"new database": [spawn(data_dir, False)]}
+    runs["warm"] = [spawn(data_dir, False) for _ in range(args.repeat)]
+    runs["warm + preload"] = [spawn(data_dir, True) for _ in range(args.repeat)]
+
+    print(f"{'variant':>15} {'import':>8} {'create':>8} {'preload':>8} {'total':>8} {'rss MB':>7}  heavy modules")
+    for variant, results in runs.items():
+        median = {key: statistics.median(result[key] for result in results)
+                  for key in ("import", "create_app", "preload", "total", "rss_mb")}
+        heavy = ", ".join(results[0]["heavy"]) or "-"
+        print(f"{variant:>15} {median['import']:>8.3f} {median['create_app']:>8.3f} {median['preload']:>8.3f} "
+              f"{median['total']:>8.3f} {median['rss_mb']:>7.1f}  {heavy}")
+
+    warm = runs["warm"]
+    failed = False
+    total = statistics.median(result["total"] for result in warm)
+    rss = statistics.median(result["rss_mb"] for result in warm)
+    if args.max_seconds is not None and total > args.max_seconds:
+        print(f"FAIL: warm start took {total:.3f}s (limit {args.max_seconds}s)")
+        failed = True
+    if args.max_rss_mb is not None and rss > args.max_rss_mb:
+        print(f"FAIL: warm start used {rss:.1f} MB (limit {args.max_rss_mb} MB)")
+        failed = True
+    if warm[0]["heavy"]:
+        print(f"note: imported at startup: {', '.join(warm[0]['heavy'])}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,167 @@
+"""
+Compare database size and text read latency per CONTENT_CODEC.
+
+Stores the same documents with extracted text stored plain ('none'), zlib and
+lzma, each in a fresh SQLite database in its own process, then reports the
+database file size after VACUUM, the bytes taken by the text columns, how
+long a document listing takes (it never loads the text) and how long loading
+a document's text takes, which is what quiz generation does.
+
+The text comes from the docstrings of the standard library, as a stand-in
+for extracted textbook prose (random words compress unrealistically well).
+
+Usage:
+    python benchmarks/bench_content_storage.py --documents 200 --chars 60000
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+CODECS = ("none", "zlib", "lzma")
+
+
+def prose(chars, seed):
+    """About `chars` characters of English text built from stdlib docstrings"""
+    import pkgutil
+    import importlib
+    import inspect
+
+    paragraphs = []
+    for module_info in sorted(pkgutil.iter_modules(), key=lambda info: info.name):
+        if module_info.name.startswith("_") or module_info.name in ("antigravity", "this"):
+            continue
+        try:
+            module = importlib.import_module(module_info.name)
+        except Exception:
+            continue
+        for _, member in inspect.getmembers(module):
+            doc = inspect.getdoc(member) if callable(member) else None
+            if doc and len(doc) > 200:
+                paragraphs.append(doc)
+        if len(paragraphs) > 4000:
+            break
+    rng = random.Random(seed)
+    rng.shuffle(paragraphs)
+    text, size = [], 0
+    for paragraph in paragraphs:
+        text.append(paragraph)
+        size += len(paragraph) + 2
+        if size >= chars:
+            break
+    return "\n\n".join(text)
+
+
+def run_codec(codec, documents, chars, reads):
+    """Store and read the documents in this process and return the numbers"""
+    sys.path.insert(0, ROOT)
+    from sqlalchemy import text
+
+    from app import create_app
+    from autoquiz.extensions import db
+    from autoquiz.models import Document
+    from autoquiz.utils.compaction import compact_text
+
+    app = create_app()
+    app.config["CONTENT_CODEC"] = codec
+    database = app.config["SQLALCHEMY_DATABASE_URI"].replace("sqlite:///", "")
+    texts = [prose(chars, seed) for seed in range(min(documents, 20))]
+
+    compacts = [compact_text(content) for content in texts]
+    raw = 0
+
+    with app.app_context():
+        start = time.perf_counter()
+        for number in range(documents):
+            content, compact = texts[number % len(texts)], compacts[number % len(texts)]
+            raw += len(content.encode("utf-8")) + len(compact.encode("utf-8"))
+            document = Document(filename=f"doc{number}.pdf", status=Document.READY, content=content)
+            document.compact_content = compact
+            db.session.add(document)
+            if number % 50 == 49:
+                db.session.commit()
+        db.session.commit()
+        write_seconds = time.perf_counter() - start
+
+        stored = db.session.execute(text(
+            "SELECT sum(length(CAST(content AS BLOB)) + length(CAST(compact_content AS BLOB))) FROM documents"
+        )).scalar()
+        with db.engine.connect() as conn:
+            conn.execution_options(isolation_level="AUTOCOMMIT").execute(text("VACUUM"))
+
+        rng = random.Random(0)
+        doc_ids = [row.id for row in db.session.query(Document.id)]
+        read_times = []
+        for _ in range(reads):
+            db.session.remove()
+            start = time.perf_counter()
+            document = Document.query.get(rng.choice(doc_ids))
+            document.compact_content
+            read_times.append(time.perf_counter() - start)
+
+        list_times = []
+        for _ in range(20):
+            db.session.remove()
+            start = time.perf_counter()
+            [document.to_dict() for document in Document.query.order_by(Document.id).limit(50)]
+            list_times.append(time.perf_counter() - start)
+
+    read_times.sort()
+    return {
+        "db_bytes": os.path.getsize(database),
+        "raw_bytes": raw,
+        "stored_bytes": stored,
+        "write_seconds": write_seconds,
+        "read_p50": statistics.median(read_times),
+        "read_p95": read_times[int(len(read_times) * 0.95) - 1],
+        "list_p50": statistics.median(list_times),
+    }
+
+
+def spawn(codec, documents, chars, reads):
+    """Run one codec in a child process with its own database"""
+    data_dir = tempfile.mkdtemp(prefix="autoquiz-content-")
+    env = dict(
+        os.environ,
+        DATABASE_URI=f"sqlite:///{os.path.join(data_dir, 'bench.db')}",
+        BLOB_DIR=os.path.join(data_dir, "blobs"),
+        JOB_WORKERS="0",
+    )
+    output = subprocess.run(
+        [sys.executable, __file__, "--child", codec, "--documents", str(documents),
+         "--chars", str(chars), "--reads", str(reads)],
+        env=env, check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--documents", type=int, default=200, help="documents to store")
+    parser.add_argument("--chars", type=int, default=60000, help="characters of text per document")
+    parser.add_argument("--reads", type=int, default=200, help="document texts loaded when timing reads")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_codec(args.child, args.documents, args.chars, args.reads)))
+        return
+
+    print(f"{'codec':>6} {'db MB':>8} {'text MB':>8} {'ratio':>6} {'write s':>8} "
+          f"{'read p50 ms':>12} {'read p95 ms':>12} {'list p50 ms':>12}")
+    for codec in CODECS:
+        result = spawn(codec, args.documents, args.chars, args.reads)
+        print(f"{codec:>6} {result['db_bytes'] / 1e6:>8.2f} {result['stored_bytes'] / 1e6:>8.2f} "
+              f"{result['raw_bytes'] / result['stored_bytes']:>6.2f} {result['write_seconds']:>8.2f} "
+              f"{result['read_p50'] * 1000:>12.2f} {result['read_p95'] * 1000:>12.2f} {result['list_p50'] * 1000:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Measure how hedging and the circuit breaker change OpenAI call latency.
+
+Against the fake OpenAI server:
+
+- tail: completions with a slow tail (`--slow-rate` of them take
+  `--slow-factor` times longer), made with hedging off and on. Reports
+  latency percentiles, hedges sent and won and the extra upstream requests.
+- outage: every request fails. Reports how long callers wait before they can
+  fall back, and how many requests reach upstream, with the breaker off and on.
+
+Usage:
+    python benchmarks/bench_llm_tail.py --calls 400 --concurrency 4 --latency 0.5 --slow-rate 0.05
+"""
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+from autoquiz.utils.llm import LLMClient  # noqa: E402
+from autoquiz.utils.metrics import LLM_BREAKER_REJECTIONS, LLM_BREAKER_TRIPS, LLM_HEDGES  # noqa: E402
+from fake_openai import base_url, start_server  # noqa: E402
+
+MESSAGES = [{"role": "user", "content": "Generate a 3-question multiple-choice quiz"}]
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def run_calls(client, calls, concurrency):
+    """Make `calls` completions from `concurrency` threads; return (seconds per call, failures)"""
+    latencies = []
+    failures = []
+    lock = threading.Lock()
+    remaining = iter(range(calls))
+
+    def worker():
+        while True:
+            with lock:
+                if next(remaining, None) is None:
+                    return
+            start = time.perf_counter()
+            try:
+                client.chat_completion(model="gpt-3.5-turbo", messages=MESSAGES)
+                failed = False
+            except Exception:
+                failed = True
+            with lock:
+                latencies.append(time.perf_counter() - start)
+                failures.append(failed)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, sum(failures)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--calls", type=int, default=400, help="completions per configuration")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.5, help="mean seconds per completion")
+    parser.add_argument("--slow-rate", type=float, default=0.05, help="fraction of slow completions")
+    parser.add_argument("--slow-factor", type=float, default=6.0, help="latency multiplier of slow completions")
+    parser.add_argument("--outage-calls", type=int, default=40, help="calls made while upstream is down")
+    args = parser.parse_args()
+
+    server = start_server(0, latency=args.latency, slow_rate=args.slow_rate, slow_factor=args.slow_factor)
+    url = base_url(server)
+
+    print(f"{'tail':>8} {'p50 ms':>8} {'p90 ms':>8} {'p99 ms':>8} {'max ms':>8} {'hedges':>7} {'won':>5} {'requests':>9}")
+    for label, hedge_after in (("baseline", "off"), ("hedged", "auto")):
+        client = LLMClient(api_key="x", base_url=url, hedge_after=hedge_after, max_concurrency=args.concurrency)
+        # Warm the latency window the hedging delay is estimated from
+        run_calls(client, 50, args.concurrency)
+        sent, won, requests = LLM_HEDGES.value(outcome="sent"), LLM_HEDGES.value(outcome="won"), server.requests
+        latencies, _ = run_calls(client, args.calls, args.concurrency)
+        print(f"{label:>8} {statistics.median(latencies) * 1000:>8.0f} {percentile(latencies, 0.9) * 1000:>8.0f} "
+              f"{percentile(latencies, 0.99) * 1000:>8.0f} {max(latencies) * 1000:>8.0f} "
+              f"{LLM_HEDGES.value(outcome='sent') - sent:>7} {LLM_HEDGES.value(outcome='won') - won:>5} "
+              f"{(server.requests - requests) / args.calls:>8.2f}x")
+        client.close()
+
+    server.error_rate = 1.0
+    print(f"\n{'outage':>8} {'mean ms':>8} {'p99 ms':>8} {'failed':>7} {'requests':>9} {'trips':>6} {'rejected':>9}")
+    for label, failures in (("baseline", 0), ("breaker", 5)):
+        client = LLMClient(api_key="x", base_url=url, hedge_after="off", breaker_failures=failures,
+                           backoff_base=0.05, backoff_max=0.5)
+        trips, rejected, requests = LLM_BREAKER_TRIPS.value(), LLM_BREAKER_REJECTIONS.value(), server.requests
+        latencies, failed = run_calls(client, args.outage_calls, args.concurrency)
+        print(f"{label:>8} {statistics.mean(latencies) * 1000:>8.0f} {percentile(latencies, 0.99) * 1000:>8.0f} "
+              f"{failed:>7} {server.requests - requests:>9} {LLM_BREAKER_TRIPS.value() - trips:>6} "
+              f"{LLM_BREAKER_REJECTIONS.value() - rejected:>9}")
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
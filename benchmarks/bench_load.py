@@ -0,0 +1,174 @@
+"""
+End-to-end load benchmark: upload, list, generate and delete against the API.
+
+Each virtual user repeatedly uploads a unique synthetic PDF, waits for its
+text to be extracted, lists documents, generates a quiz from text and from
+the document, then deletes the document. Latency percentiles and throughput
+are reported per endpoint. By default the app runs in-process against a
+temporary database and a local fake OpenAI server, so no API key or network
+is needed and the numbers measure the service's own overhead plus the
+configured upstream latency. Quiz fallbacks are disabled so upstream
+failures show up as errors instead of sample quizzes.
+
+Usage:
+    python benchmarks/bench_load.py --concurrency 1 8 32 --iterations 20 --latency 0.2
+    python benchmarks/bench_load.py --url http://127.0.0.1:5000 --concurrency 16
+"""
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from fake_openai import base_url, start_server  # noqa: E402
+from synthetic_pdf import build_pdf  # noqa: E402
+
+ENDPOINTS = ["upload", "status", "list", "generate", "document_quiz", "delete"]
+
+
+class Recorder:
+    """Collects per-endpoint latencies and failures from many threads"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def call(self, name, fn, expected):
+        start = time.perf_counter()
+        try:
+            response = fn()
+        except httpx.HTTPError:
+            response = None
+        elapsed = time.perf_counter() - start
+        ok = response is not None and response.status_code in expected \
+            and response.headers.get("X-Quiz-Fallback") != "true"
+        with self.lock:
+            self.latencies[name].append(elapsed)
+            if not ok:
+                self.errors[name] += 1
+        return response if ok else None
+
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of a sorted list"""
+    if not sorted_values:
+        return float("nan")
+    index = max(0, min(len(sorted_values) - 1, round(fraction * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+
+def run_user(client, recorder, user, iterations, pages, poll_interval):
+    for iteration in range(iterations):
+        seed = user * 1_000_003 + iteration
+        pdf = build_pdf(pages, seed=seed)
+        response = recorder.call("upload", lambda: client.post(
+            "/api/documents", files={"file": (f"load-{seed}.pdf", pdf, "application/pdf")}
+        ), (200, 201, 202))
+        if response is None:
+            continue
+        doc_id = response.json()["id"]
+
+        status = response.json()["status"]
+        while status in ("pending", "processing"):
+            time.sleep(poll_interval)
+            response = recorder.call("status", lambda: client.get(f"/api/documents/{doc_id}"), (200,))
+            if response is None:
+                break
+            status = response.json()["status"]
+
+        recorder.call("list", lambda: client.get("/api/documents", params={"limit": 50}), (200,))
+        recorder.call("generate", lambda: client.post("/api/quiz/generate", json={
+            "text": f"Load test passage {seed}. " + "The quick brown fox jumps over the lazy dog. " * 40
+        }), (200,))
+        if status == "ready":
+            recorder.call("document_quiz", lambda: client.get(f"/api/quiz/document/{doc_id}"), (200,))
+        recorder.call("delete", lambda: client.delete(f"/api/documents/{doc_id}"), (200,))
+
+
+def run_level(url, concurrency, iterations, pages, poll_interval):
+    recorder = Recorder()
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    with httpx.Client(base_url=url, timeout=120, limits=limits) as client:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            futures = [
+                executor.submit(run_user, client, recorder, user, iterations, pages, poll_interval)
+                for user in range(concurrency)
+            ]
+            for future in futures:
+                future.result()
+        wall = time.perf_counter() - start
+    return recorder, wall
+
+
+def report(concurrency, recorder, wall):
+    print(f"\nconcurrency={concurrency}  wall={wall:.2f}s")
+    print(f"{'endpoint':>14} {'count':>6} {'errors':>6} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'req/s':>8}")
+    for name in ENDPOINTS:
+        values = sorted(recorder.latencies.get(name, []))
+        if not values:
+            continue
+        print(f"{name:>14} {len(values):>6} {recorder.errors[name]:>6} "
+              f"{percentile(values, 0.50) * 1000:>8.1f} {percentile(values, 0.95) * 1000:>8.1f} "
+              f"{percentile(values, 0.99) * 1000:>8.1f} {len(values) / wall:>8.1f}")
+
+
+def start_app(openai_url):
+    """Serve a fresh app on a temporary database in a background thread"""
+    from werkzeug.serving import WSGIRequestHandler, make_server
+
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    data_dir = tempfile.mkdtemp(prefix="autoquiz-load-")
+    os.environ.setdefault("DATABASE_URI", f"sqlite:///{os.path.join(data_dir, 'load.db')}")
+    os.environ.setdefault("BLOB_DIR", os.path.join(data_dir, "blobs"))
+    os.environ["OPENAI_API_KEY"] = os.environ.get("OPENAI_API_KEY") or "fake"
+    os.environ["OPENAI_BASE_URL"] = openai_url
+    os.environ.setdefault("QUIZ_FALLBACK_ENABLED", "false")
+
+    from app import create_app
+
+    app = create_app()
+    server = make_server("127.0.0.1", 0, app, threaded=True, request_handler=QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_port}", data_dir
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--url", help="benchmark a running server instead of an in-process app")
+    parser.add_argument("--openai-url", help="OPENAI_BASE_URL for the in-process app, default: a local fake")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8])
+    parser.add_argument("--iterations", type=int, default=10, help="scenario runs per virtual user")
+    parser.add_argument("--pages", type=int, default=4, help="pages per uploaded PDF")
+    parser.add_argument("--latency", type=float, default=0.2, help="fake OpenAI mean latency in seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fake OpenAI failure rate")
+    parser.add_argument("--poll-interval", type=float, default=0.05, help="seconds between status polls")
+    args = parser.parse_args()
+
+    url = args.url
+    if url is None:
+        openai_url = args.openai_url
+        if openai_url is None:
+            fake = start_server(latency=args.latency, error_rate=args.error_rate)
+            openai_url = base_url(fake)
+        url, data_dir = start_app(openai_url)
+        print(f"In-process app at {url} (data in {data_dir}), OpenAI at {openai_url}")
+
+    for concurrency in args.concurrency:
+        recorder, wall = run_level(url, concurrency, args.iterations, args.pages, args.poll_interval)
+        report(concurrency, recorder, wall)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,222 @@
+"""
+Measure the question bank: near-duplicate checks against a large bank, and
+quizzes drawn from the bank instead of generated.
+
+- dedup: fills one document's bank with `--bank` synthetic questions, then
+  checks batches of new questions (rephrasings of banked questions mixed with
+  new ones) against it: compared pair by pair in Python (timed on
+  `--pairwise-rows` rows and scaled up), one question at a time with NumPy,
+  and as one batch. Also reports embedding throughput, how long loading the
+  bank takes, and how often rephrasings, new questions about a banked
+  subject and unrelated questions are taken for duplicates.
+- repeat: against the fake OpenAI server, requests `--requests` quizzes of a
+  document with GET /api/quiz/document/<id>?refresh=true and from
+  GET /api/quiz/document/<id>/bank. Reports latency and upstream requests.
+
+Usage:
+    python benchmarks/bench_question_bank.py --bank 100000 --batch 10 --requests 20
+"""
+import argparse
+import io
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+DATA_DIR = tempfile.mkdtemp(prefix="autoquiz-bank-")
+os.environ.update(
+    DATABASE_URI=f"sqlite:///{os.path.join(DATA_DIR, 'bench.db')}",
+    BLOB_DIR=os.path.join(DATA_DIR, "blobs"),
+    INGEST_ASYNC="0",
+    JOB_WORKERS="0",
+    QUIZ_CACHE_ENABLED="false",
+    QUIZ_FALLBACK_ENABLED="false",
+)
+
+import numpy as np  # noqa: E402
+
+from app import create_app  # noqa: E402
+from autoquiz.extensions import db  # noqa: E402
+from autoquiz.models import BankQuestion  # noqa: E402
+from autoquiz.utils.question_bank import get_question_bank, unique_mask  # noqa: E402
+from fake_openai import base_url, start_server  # noqa: E402
+from synthetic_pdf import build_pdf  # noqa: E402
+
+TEMPLATES = (
+    "What is the {attribute} of {entity}?",
+    "Which {attribute} does {entity} have?",
+    "{entity} is known for which {attribute}?",
+    "Identify the {attribute} of {entity}.",
+)
+ATTRIBUTES = [
+    "capital", "author", "inventor", "founder", "boiling point", "melting point", "atomic number", "main export",
+    "currency", "population", "largest city", "highest mountain", "longest river", "official language",
+    "primary function", "chemical formula", "birth year", "discoverer", "native habitat", "orbital period",
+    "half-life", "speed limit", "national animal", "main ingredient", "core principle", "defining feature",
+    "typical lifespan", "common name", "scientific name", "energy source",
+]
+
+
+# Attributes banked per entity; the others make new questions about banked entities
+BANKED_ATTRIBUTES = 10
+
+
+def make_entities(count, rng):
+    """Random names to ask about, so questions don't share real vocabulary"""
+    entities = set()
+    while len(entities) < count:
+        entities.add("".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(5, 9))).capitalize())
+    return sorted(entities)
+
+
+def make_question(attribute, entity, answer, template=0):
+    return {
+        "question": TEMPLATES[template].format(attribute=attribute, entity=entity),
+        "options": [answer, "Option b", "Option c", "Option d"],
+        "answer": answer,
+    }
+
+
+def best_similarity(vectors, matrix, rows=50):
+    """Highest cosine similarity of each vector with the bank, a few vectors at a time"""
+    return np.concatenate([(vectors[i:i + rows] @ matrix.T).max(axis=1) for i in range(0, len(vectors), rows)])
+
+
+def pairwise_keep(vectors, matrix, similarity):
+    """Reference check: every new question against every banked one, in Python"""
+    rows = matrix.tolist()
+    keep = []
+    for vector in vectors.tolist():
+        keep.append(all(sum(a * b for a, b in zip(vector, row)) < similarity for row in rows))
+    return keep
+
+
+def bench_dedup(app, args, rng):
+    entities = make_entities(args.bank // BANKED_ATTRIBUTES + 1, rng)
+    attributes = {entity: rng.sample(ATTRIBUTES, BANKED_ATTRIBUTES) for entity in entities}
+    subjects = [(attribute, entity) for entity in entities for attribute in attributes[entity]][:args.bank]
+    answers = {subject: rng.choice(entities) for subject in subjects}
+    banked = [make_question(*subject, answers[subject]) for subject in subjects]
+
+    with app.app_context():
+        bank = get_question_bank()
+        document_id = 1
+        db.session.execute(db.text(
+            "INSERT INTO documents (id, filename, status, content_length, file_data) VALUES (1, 'bank.pdf', 'ready', 0, '')"
+        ))
+
+        start = time.perf_counter()
+        vectors = bank.embed(banked)
+        embed_seconds = time.perf_counter() - start
+        db.session.bulk_insert_mappings(BankQuestion, [
+            {"document_id": document_id, "question": q["question"], "options": "[]", "answer": q["answer"],
+             "topic": "", "vector": vector.astype(np.float16).tobytes()}
+            for q, vector in zip(banked, vectors)
+        ])
+        db.session.commit()
+
+        start = time.perf_counter()
+        matrix = bank._index(document_id).matrix
+        load_seconds = time.perf_counter() - start
+
+        print(f"bank of {len(banked)} questions: embedded at {len(banked) / embed_seconds:,.0f} questions/s, "
+              f"loaded in {load_seconds * 1000:.0f} ms ({matrix.nbytes / 2 ** 20:.0f} MiB in memory)\n")
+
+        # Rephrasings of banked questions, new questions about banked subjects
+        # and unrelated ones
+        rephrased = [make_question(*subject, answers[subject], template=rng.randrange(1, len(TEMPLATES)))
+                     for subject in rng.sample(subjects, args.samples)]
+        fresh_entities = sorted(set(make_entities(args.samples + len(entities), rng)) - set(entities))
+        related = []
+        for _ in range(args.samples):
+            _, entity = rng.choice(subjects)
+            related.append(make_question(rng.choice([a for a in ATTRIBUTES if a not in attributes[entity]]), entity,
+                                         rng.choice(fresh_entities)))
+        unrelated = [make_question(rng.choice(ATTRIBUTES), entity, rng.choice(fresh_entities))
+                     for entity in fresh_entities[:args.samples]]
+
+        print(f"{'questions':>24} {'flagged':>8}")
+        for label, questions in (("rephrased (duplicates)", rephrased), ("new about banked entity", related),
+                                 ("unrelated", unrelated)):
+            flagged = (best_similarity(bank.embed(questions), matrix) >= bank.similarity).mean()
+            print(f"{label:>24} {flagged:>7.1%}")
+
+        batches = []
+        for _ in range(args.repeat):
+            batch = rng.sample(rephrased, args.batch // 2) + rng.sample(unrelated, args.batch - args.batch // 2)
+            batches.append(bank.embed(batch))
+
+        rows = matrix[:args.pairwise_rows]
+        start = time.perf_counter()
+        pairwise_keep(batches[0], rows, bank.similarity)
+        pairwise_ms = (time.perf_counter() - start) * 1000 * len(matrix) / len(rows)
+
+        start = time.perf_counter()
+        for batch in batches:
+            for vector in batch:
+                unique_mask(vector[None, :], matrix, bank.similarity)
+        single_ms = (time.perf_counter() - start) * 1000 / len(batches)
+
+        start = time.perf_counter()
+        for batch in batches:
+            unique_mask(batch, matrix, bank.similarity)
+        batched_ms = (time.perf_counter() - start) * 1000 / len(batches)
+
+        print(f"\n{'check of ' + str(args.batch) + ' questions':>24} {'ms':>9} {'speedup':>8}")
+        print(f"{'pairwise python (est.)':>24} {pairwise_ms:>9.0f} {1:>7.1f}x")
+        print(f"{'numpy, one at a time':>24} {single_ms:>9.1f} {pairwise_ms / single_ms:>7.0f}x")
+        print(f"{'numpy, batched':>24} {batched_ms:>9.1f} {pairwise_ms / batched_ms:>7.0f}x")
+
+
+def bench_repeat(app, args):
+    server = start_server(0, latency=args.latency)
+    client = app.test_client()
+    app.extensions["llm"].base_url = base_url(server)
+    app.extensions["llm"].api_key = "x"
+
+    response = client.post("/api/documents", data={"file": (io.BytesIO(build_pdf(8, seed=1)), "repeat.pdf")},
+                           content_type="multipart/form-data")
+    assert response.status_code == 201, response.json
+    doc_id = response.json["id"]
+
+    print(f"\n{'repeat quizzes':>24} {'mean ms':>8} {'p90 ms':>8} {'requests':>9}")
+    # The bank goes first, so it pays for the generations that fill it
+    for label, url in (("bank", f"/api/quiz/document/{doc_id}/bank?num_questions={args.questions}"),
+                       ("refresh", f"/api/quiz/document/{doc_id}?refresh=true&num_questions={args.questions}")):
+        latencies = []
+        requests = server.requests
+        for _ in range(args.requests):
+            start = time.perf_counter()
+            response = client.get(url)
+            latencies.append(time.perf_counter() - start)
+            assert response.status_code == 200, response.json
+        latencies.sort()
+        print(f"{label:>24} {statistics.mean(latencies) * 1000:>8.0f} "
+              f"{latencies[int(len(latencies) * 0.9)] * 1000:>8.0f} {server.requests - requests:>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--bank", type=int, default=100000, help="questions in the bank")
+    parser.add_argument("--batch", type=int, default=10, help="new questions checked at once")
+    parser.add_argument("--repeat", type=int, default=20, help="batches checked per method")
+    parser.add_argument("--samples", type=int, default=500, help="questions per accuracy sample")
+    parser.add_argument("--pairwise-rows", type=int, default=2000, help="bank rows the Python check is timed on")
+    parser.add_argument("--requests", type=int, default=20, help="repeat quiz requests")
+    parser.add_argument("--questions", type=int, default=5, help="questions per quiz")
+    parser.add_argument("--latency", type=float, default=0.5, help="mean seconds per fake OpenAI completion")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    app = create_app()
+    bench_dedup(app, args, random.Random(args.seed))
+    bench_repeat(app, args)
+
+
+if __name__ == "__main__":
+    main()
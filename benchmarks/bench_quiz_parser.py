@@ -0,0 +1,176 @@
+"""
+Measure quiz parsing throughput and the yield of valid questions.
+
+Parses the completions in benchmarks/data/quiz_completions.json (layouts seen
+in model output) and a fuzzed corpus generated from them (numbering, option
+markers, markdown, blank lines, wrapped lines, 3-5 options, answer phrasing)
+with the previous line-count based parser and the current one, and the same
+questions as JSON-mode completions. Yield is valid questions over the
+questions each completion contains. The streaming parsers are checked to
+return the same questions as parsing the whole text.
+
+Usage:
+    python benchmarks/bench_quiz_parser.py --fuzz 2000 --seed 1
+"""
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+from autoquiz.utils.quiz_parser import (  # noqa: E402
+    IncrementalJSONQuizParser, IncrementalQuizParser, parse_quiz_json, parse_quiz_to_json
+)
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "quiz_completions.json")
+
+_ANSWER = re.compile(r'Answer:\s*([a-d])\)?', re.IGNORECASE)
+
+
+def legacy_parse(quiz_text):
+    """The parser before the single-pass rewrite, kept for comparison"""
+    structured = []
+    for block in re.split(r'\n(?=\d+\.)', quiz_text.strip()):
+        lines = block.strip().split('\n')
+        if len(lines) < 6:
+            continue
+        question_text = lines[0].split('.', 1)[1].strip() if len(lines[0].split('.', 1)) > 1 else "Question"
+        options = []
+        for i in range(1, min(5, len(lines))):
+            parts = lines[i].split(')', 1)
+            if len(parts) > 1:
+                options.append(parts[1].strip())
+        if len(options) < 4:
+            continue
+        answer_letter = _ANSWER.search(lines[-1])
+        if not answer_letter:
+            continue
+        answer_index = ord(answer_letter.group(1).lower()) - ord('a')
+        if not (0 <= answer_index < len(options)):
+            answer_index = 0
+        structured.append({"question": question_text, "options": options, "answer": options[answer_index]})
+    return structured
+
+
+def fuzz_completion(rng, questions):
+    """
+    Write `questions` ((text, options, answer index) tuples) in a random
+    layout, the way a model might
+
+    Returns:
+        str: Completion text
+    """
+    numbering = rng.choice(["{n}. ", "{n}) ", "Q{n}. ", "Question {n}: ", "**{n}. ", "### {n}. "])
+    marker = rng.choice(["{l}) ", "{L}. ", "({l}) ", "{L}) ", "- {l}) "])
+    indent = rng.choice(["", "   "])
+    answer_style = rng.choice(["Answer: {l})", "Answer: {L}", "Correct answer: {text}",
+                               "**Answer: {l}) {text}**", "The correct answer is {l}) {text}."])
+    separator = rng.choice(["\n", "\n\n"])
+    option_gap = rng.choice(["\n", "\n", "\n\n"])
+    blocks = []
+    if rng.random() < 0.3:
+        blocks.append("Here is a quiz based on the content:")
+    for number, (text, options, answer) in enumerate(questions, 1):
+        head = numbering.format(n=number) + text
+        if numbering.startswith("**"):
+            head += "**"
+        if rng.random() < 0.2 and " " in text:
+            cut = text.index(" ", len(text) // 2) if " " in text[len(text) // 2:] else text.index(" ")
+            head = numbering.format(n=number) + text[:cut] + "\n" + text[cut + 1:]
+        lines = [head]
+        for index, option in enumerate(options):
+            letter = "abcdef"[index]
+            lines.append(indent + marker.format(l=letter, L=letter.upper()) + option)
+        letter = "abcdef"[answer]
+        lines.append(indent + answer_style.format(l=letter, L=letter.upper(), text=options[answer]))
+        blocks.append(lines[0] + "\n" + option_gap.join(lines[1:]))
+    if rng.random() < 0.3:
+        blocks.append("Good luck!")
+    return separator.join(blocks)
+
+
+def random_questions(rng, count):
+    words = ["cell", "energy", "river", "empire", "market", "protein", "orbit", "law", "climate", "signal"]
+    questions = []
+    for _ in range(count):
+        text = f"What does the text say about the {rng.choice(words)} and the {rng.choice(words)}?"
+        option_count = rng.choice([4, 4, 4, 4, 3, 5])
+        options = [f"The {rng.choice(words)} {rng.randrange(1000)}" for _ in range(option_count)]
+        questions.append((text, options, rng.randrange(option_count)))
+    return questions
+
+
+def json_completion(questions):
+    return json.dumps({"questions": [
+        {"question": text, "options": options, "answer": "abcdef"[answer]}
+        for text, options, answer in questions
+    ]})
+
+
+def measure(parse, texts, expected, repeat):
+    found = sum(len(parse(text)) for text in texts)
+    size = sum(len(text) for text in texts)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for text in texts:
+            parse(text)
+    elapsed = time.perf_counter() - start
+    return {
+        "yield": found / expected if expected else 0.0,
+        "per_second": len(texts) * repeat / elapsed,
+        "mb_per_second": size * repeat / elapsed / 1e6,
+    }
+
+
+def stream(parser, text, rng):
+    questions = []
+    position = 0
+    while position < len(text):
+        size = rng.randint(1, 12)
+        questions += parser.feed(text[position:position + size])
+        position += size
+    return questions + parser.finish()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--fuzz", type=int, default=2000, help="fuzzed completions to generate")
+    parser.add_argument("--repeat", type=int, default=5, help="passes over each corpus when timing")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    rng = random.Random(args.seed)
+
+    with open(CORPUS) as f:
+        corpus = json.load(f)
+    fuzz_questions = [random_questions(rng, rng.randint(1, 5)) for _ in range(args.fuzz)]
+    fuzzed = [fuzz_completion(rng, questions) for questions in fuzz_questions]
+    as_json = [json_completion(questions) for questions in fuzz_questions]
+    fuzz_expected = sum(len(questions) for questions in fuzz_questions)
+
+    suites = [
+        ("corpus", "previous", legacy_parse, [entry["text"] for entry in corpus], sum(entry["expected"] for entry in corpus)),
+        ("corpus", "single-pass", parse_quiz_to_json, [entry["text"] for entry in corpus], sum(entry["expected"] for entry in corpus)),
+        ("fuzzed", "previous", legacy_parse, fuzzed, fuzz_expected),
+        ("fuzzed", "single-pass", parse_quiz_to_json, fuzzed, fuzz_expected),
+        ("fuzzed", "json mode", parse_quiz_json, as_json, fuzz_expected),
+    ]
+    print(f"{'corpus':>7} {'parser':>12} {'yield':>7} {'parses/s':>10} {'MB/s':>7}")
+    for name, label, parse, texts, expected in suites:
+        result = measure(parse, texts, expected, args.repeat)
+        print(f"{name:>7} {label:>12} {result['yield']:>7.1%} {result['per_second']:>10.0f} {result['mb_per_second']:>7.2f}")
+
+    mismatches = 0
+    for text, data in zip(fuzzed, as_json):
+        mismatches += stream(IncrementalQuizParser(), text, rng) != parse_quiz_to_json(text)
+        mismatches += stream(IncrementalJSONQuizParser(), data, rng) != parse_quiz_json(data)
+    print(f"streaming parsers disagreeing with whole-text parsing: {mismatches}")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
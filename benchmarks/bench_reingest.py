@@ -0,0 +1,105 @@
+"""
+Compare re-ingesting a revised document in full with replacing its file.
+
+Uploads a synthetic PDF, then a revision of it with some pages rewritten, once
+as a new document (full extraction) and once through PUT /api/documents/<id>
+(only pages whose content hash changed are extracted). Reports both times and
+the pages each one extracted, and checks that both end with the same text,
+compacted text and chunk index.
+
+Usage:
+    python benchmarks/bench_reingest.py --pages 200 --changed 1 5 20
+"""
+import argparse
+import io
+import os
+import random
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+DATA_DIR = tempfile.mkdtemp(prefix="autoquiz-reingest-")
+os.environ.update(
+    DATABASE_URI=f"sqlite:///{os.path.join(DATA_DIR, 'bench.db')}",
+    BLOB_DIR=os.path.join(DATA_DIR, "blobs"),
+    INGEST_ASYNC="0",
+    JOB_WORKERS="0",
+)
+
+from sqlalchemy import text  # noqa: E402
+
+from app import create_app  # noqa: E402
+from autoquiz.models import Document  # noqa: E402
+from autoquiz.utils.metrics import PDF_PAGES  # noqa: E402
+from synthetic_pdf import _page_lines, build_pdf  # noqa: E402
+
+
+def upload(client, method, url, pages, name):
+    data = {"file": (io.BytesIO(build_pdf(len(pages), page_text=pages)), name)}
+    start = time.perf_counter()
+    response = client.open(url, method=method, data=data, content_type="multipart/form-data")
+    elapsed = time.perf_counter() - start
+    assert response.status_code in (200, 201), response.json
+    return response.json["id"], elapsed
+
+
+def extracted():
+    return PDF_PAGES.value(outcome="ok") + PDF_PAGES.value(outcome="error")
+
+
+def chunks(doc_id):
+    from autoquiz.extensions import db
+    return sorted(db.session.execute(
+        text("SELECT page_number, text FROM document_chunks WHERE document_id = :id"), {"id": doc_id}
+    ).fetchall())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--pages", type=int, default=200, help="pages of the document")
+    parser.add_argument("--changed", type=int, nargs="+", default=[1, 5, 20], help="pages rewritten in the revision")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="PDF_EXTRACT_WORKERS")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    app = create_app()
+    app.config["PDF_EXTRACT_WORKERS"] = args.workers
+    client = app.test_client()
+    rng = random.Random(args.seed)
+
+    print(f"{'changed':>8} {'full s':>8} {'pages':>6} {'replace s':>10} {'pages':>6} {'speedup':>8}")
+    failures = 0
+    for changed in args.changed:
+        pages = {number: _page_lines(number, 40, rng) for number in range(1, args.pages + 1)}
+        doc_id, _ = upload(client, "POST", "/api/documents", pages, "original.pdf")
+
+        revised = dict(pages)
+        for number in rng.sample(range(1, args.pages + 1), changed):
+            revised[number] = _page_lines(number, 40, rng)
+
+        before = extracted()
+        full_id, full_seconds = upload(client, "POST", "/api/documents", revised, "full.pdf")
+        full_pages = extracted() - before
+
+        before = extracted()
+        _, replace_seconds = upload(client, "PUT", f"/api/documents/{doc_id}", revised, "revised.pdf")
+        replace_pages = extracted() - before
+
+        with app.app_context():
+            full, replaced = Document.query.get(full_id), Document.query.get(doc_id)
+            same = (
+                full.content == replaced.content
+                and full.compact_content == replaced.compact_content
+                and chunks(full_id) == chunks(doc_id)
+            )
+        failures += not same
+        print(f"{changed:>8} {full_seconds:>8.2f} {full_pages:>6} {replace_seconds:>10.2f} {replace_pages:>6} "
+              f"{full_seconds / replace_seconds:>7.1f}x{'' if same else '  MISMATCH'}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
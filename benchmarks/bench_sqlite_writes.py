@@ -0,0 +1,137 @@
+"""
+Benchmark concurrent SQLite writes under the development and production profiles.
+
+Writer threads mimic uploads and ingestion: each iteration inserts a pending
+document, enqueues a job, then marks the document ready, committing after each
+step, while reader threads list documents. The development profile uses the
+SQLite defaults (rollback journal, a new connection per checkout); the
+production profile adds WAL, busy_timeout, synchronous=NORMAL, mmap and a
+connection pool. Each profile runs in its own process on a fresh database.
+
+Usage:
+    python benchmarks/bench_sqlite_writes.py --threads 4 16 --iterations 100
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+
+def run_profile(profile, threads, iterations, readers):
+    """Run the workload in this process and return its numbers"""
+    sys.path.insert(0, ROOT)
+    from sqlalchemy.exc import OperationalError
+
+    from app import create_app
+    from autoquiz.extensions import db
+    from autoquiz.models import Document, Job
+
+    app = create_app(profile)
+    app.config["JOB_WORKERS"] = 0
+    counts = {"commits": 0, "locked": 0, "reads": 0}
+    lock = threading.Lock()
+    done = threading.Event()
+
+    def commit():
+        try:
+            db.session.commit()
+            return True
+        except OperationalError as e:
+            db.session.rollback()
+            if "locked" not in str(e):
+                raise
+            with lock:
+                counts["locked"] += 1
+            return False
+
+    def writer(worker):
+        with app.app_context():
+            for iteration in range(iterations):
+                document = Document(filename=f"w{worker}-{iteration}.pdf", status=Document.PENDING)
+                db.session.add(document)
+                if not commit():
+                    continue
+                db.session.add(Job(kind="ingest", payload=json.dumps({"doc_id": document.id})))
+                ok = commit()
+                document.content = "text " * 200
+                document.status = Document.READY
+                ok = commit() and ok
+                with lock:
+                    counts["commits"] += 3 if ok else 1
+            db.session.remove()
+
+    def reader():
+        with app.app_context():
+            while not done.is_set():
+                try:
+                    Document.query.order_by(Document.id.desc()).limit(50).all()
+                    with lock:
+                        counts["reads"] += 1
+                except OperationalError:
+                    with lock:
+                        counts["locked"] += 1
+                db.session.remove()
+
+    read_threads = [threading.Thread(target=reader) for _ in range(readers)]
+    write_threads = [threading.Thread(target=writer, args=(worker,)) for worker in range(threads)]
+    for thread in read_threads:
+        thread.start()
+    start = time.perf_counter()
+    for thread in write_threads:
+        thread.start()
+    for thread in write_threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    done.set()
+    for thread in read_threads:
+        thread.join()
+
+    counts["seconds"] = elapsed
+    return counts
+
+
+def spawn(profile, threads, iterations, readers):
+    """Run one profile in a child process with its own database"""
+    data_dir = tempfile.mkdtemp(prefix="autoquiz-sqlite-")
+    env = dict(
+        os.environ,
+        DATABASE_URI=f"sqlite:///{os.path.join(data_dir, 'bench.db')}",
+        BLOB_DIR=os.path.join(data_dir, "blobs"),
+        JOB_WORKERS="0",
+    )
+    output = subprocess.run(
+        [sys.executable, __file__, "--child", profile,
+         "--threads", str(threads), "--iterations", str(iterations), "--readers", str(readers)],
+        env=env, check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--threads", type=int, nargs="+", default=[4, 16], help="writer threads")
+    parser.add_argument("--iterations", type=int, default=100, help="documents written per thread")
+    parser.add_argument("--readers", type=int, default=2, help="threads listing documents meanwhile")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(run_profile(args.child, args.threads[0], args.iterations, args.readers)))
+        return
+
+    print(f"{'threads':>7} {'profile':>12} {'commits/s':>10} {'reads/s':>8} {'locked':>7} {'seconds':>8}")
+    for threads in args.threads:
+        for profile in ("development", "production"):
+            result = spawn(profile, threads, args.iterations, args.readers)
+            print(f"{threads:>7} {profile:>12} {result['commits'] / result['seconds']:>10.1f} "
+                  f"{result['reads'] / result['seconds']:>8.1f} {result['locked']:>7} {result['seconds']:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
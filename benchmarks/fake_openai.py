@@ -0,0 +1,199 @@
+"""
+A local stand-in for the OpenAI chat completions endpoint.
+
+It answers `POST /v1/chat/completions` with a quiz in the format the service
+parses (JSON when `response_format` asks for a JSON object), with configurable
+latency, a slow tail, and error rate, and supports `stream: true`.
+Point the service at it with `OPENAI_BASE_URL=http://127.0.0.1:8765/v1`.
+
+Usage:
+    python benchmarks/fake_openai.py --port 8765 --latency 0.5 --error-rate 0.05
+"""
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+_NUM_QUESTIONS = re.compile(r"(\d+)-question")
+
+# Pieces a streamed answer is split into
+STREAM_PIECES = 20
+
+
+def build_questions(num_questions, seed):
+    """(topic, answer letter) of each question of a quiz"""
+    rng = random.Random(seed)
+    return [(rng.randrange(1_000_000), "abcd"[rng.randrange(4)]) for _ in range(num_questions)]
+
+
+def build_quiz(num_questions, seed):
+    """Quiz text in the numbered format the service's parser expects"""
+    blocks = []
+    for number, (topic, answer) in enumerate(build_questions(num_questions, seed), 1):
+        blocks.append(
+            f"{number}. What is fact {topic} of the text?\n"
+            f"   a) Option {topic}-a\n"
+            f"   b) Option {topic}-b\n"
+            f"   c) Option {topic}-c\n"
+            f"   d) Option {topic}-d\n"
+            f"   Answer: {answer})"
+        )
+    return "\n\n".join(blocks)
+
+
+def build_quiz_json(num_questions, seed):
+    """The same quiz as a JSON-mode completion"""
+    return json.dumps({"questions": [
+        {
+            "question": f"What is fact {topic} of the text?",
+            "options": [f"Option {topic}-{letter}" for letter in "abcd"],
+            "answer": answer,
+        }
+        for topic, answer in build_questions(num_questions, seed)
+    ]})
+
+
+class FakeOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        server = self.server
+        with server.lock:
+            server.requests += 1
+
+        latency = max(0.0, random.gauss(server.latency, server.latency * server.jitter))
+        if random.random() < server.slow_rate:
+            latency *= server.slow_factor
+        if random.random() < server.error_rate:
+            time.sleep(latency / 2)
+            with server.lock:
+                server.errors += 1
+            return self._send_json(server.error_status, {
+                "error": {"message": "Injected failure", "type": "server_error", "code": None}
+            }, {"Retry-After": "0"} if server.error_status == 429 else None)
+
+        prompt = " ".join(message.get("content", "") for message in body.get("messages", []))
+        match = _NUM_QUESTIONS.search(prompt)
+        json_mode = (body.get("response_format") or {}).get("type") == "json_object"
+        quiz = (build_quiz_json if json_mode else build_quiz)(int(match.group(1)) if match else 3, hash(prompt))
+
+        if body.get("stream"):
+            return self._send_stream(body, quiz, latency)
+
+        time.sleep(latency)
+        self._send_json(200, {
+            "id": "chatcmpl-fake",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "fake"),
+            "choices": [{
+                "index": 0,
+                "finish_reason": "stop",
+                "message": {"role": "assistant", "content": quiz},
+            }],
+            "usage": {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(quiz) // 4,
+                      "total_tokens": (len(prompt) + len(quiz)) // 4},
+        })
+
+    def _send_json(self, status, payload, headers=None):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_stream(self, body, quiz, latency):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        size = max(1, -(-len(quiz) // STREAM_PIECES))
+        pieces = [quiz[i:i + size] for i in range(0, len(quiz), size)]
+        for piece in pieces:
+            time.sleep(latency / len(pieces))
+            self._write_chunk("data: " + json.dumps({
+                "id": "chatcmpl-fake",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": body.get("model", "fake"),
+                "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}],
+            }) + "\n\n")
+        self._write_chunk("data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    def _write_chunk(self, text):
+        data = text.encode()
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+
+def start_server(port=0, latency=0.5, jitter=0.1, error_rate=0.0, error_status=500, slow_rate=0.0, slow_factor=10.0):
+    """
+    Start the fake server in a daemon thread
+
+    Args:
+        port (int): Port to listen on, 0 picks a free one
+        latency (float): Mean seconds per completion
+        jitter (float): Standard deviation of the latency, relative to it
+        error_rate (float): Fraction of requests answered with error_status
+        error_status (int): HTTP status of injected failures
+        slow_rate (float): Fraction of requests that take slow_factor times longer
+        slow_factor (float): Latency multiplier of slow requests
+
+    Returns:
+        ThreadingHTTPServer: The server; its base URL is `base_url(server)`
+    """
+    server = ThreadingHTTPServer(("127.0.0.1", port), FakeOpenAIHandler)
+    server.daemon_threads = True
+    server.latency = latency
+    server.jitter = jitter
+    server.error_rate = error_rate
+    server.error_status = error_status
+    server.slow_rate = slow_rate
+    server.slow_factor = slow_factor
+    server.lock = threading.Lock()
+    server.requests = 0
+    server.errors = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def base_url(server):
+    """OPENAI_BASE_URL for a started server"""
+    return f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.5, help="mean seconds per completion")
+    parser.add_argument("--jitter", type=float, default=0.1, help="latency standard deviation, relative")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests that fail")
+    parser.add_argument("--error-status", type=int, default=500, help="HTTP status of failed requests")
+    parser.add_argument("--slow-rate", type=float, default=0.0, help="fraction of requests that are slow")
+    parser.add_argument("--slow-factor", type=float, default=10.0, help="latency multiplier of slow requests")
+    args = parser.parse_args()
+
+    server = start_server(args.port, args.latency, args.jitter, args.error_rate, args.error_status,
+                          args.slow_rate, args.slow_factor)
+    print(f"Fake OpenAI listening on {base_url(server)}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Minimal PDF writer used by the benchmarks to build large documents
+without any third-party dependency.
+"""
+import random
+
+WORDS = (
+    "energy cell membrane protein reaction system model theory process "
+    "structure function analysis data method result force motion heat "
+    "light wave particle equation value chapter section example problem"
+).split()
+
+
+def _page_lines(page_number, lines_per_page, rng):
+    lines = [f"Course Notes - Page {page_number}"]
+    for _ in range(lines_per_page):
+        lines.append(" ".join(rng.choice(WORDS) for _ in range(12)))
+    return lines
+
+
+def _escape(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def build_pdf(page_count, lines_per_page=40, seed=0, page_text=None):
+    """
+    Build a text-only PDF in memory
+
+    Args:
+        page_count (int): Number of pages
+        lines_per_page (int): Lines of random words per page
+        seed (int): Seed for the word generator
+        page_text (dict): Optional page number -> list of lines overrides
+
+    Returns:
+        bytes: The PDF file
+    """
+    rng = random.Random(seed)
+    objects = []
+
+    def add(body):
+        objects.append(body)
+        return len(objects)
+
+    font_id = add(b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+    pages_id = add(None)  # filled in once the kids are known
+    page_ids = []
+    for number in range(1, page_count + 1):
+        lines = (page_text or {}).get(number) or _page_lines(number, lines_per_page, rng)
+        ops = ["BT", "/F1 10 Tf", "12 TL", "50 750 Td"]
+        ops += [f"({_escape(line)}) '" for line in lines]
+        ops.append("ET")
+        stream = "\n".join(ops).encode("latin-1")
+        content_id = add(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        page_ids.append(add(
+            b"<< /Type /Page /Parent %d 0 R /MediaBox [0 0 612 792] "
+            b"/Resources << /Font << /F1 %d 0 R >> >> /Contents %d 0 R >>"
+            % (pages_id, font_id, content_id)
+        ))
+    kids = b" ".join(b"%d 0 R" % page_id for page_id in page_ids)
+    objects[pages_id - 1] = b"<< /Type /Pages /Kids [%s] /Count %d >>" % (kids, len(page_ids))
+    catalog_id = add(b"<< /Type /Catalog /Pages %d 0 R >>" % pages_id)
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (
+        len(objects) + 1, catalog_id, xref
+    )
+    return bytes(out)
+
+
+def write_pdf(path, page_count, **kwargs):
+    """Write a synthetic PDF to `path`"""
+    with open(path, "wb") as f:
+        f.write(build_pdf(page_count, **kwargs))
+    return path
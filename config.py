@@ -4,6 +4,8 @@ class Config:
     """Base configuration"""
     SECRET_KEY = os.getenv('SECRET_KEY', 'dev-key-change-in-production')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # PRAGMAs run on every new SQLite connection (see autoquiz/utils/sqlite.py)
+    SQLITE_PRAGMAS = {}
     
 class DevelopmentConfig(Config):
     """Development configuration"""
@@ -19,6 +21,22 @@ class ProductionConfig(Config):
     """Production configuration"""
     DEBUG = False
     SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URI', 'sqlite:///autoquiz.db')
+    # WAL lets reads run while a write is in progress, and writers wait up to
+    # busy_timeout ms for the lock instead of failing with "database is locked".
+    # synchronous=NORMAL is durable in WAL mode except on power loss.
+    SQLITE_PRAGMAS = {
+        'busy_timeout': int(os.getenv('SQLITE_BUSY_TIMEOUT', '15000')),
+        'journal_mode': 'WAL',
+        'synchronous': 'NORMAL',
+        'mmap_size': int(os.getenv('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024))),
+    }
+    # Keep connections open so the pragmas run once per connection; size the
+    # pool for the request threads plus JOB_WORKERS of one process
+    SQLALCHEMY_ENGINE_OPTIONS = {
+        'pool_size': int(os.getenv('DB_POOL_SIZE', '12')),
+        'max_overflow': int(os.getenv('DB_MAX_OVERFLOW', '8')),
+        'pool_timeout': 30,
+    }
     
 # Configuration dictionary
 config = {
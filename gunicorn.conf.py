@@ -0,0 +1,24 @@
+# Gunicorn settings for `gunicorn -c gunicorn.conf.py wsgi:app`
+import multiprocessing
+import os
+
+bind = os.getenv('BIND', '0.0.0.0:5000')
+
+# Worker processes, each serving `threads` requests at once. Quiz requests
+# mostly wait on OpenAI, so threads are cheap; SQLite writes from all
+# workers are serialized by the database (WAL + busy_timeout)
+workers = int(os.getenv('WEB_CONCURRENCY', str(min(4, multiprocessing.cpu_count() * 2))))
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', '8'))
+
+# Load the app in the master before forking (see APP_PRELOAD in wsgi.py):
+# workers start without importing anything and share the master's memory
+preload_app = os.getenv('APP_PRELOAD', 'false').lower() == 'true'
+
+# Quiz generation and streamed responses can take well over the default 30s
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '120'))
+graceful_timeout = 30
+keepalive = 5
+
+accesslog = '-'
+errorlog = '-'
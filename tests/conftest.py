@@ -0,0 +1,56 @@
+import io
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, ROOT)
+# Synthetic PDFs and the fake OpenAI server are shared with the benchmarks
+sys.path.insert(0, os.path.join(ROOT, 'benchmarks'))
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    """An app on an empty database, extracting uploads during the request and without job workers"""
+    from config import TestingConfig
+    monkeypatch.setattr(TestingConfig, 'SQLALCHEMY_DATABASE_URI', f"sqlite:///{tmp_path / 'test.db'}")
+    monkeypatch.setenv('BLOB_DIR', str(tmp_path / 'blobs'))
+    monkeypatch.setenv('JOB_WORKERS', '0')
+    monkeypatch.setenv('INGEST_ASYNC', 'false')
+
+    from app import create_app
+    app = create_app('testing')
+    with app.app_context():
+        yield app
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def fake_openai(app):
+    """The fake OpenAI server, answering at once, with the app's client pointed at it"""
+    from fake_openai import base_url, start_server
+    server = start_server(0, latency=0.0, jitter=0.0)
+    llm = app.extensions['llm']
+    llm.base_url = base_url(server)
+    llm.api_key = 'test'
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def upload(client):
+    """Upload a synthetic PDF and return the new document's ID"""
+    from synthetic_pdf import build_pdf
+
+    def upload(pages=4, filename='test.pdf', **kwargs):
+        response = client.post('/api/documents', data={'file': (io.BytesIO(build_pdf(pages, **kwargs)), filename)},
+                               content_type='multipart/form-data')
+        assert response.status_code == 201, response.json
+        return response.json['id']
+    return upload
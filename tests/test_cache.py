@@ -0,0 +1,78 @@
+import datetime
+
+from autoquiz.extensions import db
+from autoquiz.models import CachedQuiz, Document
+from autoquiz.utils import cache as cache_module
+from autoquiz.utils.cache import QuizCache
+
+QUIZ = [{'question': 'Q?', 'options': ['a', 'b'], 'answer': 'a'}]
+
+
+def durable_keys():
+    return {row.key for row in CachedQuiz.query.all()}
+
+
+def test_durable_tier_is_shared_between_instances(app):
+    QuizCache().set('k', QUIZ)
+
+    other = QuizCache()
+    assert other.get('k') == QUIZ
+    assert (other.durable_hits, other.misses) == (1, 0)
+    assert other.get('k') == QUIZ
+    assert other.memory_hits == 1
+    assert other.get('missing') is None
+    assert other.stats()['durable_entries'] == 1
+
+
+def test_expired_durable_entry_is_deleted(app):
+    cache = QuizCache(ttl=60)
+    cache.set('k', QUIZ)
+    reader = QuizCache(ttl=60)
+    reader._now = lambda: datetime.datetime.utcnow() + datetime.timedelta(seconds=120)
+
+    assert reader.get('k') is None
+    assert durable_keys() == set()
+
+
+def test_cache_leaves_the_callers_session_alone(app):
+    document = Document(filename='pending.pdf')
+    db.session.add(document)
+
+    cache = QuizCache()
+    cache.set('k', QUIZ)
+    assert QuizCache().get('k') == QUIZ
+    cache.clear()
+
+    assert document in db.session.new
+    db.session.rollback()
+    assert Document.query.count() == 0
+
+
+def test_eviction_keeps_the_most_recently_used(app, monkeypatch):
+    monkeypatch.setattr(cache_module, 'EVICT_EVERY', 1)
+    clock = [datetime.datetime(2026, 1, 1)]
+    cache = QuizCache(max_entries=0, durable_max_entries=3)
+    cache._now = lambda: clock[0]
+
+    def tick():
+        clock[0] += datetime.timedelta(seconds=1)
+
+    for key in 'abc':
+        cache.set(key, QUIZ)
+        tick()
+    assert cache.get('a') == QUIZ  # now more recently used than b and c
+    tick()
+    cache.set('d', QUIZ)
+
+    assert durable_keys() == {'a', 'c', 'd'}
+
+
+def test_eviction_runs_every_few_writes(app, monkeypatch):
+    monkeypatch.setattr(cache_module, 'EVICT_EVERY', 4)
+    cache = QuizCache(durable_max_entries=2)
+
+    for key in 'abc':
+        cache.set(key, QUIZ)
+    assert len(durable_keys()) == 3
+    cache.set('d', QUIZ)
+    assert len(durable_keys()) == 2
@@ -0,0 +1,49 @@
+import json
+import os
+import subprocess
+import sys
+
+from conftest import ROOT
+
+# Generous bounds on create_app() (about 0.7s and 60MB today), so a busy CI
+# machine stays within them; importing the heavy modules too takes ~100MB
+MAX_STARTUP_SECONDS = 5.0
+MAX_STARTUP_RSS_MB = 90
+
+COLD_START = """
+import json, resource, sys, time
+
+
+def peak_rss_mb():
+    # ru_maxrss keeps the peak of the forking (pytest) process across exec, VmHWM does not
+    try:
+        with open('/proc/self/status') as f:
+            return next(int(line.split()[1]) for line in f if line.startswith('VmHWM:')) / 1024
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+start = time.perf_counter()
+from app import create_app
+app = create_app('production')
+seconds = time.perf_counter() - start
+app.test_client().get('/api/documents')
+print(json.dumps({
+    'heavy': sorted(name for name in ('openai', 'httpx', 'pdfplumber', 'numpy') if name in sys.modules),
+    'seconds': seconds,
+    'rss_mb': peak_rss_mb(),
+}))
+"""
+
+
+def test_production_app_starts_quickly_without_heavy_modules(tmp_path):
+    env = dict(os.environ, DATABASE_URI=f"sqlite:///{tmp_path / 'cold.db'}", BLOB_DIR=str(tmp_path / 'blobs'),
+               JOB_WORKERS='0')
+    env.pop('APP_PRELOAD', None)
+    result = subprocess.run([sys.executable, '-c', COLD_START], cwd=ROOT, env=env, capture_output=True, text=True,
+                            timeout=60)
+    assert result.returncode == 0, result.stderr
+    stats = json.loads(result.stdout.splitlines()[-1])
+    assert stats['heavy'] == []
+    assert stats['seconds'] < MAX_STARTUP_SECONDS, stats
+    assert stats['rss_mb'] < MAX_STARTUP_RSS_MB, stats
@@ -0,0 +1,29 @@
+from autoquiz.models import Document
+from autoquiz.utils.compaction import compact_pages, compact_text
+
+
+def slide(number):
+    return [f'Region {number} results', f'Revenue grew {10 + number}% in Q{number}', f'Margin {20 + number}%']
+
+
+def test_running_headers_and_page_numbers_are_stripped():
+    pages = [f'Course Notes - Page {n}\nBody line {n} about cells\nmore body text\n- {n} -' for n in range(1, 5)]
+
+    assert compact_pages(pages) == [f'Body line {n} about cells\nmore body text' for n in range(1, 5)]
+
+
+def test_short_pages_keep_their_middle_line():
+    pages = [f'Cell Biology\nMitochondria make ATP in step {n} of respiration\n{n}' for n in range(1, 5)]
+
+    assert compact_pages(pages) == [f'Mitochondria make ATP in step {n} of respiration' for n in range(1, 5)]
+
+
+def test_slides_from_one_template_keep_their_text(upload):
+    slides = {number: slide(number) for number in range(1, 7)}
+    doc_id = upload(pages=6, page_text=slides)
+
+    document = Document.query.get(doc_id)
+    assert document.compact_content == compact_text(document.content)
+    for lines in slides.values():
+        for line in lines:
+            assert line in document.compact_content
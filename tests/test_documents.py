@@ -0,0 +1,168 @@
+import datetime
+import hashlib
+import io
+import os
+
+import pytest
+from sqlalchemy import text
+
+from autoquiz.extensions import db
+from autoquiz.models import Document, Quiz
+from autoquiz.routes import documents
+from autoquiz.routes.documents import content_disposition
+from autoquiz.utils.blobstore import get_blob_store
+from autoquiz.utils.uploads import HashingSpool
+from synthetic_pdf import build_pdf
+
+
+@pytest.mark.parametrize('filename, expected', [
+    ('notes.pdf', 'attachment; filename=notes.pdf'),
+    ('my "notes".pdf', 'attachment; filename="my \\"notes\\".pdf"'),
+    ('Résumé.pdf', "attachment; filename=Resume.pdf; filename*=UTF-8''R%C3%A9sum%C3%A9.pdf"),
+    ('a\r\nSet-Cookie: x=1.pdf', 'attachment; filename="aSet-Cookie: x=1.pdf"'),
+])
+def test_content_disposition(filename, expected):
+    assert content_disposition(filename) == expected
+
+
+def test_download_keeps_unicode_filename(client):
+    response = client.post('/api/documents', data={'file': (io.BytesIO(build_pdf(2)), 'Überblick.pdf')},
+                           content_type='multipart/form-data')
+    assert response.status_code == 201, response.json
+
+    response = client.get(f"/api/documents/{response.json['id']}/file")
+    assert response.status_code == 200
+    assert response.headers['Content-Disposition'] == \
+        "attachment; filename=Uberblick.pdf; filename*=UTF-8''%C3%9Cberblick.pdf"
+
+
+def test_replacing_a_page_keeps_quizzes_of_unchanged_text(client, fake_openai, upload):
+    topic_page = {2: ['photosynthesis turns light into chemical energy'] * 10}
+    doc_id = upload(page_text=topic_page)
+    whole = client.get(f'/api/quiz/document/{doc_id}')
+    topic = client.get(f'/api/quiz/document/{doc_id}?topic=photosynthesis')
+    assert whole.status_code == topic.status_code == 200
+
+    revised = build_pdf(4, page_text={**topic_page, 4: ['a revised last page'] * 10})
+    response = client.put(f'/api/documents/{doc_id}', data={'file': (io.BytesIO(revised), 'test.pdf')},
+                          content_type='multipart/form-data')
+    assert response.status_code in (200, 202), response.json
+
+    assert Quiz.query.get(whole.json['id']) is None
+    assert Quiz.query.get(topic.json['id']) is not None
+
+
+def test_sync_upload_of_a_corrupt_pdf_fails(client, upload):
+    corrupt = b'%PDF-1.4\n' + b'\x00garbage' * 100
+    response = client.post('/api/documents', data={'file': (io.BytesIO(corrupt), 'broken.pdf')},
+                           content_type='multipart/form-data')
+    assert response.status_code == 422
+    assert response.json['status'] == 'failed'
+    assert response.json['error']
+
+    # Uploading the same bytes again retries the extraction, and fails again
+    response = client.post('/api/documents', data={'file': (io.BytesIO(corrupt), 'broken.pdf')},
+                           content_type='multipart/form-data')
+    assert response.status_code == 422
+
+    doc_id = upload()
+    response = client.put(f'/api/documents/{doc_id}', data={'file': (io.BytesIO(corrupt), 'broken.pdf')},
+                          content_type='multipart/form-data')
+    assert response.status_code == 422
+    assert response.json['status'] == 'failed'
+
+
+def post_pdf(client, data, filename='test.pdf'):
+    return client.post('/api/documents', data={'file': (io.BytesIO(data), filename)},
+                       content_type='multipart/form-data')
+
+
+def spool_files(app):
+    spool_dir = app.config['UPLOAD_SPOOL_DIR']
+    return os.listdir(spool_dir) if os.path.isdir(spool_dir) else []
+
+
+def test_spool_hashes_what_it_buffers(tmp_path):
+    data = os.urandom(10000)
+    with HashingSpool(max_memory=4096, spool_dir=str(tmp_path)) as spool:
+        for start in range(0, len(data), 3000):
+            spool.write(data[start:start + 3000])
+        assert spool.on_disk
+        assert spool.hexdigest() == hashlib.sha256(data).hexdigest()
+        spool.seek(0)
+        assert spool.read() == data
+    assert os.listdir(tmp_path) == []
+
+
+def test_streamed_upload_hash_matches_the_file(app, client):
+    app.config['UPLOAD_SPOOL_MEMORY'] = 1024
+    data = build_pdf(8)
+
+    response = post_pdf(client, data)
+    assert response.status_code == 201, response.json
+
+    content_hash = Document.query.get(response.json['id']).content_hash
+    assert content_hash == hashlib.sha256(data).hexdigest()
+    with open(get_blob_store().path_for(content_hash), 'rb') as f:
+        assert f.read() == data
+    assert spool_files(app) == []
+
+
+def test_upload_over_the_limit_is_rejected(app, client):
+    data = build_pdf(8)
+    app.config['MAX_CONTENT_LENGTH'] = len(data) // 2
+
+    assert post_pdf(client, data).status_code == 413
+    assert Document.query.count() == 0
+    assert spool_files(app) == []
+
+
+def test_spool_file_is_removed_when_the_upload_fails(app, client, monkeypatch):
+    app.config['UPLOAD_SPOOL_MEMORY'] = 1024
+    spooled = []
+
+    def failing_digest(uploaded_file):
+        spooled.append(uploaded_file.stream.on_disk and spool_files(app))
+        raise OSError('disk full')
+
+    monkeypatch.setattr(documents, 'upload_digest', failing_digest)
+    response = post_pdf(client, build_pdf(8))
+
+    assert response.status_code == 500
+    assert len(spooled[0]) == 1
+    assert spool_files(app) == []
+
+
+def test_listing_pages_through_upload_order(app, client):
+    # Same upload time for several documents: the id breaks the tie
+    same_time = datetime.datetime(2026, 1, 1)
+    dates = [same_time, same_time, same_time, datetime.datetime(2025, 6, 1), datetime.datetime(2026, 3, 1)]
+    for number, upload_date in enumerate(dates):
+        db.session.add(Document(filename=f'{number}.pdf', upload_date=upload_date, status=Document.READY))
+    db.session.commit()
+    expected = [doc.id for doc in sorted(Document.query.all(), key=lambda doc: (doc.upload_date, doc.id))]
+
+    seen, cursor, pages = [], None, 0
+    while True:
+        response = client.get('/api/documents', query_string={'limit': 2, **({'cursor': cursor} if cursor else {})})
+        assert response.status_code == 200
+        seen += [doc['id'] for doc in response.json['documents']]
+        pages += 1
+        cursor = response.json['next_cursor']
+        if cursor is None:
+            break
+
+    assert seen == expected
+    assert pages == 3
+    assert client.get('/api/documents?cursor=not-a-cursor').status_code == 400
+
+
+def test_listing_query_uses_the_upload_date_index(app):
+    plan = db.session.execute(text(
+        'EXPLAIN QUERY PLAN SELECT id FROM documents WHERE (upload_date, id) > (:upload_date, :id) '
+        'ORDER BY upload_date, id LIMIT 3'
+    ), {'upload_date': datetime.datetime(2026, 1, 1), 'id': 1}).fetchall()
+
+    details = ' '.join(row[-1] for row in plan)
+    assert 'ix_documents_upload_date_id' in details
+    assert 'TEMP B-TREE' not in details
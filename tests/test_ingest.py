@@ -0,0 +1,79 @@
+import io
+
+import pytest
+from sqlalchemy import text
+
+from autoquiz.extensions import db
+from autoquiz.models import Document, Quiz
+from autoquiz.utils import ingest, search
+from synthetic_pdf import build_pdf
+
+PAGES = 12
+CHANGED_PAGE = 5
+
+
+def changed_page(words):
+    return {CHANGED_PAGE: [f'{words} in the revised chapter of the course'] * 10}
+
+
+def chunk_ids_by_page(doc_id):
+    rows = db.session.execute(
+        text('SELECT page_number, id FROM document_chunks WHERE document_id = :id ORDER BY id'), {'id': doc_id}
+    )
+    pages = {}
+    for page_number, chunk_id in rows:
+        pages.setdefault(page_number, []).append(chunk_id)
+    return pages
+
+
+@pytest.fixture
+def spies(monkeypatch):
+    """Record the pages handed to extraction and the search index updates"""
+    calls = {'extracted': [], 'updates': []}
+    iter_pdf_pages = ingest.iter_pdf_pages
+    update_pages = search.update_pages
+
+    def recording_iter_pdf_pages(file_path, **kwargs):
+        calls['extracted'].append(kwargs.get('pages'))
+        return iter_pdf_pages(file_path, **kwargs)
+
+    def recording_update_pages(document_id, removed=(), moved=None, added=()):
+        calls['updates'].append((list(removed), dict(moved or {}), [page_number for page_number, _ in added]))
+        return update_pages(document_id, removed, moved, added)
+
+    monkeypatch.setattr(ingest, 'iter_pdf_pages', recording_iter_pdf_pages)
+    monkeypatch.setattr(search, 'update_pages', recording_update_pages)
+    return calls
+
+
+def test_changed_page_is_the_only_one_extracted_and_indexed(client, fake_openai, upload, spies):
+    # The changed page is given explicitly in both files, so the other pages are the same
+    doc_id = upload(pages=PAGES, page_text=changed_page('photosynthesis'))
+    chunks_before = chunk_ids_by_page(doc_id)
+    quiz = client.get(f'/api/quiz/document/{doc_id}')
+    assert quiz.status_code == 200
+    requests_before = fake_openai.requests
+
+    revised = build_pdf(PAGES, page_text=changed_page('respiration'))
+    response = client.put(f'/api/documents/{doc_id}', data={'file': (io.BytesIO(revised), 'test.pdf')},
+                          content_type='multipart/form-data')
+    assert response.status_code in (200, 202), response.json
+
+    assert spies['extracted'][-1] == [CHANGED_PAGE]
+    assert spies['updates'] == [([CHANGED_PAGE], {}, [CHANGED_PAGE])]
+    chunks_after = chunk_ids_by_page(doc_id)
+    assert chunks_after.keys() == chunks_before.keys()
+    assert {page: ids for page, ids in chunks_after.items() if page != CHANGED_PAGE} == \
+        {page: ids for page, ids in chunks_before.items() if page != CHANGED_PAGE}
+    assert chunks_after[CHANGED_PAGE] != chunks_before[CHANGED_PAGE]
+
+    document = Document.query.get(doc_id)
+    assert 'respiration' in document.compact_content and 'photosynthesis' not in document.compact_content
+
+    # The stored quiz is gone, and the cache does not serve it for the new text
+    assert Quiz.query.get(quiz.json['id']) is None
+    requiz = client.get(f'/api/quiz/document/{doc_id}')
+    assert requiz.status_code == 200
+    assert requiz.json['created_at'] != quiz.json['created_at']
+    assert fake_openai.requests > requests_before
+
@@ -0,0 +1,88 @@
+import datetime
+import threading
+import time
+
+from autoquiz.extensions import db
+from autoquiz.models import Job
+from autoquiz.utils.jobs import JobQueue, job_handler
+
+STARTED = threading.Event()
+RELEASE = threading.Event()
+RUNS = []
+
+
+@job_handler('test_slow')
+def slow_job(payload):
+    RUNS.append(payload['n'])
+    STARTED.set()
+    RELEASE.wait(10)
+    return payload['n']
+
+
+def add_running_job(started_ago, lease_in):
+    now = datetime.datetime.utcnow()
+    job = Job(kind='test_slow', payload='{"n": 0}', status=Job.RUNNING,
+              started_at=now - datetime.timedelta(seconds=started_ago),
+              lease_expires_at=None if lease_in is None else now + datetime.timedelta(seconds=lease_in))
+    db.session.add(job)
+    db.session.commit()
+    return job.id
+
+
+def status(job_id):
+    db.session.expire_all()
+    return Job.query.get(job_id).status
+
+
+def test_only_jobs_with_an_expired_lease_are_requeued(app):
+    queue = JobQueue(app, workers=0, stale_after=60)
+    alive = add_running_job(started_ago=3600, lease_in=30)
+    expired = add_running_job(started_ago=3600, lease_in=-1)
+    legacy_recent = add_running_job(started_ago=10, lease_in=None)
+    legacy_stale = add_running_job(started_ago=120, lease_in=None)
+
+    assert queue.requeue_stale() == 2
+    assert [status(job_id) for job_id in (alive, expired, legacy_recent, legacy_stale)] == [
+        Job.RUNNING, Job.QUEUED, Job.RUNNING, Job.QUEUED
+    ]
+
+
+def test_long_job_keeps_its_lease_and_runs_once(app):
+    STARTED.clear()
+    RELEASE.clear()
+    RUNS.clear()
+    queue = JobQueue(app, workers=2, poll_interval=0.05, stale_after=0.4)
+    # A second queue stands for another process sharing the table
+    other = JobQueue(app, workers=1, poll_interval=0.05, stale_after=0.4)
+    try:
+        job_id = queue.enqueue('test_slow', {'n': 1}).id
+        assert STARTED.wait(5)
+        other.start()
+        # Several lease lengths: without renewals the job would be requeued and run again
+        time.sleep(1.5)
+        assert status(job_id) == Job.RUNNING
+        assert RUNS == [1]
+    finally:
+        RELEASE.set()
+        queue.stop(5)
+        other.stop(5)
+    assert status(job_id) == Job.SUCCEEDED
+    assert Job.query.get(job_id).lease_expires_at is None
+
+
+def test_expired_job_is_picked_up_by_a_running_worker(app):
+    RELEASE.set()
+    RUNS.clear()
+    queue = JobQueue(app, workers=1, poll_interval=0.05, stale_after=0.2)
+    queue.start()
+    try:
+        # Claimed by a process that died; the worker is already polling
+        time.sleep(0.3)
+        job_id = add_running_job(started_ago=5, lease_in=-1)
+        deadline = time.monotonic() + 5
+        while status(job_id) != Job.SUCCEEDED and time.monotonic() < deadline:
+            time.sleep(0.05)
+    finally:
+        queue.stop(5)
+    assert status(job_id) == Job.SUCCEEDED
+    assert RUNS == [0]
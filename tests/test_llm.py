@@ -0,0 +1,156 @@
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from types import SimpleNamespace
+
+import httpx
+import openai
+import pytest
+
+from autoquiz.utils.llm import CircuitBreaker, LLMClient, LLMUnavailableError
+
+REQUEST = httpx.Request('POST', 'http://upstream.test/v1/chat/completions')
+
+
+class FakeCompletions:
+    """Stands in for client.chat.completions; each call runs the next behaviour"""
+
+    def __init__(self, *behaviours):
+        self.behaviours = list(behaviours)
+        self.timeouts = []
+        self._lock = threading.Lock()
+
+    def create(self, timeout=None, **kwargs):
+        with self._lock:
+            self.timeouts.append(timeout)
+            behaviour = self.behaviours[min(len(self.timeouts), len(self.behaviours)) - 1]
+        return behaviour(timeout)
+
+
+def answer(name, after=0.0):
+    def behaviour(timeout):
+        time.sleep(after)
+        return SimpleNamespace(name=name, usage=None)
+    return behaviour
+
+
+def time_out(timeout):
+    time.sleep(timeout)
+    raise openai.APITimeoutError(request=REQUEST)
+
+
+def fail(timeout):
+    raise openai.APIConnectionError(request=REQUEST)
+
+
+class BusyExecutor:
+    """Runs the first attempt and leaves the others queued, as when every attempt thread is busy"""
+
+    def __init__(self):
+        self.threads = ThreadPoolExecutor(1)
+        self.started = False
+        self.queued = []
+
+    def submit(self, fn, *args):
+        if self.started:
+            future = Future()
+            self.queued.append(future)
+            return future
+        self.started = True
+        return self.threads.submit(fn, *args)
+
+    def shutdown(self, wait=True):
+        self.threads.shutdown(wait=wait)
+
+
+def make_client(completions, **kwargs):
+    kwargs.setdefault('hedge_after', 'off')
+    client = LLMClient(api_key='test', **kwargs)
+    client._client = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+    return client
+
+
+def test_breaker_opens_after_failures_and_closes_after_a_trial():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.1)
+    assert breaker.state == CircuitBreaker.CLOSED
+
+    for _ in range(2):
+        assert breaker.allow()
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+    time.sleep(0.15)
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.allow()
+    assert not breaker.allow()  # one trial call at a time
+
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow()
+
+
+def test_failed_trial_opens_the_breaker_again():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.1)
+    breaker.allow()
+    breaker.record_failure()
+    time.sleep(0.15)
+
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+
+def test_open_breaker_rejects_calls_without_calling_upstream():
+    completions = FakeCompletions(fail)
+    client = make_client(completions, max_retries=0, breaker_failures=2, breaker_reset=60)
+
+    for _ in range(2):
+        with pytest.raises(openai.APIConnectionError):
+            client.chat_completion(model='test', messages=[])
+    with pytest.raises(LLMUnavailableError):
+        client.chat_completion(model='test', messages=[])
+    assert len(completions.timeouts) == 2
+
+
+def test_hedge_answers_a_slow_call():
+    completions = FakeCompletions(answer('primary', after=1.0), answer('hedge'))
+    client = make_client(completions, hedge_after=0.05)
+
+    start = time.monotonic()
+    assert client.chat_completion(model='test', messages=[]).name == 'hedge'
+    assert time.monotonic() - start < 0.5
+    # Earned hedge_ratio for the call, spent one on the hedge
+    assert client._hedge_credit == pytest.approx(0.2)
+
+
+def test_unsent_hedge_is_cancelled_and_its_credit_returned():
+    completions = FakeCompletions(answer('primary', after=0.2), answer('hedge'))
+    client = make_client(completions, hedge_after=0.05)
+    client._executor = BusyExecutor()
+
+    assert client.chat_completion(model='test', messages=[]).name == 'primary'
+    assert [future.cancelled() for future in client._executor.queued] == [True]
+    assert len(completions.timeouts) == 1
+    assert client._hedge_credit == pytest.approx(1.2)
+
+
+def test_deadline_bounds_attempts_and_retries():
+    completions = FakeCompletions(time_out)
+    client = make_client(completions, timeout=10, max_retries=5, backoff_base=0.0, deadline=0.3)
+
+    start = time.monotonic()
+    with pytest.raises(openai.APITimeoutError):
+        client.chat_completion(model='test', messages=[])
+    assert time.monotonic() - start < 0.6
+    assert all(timeout <= 0.3 for timeout in completions.timeouts)
+
+
+def test_expired_deadline_makes_no_call():
+    completions = FakeCompletions(answer('late'))
+    client = make_client(completions)
+
+    with pytest.raises(LLMUnavailableError):
+        client._hedged_attempt({}, time.monotonic() - 1)
+    assert completions.timeouts == []
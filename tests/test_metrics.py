@@ -0,0 +1,27 @@
+from autoquiz.utils.metrics import REQUEST_SECONDS
+
+
+def observed(endpoint, method='POST', status=200):
+    """(count, total seconds) of the request latency histogram for one label set"""
+    state = REQUEST_SECONDS._values.get((method, endpoint, status))
+    if state is None:
+        return 0, 0.0
+    counts, total = state
+    return sum(counts), total
+
+
+def test_streamed_response_is_timed_until_it_is_closed(client, fake_openai):
+    fake_openai.latency = 0.5
+    before_count, before_total = observed('/api/quiz/stream')
+
+    response = client.post('/api/quiz/stream', json={'text': 'Cells turn glucose into ATP. ' * 20,
+                                                     'num_questions': 2})
+    assert response.status_code == 200
+    # Only the headers have been produced so far
+    assert observed('/api/quiz/stream') == (before_count, before_total)
+
+    assert b'event: done' in response.get_data()
+    response.close()
+    count, total = observed('/api/quiz/stream')
+    assert count == before_count + 1
+    assert total - before_total >= 0.4
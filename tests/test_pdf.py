@@ -0,0 +1,109 @@
+import signal
+import threading
+import time
+
+import pytest
+
+from autoquiz.utils import pdf
+from synthetic_pdf import write_pdf
+
+SLOW_PAGE = 3
+
+
+@pytest.fixture
+def pdf_file(tmp_path):
+    def make(pages):
+        path = str(tmp_path / f'{pages}.pdf')
+        write_pdf(path, pages, seed=pages)
+        return path
+    return make
+
+
+@pytest.fixture
+def fresh_pools():
+    pdf.shutdown_pools()
+    yield
+    pdf.shutdown_pools()
+
+
+@pytest.fixture
+def slow_page(monkeypatch, fresh_pools):
+    """Make SLOW_PAGE take `seconds`; with `block_alarm` the page can't be interrupted by SIGALRM"""
+    # Forked pool workers see the patched function, forkserver ones would not
+    monkeypatch.setattr(pdf, 'POOL_START_METHOD', 'fork')
+
+    def patch(seconds, block_alarm=False):
+        extract_page = pdf._extract_page
+
+        def slow_extract(page):
+            if page.page_number == SLOW_PAGE:
+                if block_alarm:
+                    signal.pthread_sigmask(signal.SIG_BLOCK, {signal.SIGALRM})
+                time.sleep(seconds)
+            return extract_page(page)
+
+        monkeypatch.setattr(pdf, '_extract_page', slow_extract)
+    return patch
+
+
+def extract(path, **kwargs):
+    start = time.perf_counter()
+    pages = list(pdf.iter_pdf_pages(path, **kwargs))
+    return pages, time.perf_counter() - start
+
+
+def assert_only_slow_page_failed(pages, count):
+    assert [page.page_number for page in pages] == list(range(1, count + 1))
+    failed = [page.page_number for page in pages if page.error]
+    assert failed == [SLOW_PAGE]
+    assert all(page.text for page in pages if page.page_number != SLOW_PAGE)
+
+
+@pytest.mark.parametrize('page_count, workers', [(4, 4), (24, 1), (24, 2)])
+def test_slow_page_times_out(pdf_file, slow_page, page_count, workers):
+    slow_page(8)
+    pages, seconds = extract(pdf_file(page_count), workers=workers, page_timeout=2)
+
+    assert_only_slow_page_failed(pages, page_count)
+    assert seconds < 8
+
+
+def test_slow_page_times_out_off_the_main_thread(pdf_file, slow_page):
+    slow_page(8)
+    path = pdf_file(4)
+    outcome = {}
+    thread = threading.Thread(target=lambda: outcome.update(zip(('pages', 'seconds'), extract(path, workers=1,
+                                                                                             page_timeout=2))))
+    thread.start()
+    thread.join()
+
+    assert_only_slow_page_failed(outcome['pages'], 4)
+    assert outcome['seconds'] < 8
+
+
+def test_stuck_range_is_retried_page_by_page(pdf_file, slow_page):
+    slow_page(10, block_alarm=True)
+    pages, seconds = extract(pdf_file(8), workers=2, page_timeout=1, pages_per_task=2)
+
+    assert_only_slow_page_failed(pages, 8)
+    assert seconds < 10
+
+
+def test_pools_are_reused_between_extractions(pdf_file, fresh_pools):
+    path = pdf_file(16)
+    first, _ = extract(path, workers=2, pages_per_task=8)
+    (pool,) = pdf._idle_pools[2]
+    second, _ = extract(path, workers=2, pages_per_task=8)
+
+    assert pdf._idle_pools[2] == [pool]
+    assert pool._ctx.get_start_method() == pdf.POOL_START_METHOD == 'forkserver'
+    assert [page.text for page in first] == [page.text for page in second]
+    assert all(page.text for page in first)
+
+
+def test_single_range_is_extracted_in_process(pdf_file, fresh_pools, monkeypatch):
+    monkeypatch.setattr(pdf, '_checkout_pool', lambda workers: pytest.fail('started a pool'))
+    pages, _ = extract(pdf_file(4), workers=4)
+
+    assert [page.page_number for page in pages] == [1, 2, 3, 4]
+    assert pdf._idle_pools == {}
@@ -0,0 +1,96 @@
+import numpy as np
+import pytest
+
+from autoquiz.extensions import db
+from autoquiz.models import BankQuestion, Document
+from autoquiz.utils.question_bank import get_question_bank
+
+
+def question(subject, answer):
+    return {'question': f'What is the main export of {subject}?', 'options': [answer, 'Tin', 'Wool', 'Salt'],
+            'answer': answer}
+
+
+@pytest.fixture
+def bank(app):
+    bank = get_question_bank()
+    loads = []
+    load = bank._load
+
+    def recording_load(conn, document_id, after=None):
+        loads.append(after)
+        return load(conn, document_id, after)
+
+    bank._load = recording_load
+    bank.loads = loads
+    return bank
+
+
+def insert_elsewhere(bank, document_id, questions):
+    """Insert questions over a connection of their own, as another process would"""
+    vectors = bank.embed(questions).astype(np.float16)
+    with db.engine.begin() as conn:
+        conn.execute(BankQuestion.__table__.insert(), [
+            {'document_id': document_id, 'question': q['question'], 'options': '[]', 'answer': q['answer'],
+             'topic': '', 'vector': vector.tobytes()}
+            for q, vector in zip(questions, vectors)
+        ])
+
+
+def test_rows_inserted_elsewhere_are_appended(bank, upload):
+    doc_id = upload()
+    assert bank.add(doc_id, [question('Avalon', 'Copper'), question('Brigadoon', 'Barley')]) == 2
+    first = bank._index(doc_id)
+    loads_before = len(bank.loads)
+
+    insert_elsewhere(bank, doc_id, [question('Camelot', 'Silver')])
+    index = bank._index(doc_id)
+
+    assert bank.loads[loads_before:] == [first.max_id]
+    assert len(index.ids) == 3 and index.max_id > first.max_id
+    np.testing.assert_array_equal(index.matrix[:2], first.matrix)
+    # The appended row counts as a duplicate for later additions
+    assert bank.add(doc_id, [question('Camelot', 'Silver')]) == 0
+
+
+def test_deletions_reload_the_whole_index(bank, upload):
+    doc_id = upload()
+    bank.add(doc_id, [question('Avalon', 'Copper'), question('Brigadoon', 'Barley'), question('Camelot', 'Silver')])
+    first = bank._index(doc_id)
+    loads_before = len(bank.loads)
+
+    with db.engine.begin() as conn:
+        conn.execute(BankQuestion.__table__.delete().where(BankQuestion.id == int(first.ids[0])))
+    insert_elsewhere(bank, doc_id, [question('Dunsinane', 'Amber')])
+    index = bank._index(doc_id)
+
+    # Same row count as before, but a row is gone: reloaded from scratch
+    assert bank.loads[loads_before:] == [None]
+    assert int(first.ids[0]) not in index.ids.tolist()
+    assert len(index.ids) == 3
+    # The deleted question may be added again
+    assert bank.add(doc_id, [question('Avalon', 'Copper')]) == 1
+
+
+def test_unchanged_index_is_not_read_again(bank, upload):
+    doc_id = upload()
+    bank.add(doc_id, [question('Avalon', 'Copper')])
+    bank._index(doc_id)
+    loads_before = len(bank.loads)
+
+    bank._index(doc_id)
+    assert bank.loads[loads_before:] == []
+
+
+def test_bank_leaves_the_callers_session_alone(bank, upload):
+    doc_id = upload()
+    pending = Document(filename='pending.pdf')
+    db.session.add(pending)
+
+    assert bank.add(doc_id, [question('Avalon', 'Copper')]) == 1
+    assert bank.count(doc_id) == 1
+    assert bank.sample(doc_id, 5) == [question('Avalon', 'Copper')]
+
+    assert pending in db.session.new
+    db.session.rollback()
+    assert Document.query.filter_by(filename='pending.pdf').count() == 0
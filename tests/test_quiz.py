@@ -0,0 +1,50 @@
+import hashlib
+import json
+import re
+
+from sqlalchemy import event
+
+from autoquiz.extensions import db
+from autoquiz.models import Quiz
+
+
+def test_quiz_etag_covers_the_whole_representation(client, fake_openai, upload):
+    doc_id = upload()
+
+    first = client.get(f'/api/quiz/document/{doc_id}')
+    assert first.status_code == 200
+    serialized = json.dumps(first.json, sort_keys=True, separators=(',', ':'))
+    assert first.headers['ETag'] == f'"{hashlib.sha256(serialized.encode("utf-8")).hexdigest()}"'
+
+    cached = client.get(f'/api/quiz/document/{doc_id}', headers={'If-None-Match': first.headers['ETag']})
+    assert cached.status_code == 304
+
+    # The same questions again, as a new quiz (which SQLite may give the same id)
+    second = client.get(f'/api/quiz/document/{doc_id}?refresh=true')
+    assert second.status_code == 200
+    assert second.json['quiz'] == first.json['quiz']
+    assert second.json['created_at'] != first.json['created_at']
+    assert second.headers['ETag'] != first.headers['ETag']
+    assert Quiz.query.get(second.json['id']).etag == second.headers['ETag'].strip('"')
+
+
+def test_fallback_does_not_load_the_full_text(app, client, fake_openai, upload):
+    doc_id = upload()
+    fake_openai.error_rate = 1.0
+    fake_openai.error_status = 400  # not retried
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        for url in (f'/api/quiz/document/{doc_id}', f'/api/quiz/document/{doc_id}/bank'):
+            response = client.get(url)
+            assert response.status_code == 200
+            assert response.headers['X-Quiz-Fallback'] == 'true'
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+
+    assert statements
+    assert not [statement for statement in statements if re.search(r'documents\.content\b', statement)]
@@ -0,0 +1,79 @@
+import json
+import random
+
+import pytest
+
+from autoquiz.utils.quiz_parser import (
+    IncrementalJSONQuizParser, IncrementalQuizParser, parse_quiz_json, parse_quiz_to_json
+)
+from fake_openai import build_quiz, build_quiz_json
+
+
+def pieces(text, seed):
+    """Split text at random points, as a streamed completion arrives"""
+    rng = random.Random(seed)
+    cuts = sorted(rng.sample(range(1, len(text)), min(len(text) - 1, len(text) // 5)))
+    return [text[start:end] for start, end in zip([0] + cuts, cuts + [len(text)])]
+
+
+def stream(parser, chunks):
+    questions = []
+    for chunk in chunks:
+        questions.extend(parser.feed(chunk))
+    return questions + parser.finish()
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_text_stream_split_anywhere(seed):
+    text = build_quiz(5, seed)
+    assert stream(IncrementalQuizParser(), pieces(text, seed)) == parse_quiz_to_json(text)
+    assert len(parse_quiz_to_json(text)) == 5
+
+
+def test_text_stream_with_crlf_and_noise_between_questions():
+    text = build_quiz(3, 1).replace('\n\n', '\n\n[garbled chunk]\n\n').replace('\n', '\r\n')
+    questions = stream(IncrementalQuizParser(), pieces(text, 1))
+    assert questions == parse_quiz_to_json(build_quiz(3, 1))
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_json_stream_split_anywhere(seed):
+    text = build_quiz_json(5, seed)
+    assert stream(IncrementalJSONQuizParser(), pieces(text, seed)) == parse_quiz_json(text)
+
+
+def test_json_stream_one_character_at_a_time_with_escapes():
+    quiz = {'questions': [{
+        'question': 'What does "\\n" print in {braces}?',
+        'options': ['A "quoted" \\ backslash', 'A [bracket]', 'Nothing', 'A newline'],
+        'answer': 'd'
+    }]}
+    text = json.dumps(quiz)
+    assert stream(IncrementalJSONQuizParser(), list(text)) == parse_quiz_json(text)
+    assert parse_quiz_json(text)[0]['answer'] == 'A newline'
+
+
+def test_json_stream_skips_garbled_objects():
+    good = json.loads(build_quiz_json(2, 3))['questions']
+    text = (
+        '}{"questions": ['
+        + json.dumps(good[0])
+        + ', {"question": "Broken", "options": ["x", "y"], "answer": "a" oops}, '
+        + '{"question": "Unusable", "options": [1, 2], "answer": 0}, '
+        + json.dumps(good[1])
+        + ']}'
+    )
+    questions = stream(IncrementalJSONQuizParser(), pieces(text, 3))
+    assert [question['question'] for question in questions] == [item['question'] for item in good]
+
+
+def test_json_stream_cut_off_keeps_complete_questions():
+    text = build_quiz_json(3, 4)
+    cut = text[:text.rindex('{') + 20]
+    questions = stream(IncrementalJSONQuizParser(), pieces(cut, 4))
+    assert questions == parse_quiz_json(text)[:2]
+
+
+def test_json_stream_falls_back_to_text():
+    text = build_quiz(3, 5)
+    assert stream(IncrementalJSONQuizParser(), pieces(text, 5)) == parse_quiz_to_json(text)
@@ -0,0 +1,20 @@
+"""
+WSGI entry point for production servers
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+"""
+import os
+from app import create_app
+from autoquiz.extensions import db
+from autoquiz.utils.lazy import preload
+
+app = create_app(os.getenv('FLASK_ENV', 'production'))
+
+# With APP_PRELOAD gunicorn imports this module in the master, so openai and
+# pdfplumber are imported once and shared by the forked workers
+if os.getenv('APP_PRELOAD', 'false').lower() == 'true':
+    preload()
+
+# Connections opened at startup must not be shared with forked workers
+with app.app_context():
+    db.engine.dispose()